@@ -0,0 +1,196 @@
+#! /usr/bin/env python3
+"""
+Benchmarks for the card game. Times deck construction, shuffle, sort and
+draw, hand scoring and end-to-end games over a sweep of card ranges, suit
+counts and player counts.
+
+Results can be saved as a JSON baseline and later runs compared against
+it, for example:
+
+    python benchmarks/bench_card_game.py --output baseline.json
+    python benchmarks/bench_card_game.py --compare baseline.json
+
+When comparing, the exit status is 1 if any benchmark is slower than the
+baseline by more than the tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cards import card_game
+
+# default sweep
+DEFAULT_RANGES = '13,100,1000'
+DEFAULT_SUIT_COUNTS = '4,8'
+DEFAULT_PLAYER_COUNTS = '2,4'
+DEFAULT_CARDS_PER_HAND = 3
+
+# minimum wall time spent timing each benchmark, in seconds
+DEFAULT_MIN_TIME = 0.2
+
+# allowed slowdown before a benchmark counts as a regression
+DEFAULT_TOLERANCE = 0.10
+
+
+def make_suits(count):
+    """
+    Return a suits dictionary with count suits, ranked 1 to count
+    """
+    return {'suit{}'.format(i): i for i in range(1, count + 1)}
+
+
+def time_it(func, setup=None, min_time=DEFAULT_MIN_TIME):
+    """
+    Call func repeatedly for at least min_time seconds and return the mean
+    seconds per call. setup, if given, is called before each call outside
+    the timed region and its result is passed to func
+    """
+    calls = 0
+    elapsed = 0.0
+    while elapsed < min_time:
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        func(arg)
+        elapsed += time.perf_counter() - start
+        calls += 1
+    return elapsed / calls
+
+
+def bench_deck_ops(card_range, suit_count, min_time):
+    """
+    Time the Deck operations for one deck shape, in seconds per call
+    """
+    suits = make_suits(suit_count)
+    sort_by = list(reversed(list(suits.keys())))
+    new_deck = lambda arg=None: card_game.Deck(card_range, suits)
+    deck_size = card_range * suit_count
+
+    def draw_all(deck):
+        while deck.get_top_card() is not None:
+            pass
+
+    return {
+        'deck_init': time_it(new_deck, min_time=min_time),
+        'deck_shuffle': time_it(lambda deck: deck.shuffle(), new_deck, min_time),
+        'deck_sort_cards_by': time_it(lambda deck: deck.sort_cards_by(sort_by), new_deck, min_time),
+        'deck_get_top_card': time_it(draw_all, new_deck, min_time) / deck_size,
+    }
+
+
+def bench_score_hand(card_range, suit_count, min_time):
+    """
+    Time Player.score_hand on a hand of DEFAULT_CARDS_PER_HAND cards
+    """
+    deck = card_game.Deck(card_range, make_suits(suit_count))
+    hand = deck.draw_many(DEFAULT_CARDS_PER_HAND)
+    player = card_game.Player()
+    return {'player_score_hand': time_it(lambda arg: player.score_hand(hand), min_time=min_time)}
+
+
+def bench_game(card_range, suit_count, players, min_time):
+    """
+    Time complete games with Game.play, including building the deck and players
+    """
+    suits = make_suits(suit_count)
+    game = card_game.Game(DEFAULT_CARDS_PER_HAND)
+
+    def play(arg):
+        game.play(card_game.Players(players), card_game.Deck(card_range, suits))
+
+    return {'game_play': time_it(play, min_time=min_time)}
+
+
+def run_benchmarks(ranges, suit_counts, player_counts, min_time):
+    """
+    Run the sweep and return a dictionary of benchmark name to seconds per call
+    """
+    results = {}
+    for card_range in ranges:
+        for suit_count in suit_counts:
+            shape = 'range={},suits={}'.format(card_range, suit_count)
+            timings = bench_deck_ops(card_range, suit_count, min_time)
+            timings.update(bench_score_hand(card_range, suit_count, min_time))
+            for name, seconds in timings.items():
+                results['{}[{}]'.format(name, shape)] = seconds
+            for players in player_counts:
+                seconds = bench_game(card_range, suit_count, players, min_time)['game_play']
+                results['game_play[{},players={}]'.format(shape, players)] = seconds
+    return results
+
+
+def report(results, baseline=None, tolerance=DEFAULT_TOLERANCE):
+    """
+    Print the results, compared with the baseline if one is given. Returns
+    the names of the benchmarks that regressed
+    """
+    regressions = []
+    for name, seconds in results.items():
+        line = '{:60s} {:12.3f} us'.format(name, seconds * 1e6)
+        if name.startswith('game_play'):
+            line += ' {:12.1f} games/s'.format(1 / seconds)
+        if baseline is not None and name in baseline:
+            ratio = seconds / baseline[name]
+            line += '  x{:.2f}'.format(ratio)
+            if ratio > 1 + tolerance:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def parse_command_line():
+    """
+    Parse the command line for the benchmark sweep
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--ranges', dest='ranges', default=DEFAULT_RANGES,
+                        help='comma separated card ranges, default: ' + DEFAULT_RANGES)
+    parser.add_argument('-s', '--suits', dest='suits', default=DEFAULT_SUIT_COUNTS,
+                        help='comma separated suit counts, default: ' + DEFAULT_SUIT_COUNTS)
+    parser.add_argument('-p', '--players', dest='players', default=DEFAULT_PLAYER_COUNTS,
+                        help='comma separated player counts, default: ' + DEFAULT_PLAYER_COUNTS)
+    parser.add_argument('-t', '--min-time', dest='min_time', type=float, default=DEFAULT_MIN_TIME,
+                        help='seconds spent timing each benchmark')
+    parser.add_argument('-o', '--output', dest='output', help='save the results as a JSON baseline')
+    parser.add_argument('-c', '--compare', dest='compare', help='JSON baseline to compare against')
+    parser.add_argument('--tolerance', dest='tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown against the baseline, default: 0.10')
+    parser.add_argument('--seed', dest='seed', type=int, default=0, help='random seed')
+    return parser.parse_args()
+
+
+def main():
+    options = parse_command_line()
+    random.seed(options.seed)
+    ranges = [int(v) for v in options.ranges.split(',')]
+    suit_counts = [int(v) for v in options.suits.split(',')]
+    player_counts = [int(v) for v in options.players.split(',')]
+
+    results = run_benchmarks(ranges, suit_counts, player_counts, options.min_time)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)['results']
+    regressions = report(results, baseline, options.tolerance)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'results': results}, f, indent=2, sort_keys=True)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# eof
@@ -0,0 +1,122 @@
+#! /usr/bin/env python3
+"""
+Thread scaling benchmark for the card game. Plays the same Monte Carlo run
+with a thread pool of 1, 2, 4, ... workers and prints the games per second
+and the speedup over one thread, for example:
+
+    python benchmarks/bench_threads.py --games 200000 --threads 1,2,4,8
+
+Every block of games has its own random.Random, so the threads share no
+state and every thread count gives the same result. The games only run in
+parallel on a free-threaded Python, with the GIL the speedup stays near 1.
+"""
+
+import argparse
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cards import card_game
+from cards import simulation
+
+DEFAULT_GAMES = 100000
+DEFAULT_BLOCK_SIZE = 1000
+
+
+def default_thread_counts():
+    """
+    Return the powers of two up to the number of CPUs, and the CPU count
+    """
+    cpus = os.cpu_count() or 1
+    counts = []
+    count = 1
+    while count < cpus:
+        counts.append(count)
+        count *= 2
+    counts.append(cpus)
+    return counts
+
+
+def gil_status():
+    """
+    Return a description of the GIL of this interpreter
+    """
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    if is_gil_enabled is None:
+        return 'GIL enabled'
+    return 'GIL enabled' if is_gil_enabled() else 'GIL disabled (free-threaded)'
+
+
+def run_benchmarks(runner, games, thread_counts, seed):
+    """
+    Time the run of games games for every thread count and return a list
+    of (threads, seconds). Raises AssertionError if a thread count gives a
+    different result than the first
+    """
+    results = []
+    expected = None
+    for threads in thread_counts:
+        start = time.perf_counter()
+        result = runner.run(games, seed, workers=threads, use_threads=True)
+        seconds = time.perf_counter() - start
+        if expected is None:
+            expected = result.get_wins()
+        assert result.get_wins() == expected, 'results differ with {} threads'.format(threads)
+        results.append((threads, seconds))
+    return results
+
+
+def report(games, results):
+    """
+    Print the games per second and speedup of each thread count
+    """
+    base = results[0][1]
+    print('{:>8s} {:>12s} {:>14s} {:>8s}'.format('threads', 'seconds', 'games/s', 'speedup'))
+    for threads, seconds in results:
+        print('{:8d} {:12.3f} {:14.1f} {:8.2f}'.format(threads, seconds, games / seconds,
+                                                        base / seconds))
+
+
+def parse_command_line():
+    """
+    Parse the command line for the thread scaling benchmark
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-g', '--games', dest='games', type=int, default=DEFAULT_GAMES,
+                        help='games played for each thread count')
+    parser.add_argument('-t', '--threads', dest='threads',
+                        help='comma separated thread counts, default: powers of two up to '
+                             'the number of CPUs')
+    parser.add_argument('-b', '--block-size', dest='block_size', type=int,
+                        default=DEFAULT_BLOCK_SIZE, help='games per block')
+    parser.add_argument('-p', '--players', dest='players', type=int,
+                        default=card_game.DEFAULT_NUMBER_OF_PLAYERS, help='number of players')
+    parser.add_argument('-r', '--range', dest='range', type=int,
+                        default=card_game.DEFAULT_RANGE_OF_CARDS, help='card range')
+    parser.add_argument('--seed', dest='seed', type=int, default=0, help='random seed')
+    return parser.parse_args()
+
+
+def main():
+    options = parse_command_line()
+    if options.threads:
+        thread_counts = [int(v) for v in options.threads.split(',')]
+    else:
+        thread_counts = default_thread_counts()
+    spec = card_game.GameSpec.compile(options.players, card_game.DEFAULT_NUMBER_OF_CARDS_PER_HAND,
+                                      options.range, card_game.DEFAULT_SUITS)
+    runner = simulation.MonteCarloRunner.from_spec(spec, options.block_size)
+    print('Python {} {}, {}, {} CPUs'.format(platform.python_implementation(),
+                                             platform.python_version(), gil_status(),
+                                             os.cpu_count()))
+    report(options.games, run_benchmarks(runner, options.games, thread_counts, options.seed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# eof
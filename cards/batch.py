@@ -0,0 +1,312 @@
+"""
+Batch engine for the card game. Instead of playing one game at a time with
+Deck, Players and Game, N games are simulated at once: an N x deck_size
+matrix of shuffled card indexes is dealt to the seats with the same order
+Game.play uses, and the scores and winners are worked out with array
+operations.
+
+The engine needs numpy, which is an optional dependency of this package.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only the batch engine needs it
+    np = None
+
+from cards import card_game
+
+# most games simulated per chunk
+DEFAULT_CHUNK_SIZE = 65536
+
+# most cells, games x deck size, of the matrices of a chunk. Each matrix of
+# the budget takes 32 MB, so a chunk of a large deck has fewer games
+CELL_BUDGET = 1 << 22
+
+
+class BatchResult:
+    """
+    This class holds the aggregated outcome of a batch of games
+
+    ...
+
+    Attributes
+    ----------
+    __games: int
+        the number of games played
+
+    __wins: numpy array of int
+        the number of games won by each seat
+
+    __ties: int
+        the number of games where more than one seat had the winning score
+
+    __score_totals: numpy array of int
+        the sum of each seat's final scores over all games
+
+    Methods
+    -------
+    get_games:
+        returns the number of games played
+
+    get_wins:
+        returns the wins per seat
+
+    get_ties:
+        returns the number of tied games
+
+    get_win_rates:
+        returns the fraction of games won by each seat
+
+    get_mean_scores:
+        returns the mean final score of each seat
+
+    merge(other):
+        adds the games of another result to this one
+
+    """
+    def __init__(self, games, wins, ties, score_totals):
+        self.__games = games
+        self.__wins = wins
+        self.__ties = ties
+        self.__score_totals = score_totals
+
+    def __str__(self):
+        """
+        Returns the string representation of the result
+        """
+        return 'Games: {}, Wins: {}, Ties: {}'.format(
+            self.__games, self.__wins.tolist(), self.__ties)
+
+    def get_games(self):
+        """
+        Return the number of games played
+        """
+        return self.__games
+
+    def get_wins(self):
+        """
+        Return the number of games won by each seat
+        """
+        return self.__wins
+
+    def get_ties(self):
+        """
+        Return the number of games with a tied winning score
+        """
+        return self.__ties
+
+    def get_win_rates(self):
+        """
+        Return the fraction of games won by each seat
+        """
+        return self.__wins / max(self.__games, 1)
+
+    def get_mean_scores(self):
+        """
+        Return the mean final score of each seat
+        """
+        return self.__score_totals / max(self.__games, 1)
+
+    def merge(self, other):
+        """
+        Add the games of other to this result
+        """
+        self.__games += other.get_games()
+        self.__wins = self.__wins + other.get_wins()
+        self.__ties += other.get_ties()
+        self.__score_totals = self.__score_totals + other.__score_totals
+        return self
+
+
+class BatchGame:
+    """
+    This class simulates many games with the same settings at once
+
+    ...
+
+    Attributes
+    ----------
+    __number_of_players: int
+        the number of players in each game
+
+    __cards_per_hand: int
+        the number of cards drawn per hand
+
+    __card_scores: numpy array of float
+        the score of each card of the deck, suit rank times value. Stored as
+        floats so the seat sums run through BLAS, the scores are exact
+        integers well below 2**53
+
+    __seat_matrix: numpy array of float
+        deck_size x players matrix, a one where a deck position is dealt to a seat
+
+    __card_range: int
+        the cards of each suit run from 1 to card_range
+
+    __suit_items: tuple of (str, int)
+        the suit names and ranks, in deck order
+
+    __scoring_rule: ScoringRule
+        the rule from cards.scoring the games are scored with, None for the
+        suit rank times value of the game
+
+    __hand_positions: numpy array of int
+        for a rule that is not additive, the deck positions of every hand
+        of a game, -1 for the slots past the end of the deck
+
+    __hand_seats: numpy array of int
+        hands x players matrix, a one where a hand is dealt to a seat
+
+    Methods
+    -------
+    get_deck_size:
+        returns the number of cards in the deck
+
+    play_permutations(perms):
+        scores the games given by a matrix of deck orders
+
+    summarize_permutations(perms):
+        returns the BatchResult of the games given by a matrix of deck orders
+
+    simulate(number_of_games, seed, chunk_size):
+        plays number_of_games random games and returns a BatchResult
+
+    """
+    def __init__(self, number_of_players, cards_per_hand, card_range, suits, scoring_rule=None):
+        """
+        Parameters
+        ----------
+        number_of_players: int
+            number of players in each game
+
+        cards_per_hand: int
+            the number of cards drawn per hand
+
+        card_range: int
+            the cards of each suit run from 1 to card_range
+
+        suits: str or dict
+            the suits and their rank, either as the command line string or
+            as a dictionary of suit name to rank
+
+        scoring_rule: ScoringRule, optional
+            the rule the games are scored with, from cards.scoring
+        """
+        if np is None:
+            raise ImportError('the batch engine requires numpy')
+        if isinstance(suits, str):
+            suits = card_game.parse_suits(suits)
+        self.__number_of_players = int(number_of_players)
+        self.__cards_per_hand = int(cards_per_hand)
+        card_range = int(card_range)
+
+        self.__scoring_rule = scoring_rule
+        self.__card_range = card_range
+        self.__suit_items = tuple(suits.items())
+        if scoring_rule is None:
+            ranks = np.repeat(np.array(list(suits.values()), dtype=np.int64), card_range)
+            values = np.tile(np.arange(1, card_range + 1, dtype=np.int64), len(suits))
+            self.__card_scores = (ranks * values).astype(np.float64)
+        else:
+            table = scoring_rule.get_score_table(card_range, self.__suit_items)
+            self.__card_scores = np.frombuffer(table, dtype=np.int64).astype(np.float64)
+
+        deck_size = len(self.__card_scores)
+        seats = np.frombuffer(card_game.deal_seats(self.__number_of_players,
+                                                   self.__cards_per_hand,
+                                                   deck_size), dtype=np.int32)
+        self.__seat_matrix = np.zeros((deck_size, self.__number_of_players))
+        self.__seat_matrix[np.arange(deck_size), seats] = 1
+
+        # a rule that adjusts hand totals is scored hand by hand
+        self.__hand_positions = None
+        if scoring_rule is not None and not scoring_rule.is_additive():
+            hands = -(-deck_size // self.__cards_per_hand)
+            positions = np.arange(hands * self.__cards_per_hand).reshape(hands, -1)
+            self.__hand_positions = np.where(positions < deck_size, positions, -1)
+            self.__hand_seats = np.zeros((hands, self.__number_of_players), dtype=np.int64)
+            self.__hand_seats[np.arange(hands), np.arange(hands) % self.__number_of_players] = 1
+
+    def get_deck_size(self):
+        """
+        Return the number of cards in the deck
+        """
+        return len(self.__card_scores)
+
+    def play_permutations(self, perms):
+        """
+        Score the games given by perms, a games x deck_size matrix where row
+        g holds the card indexes of game g in deck order. Returns the games x
+        players matrix of final scores and the winning seat of each game.
+        Ties go to the lowest seat, the same as Game.play
+        """
+        if self.__hand_positions is not None:
+            positions = self.__hand_positions
+            hands = np.where(positions >= 0, np.asarray(perms)[:, positions], -1)
+            totals = self.__scoring_rule.score_hands(hands, self.__card_range, self.__suit_items)
+            scores = totals @ self.__hand_seats
+            return scores, scores.argmax(axis=1)
+        scores = (np.take(self.__card_scores, perms) @ self.__seat_matrix).astype(np.int64)
+        return scores, scores.argmax(axis=1)
+
+    def summarize_permutations(self, perms):
+        """
+        Return the BatchResult of the games given by perms, a games x
+        deck_size matrix of deck orders
+        """
+        scores, winners = self.play_permutations(perms)
+        best = scores.max(axis=1)
+        ties = int(np.count_nonzero((scores == best[:, None]).sum(axis=1) > 1))
+        return BatchResult(len(perms), np.bincount(winners, minlength=self.__number_of_players),
+                           ties, scores.sum(axis=0))
+
+    def simulate(self, number_of_games, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Play number_of_games random games and return a BatchResult
+
+        Parameters
+        ----------
+        number_of_games: int
+            the number of games to simulate
+
+        seed: int, optional
+            the seed for numpy's random generator
+
+        chunk_size: int, optional
+            the most games shuffled and scored per chunk, fewer are played
+            per chunk when the deck is too large for CELL_BUDGET
+        """
+        rng = np.random.default_rng(seed)
+        deck_size = self.get_deck_size()
+        chunk_size = min(chunk_size, chunk_rows(deck_size))
+        players = self.__number_of_players
+        result = BatchResult(0, np.zeros(players, dtype=np.int64), 0,
+                             np.zeros(players, dtype=np.int64))
+
+        remaining = int(number_of_games)
+        while remaining > 0:
+            n = min(chunk_size, remaining)
+            result.merge(self.summarize_permutations(random_permutations(rng, n, deck_size)))
+            remaining -= n
+
+        return result
+
+
+def chunk_rows(deck_size, cell_budget=None):
+    """
+    Return the number of games of deck_size cards that fit in a chunk of
+    cell_budget matrix cells, default CELL_BUDGET, at least one
+    """
+    if cell_budget is None:
+        cell_budget = CELL_BUDGET
+    return max(1, cell_budget // deck_size)
+
+
+def random_permutations(rng, number_of_games, deck_size):
+    """
+    Return a number_of_games x deck_size matrix of uniform random deck
+    orders drawn from a numpy Generator
+    """
+    # argsort of uniform keys gives a uniform permutation per row and is
+    # several times faster than Generator.permuted on a matrix
+    return rng.random((number_of_games, deck_size)).argsort(axis=1)
@@ -8,8 +8,16 @@ cards are drawn.
 """
 
 import argparse
+import functools
+import operator
+import os
 import random
+from array import array
 import sys
+import threading
+import time
+import weakref
+from collections import namedtuple
 
 # default values
 DEFAULT_NUMBER_OF_PLAYERS = 2
@@ -29,6 +37,12 @@ class Card:
     """
     This class represents a card for this game
 
+    Cards are immutable and interned: creating a card with the same suit,
+    rank and value as an existing one returns the existing instance, so
+    every deck with the same suits and range shares one set of cards. The
+    intern cache only holds weak references, a card no longer used anywhere
+    is freed and drops out of it
+
     ...
 
     Attributes
@@ -42,6 +56,9 @@ class Card:
     __card_value: int
         the face value of the card
 
+    __card_hash: int
+        the hash of the card, worked out once when it is created
+
     Methods
     -------
     get_suit_name()
@@ -53,8 +70,20 @@ class Card:
     get_value()
         returns the value of the card
 
+    get_cache_size()
+        returns the number of interned cards still in use
+
+    clear_cache()
+        forgets the interned cards
+
     """
-    def __init__(self, suit, suit_value, value):
+    __slots__ = ('__card_suit_name', '__card_suit_rank', '__card_value', '__card_hash',
+                 '__weakref__')
+
+    # the interned cards, keyed by (suit, suit rank, value)
+    __cache = weakref.WeakValueDictionary()
+
+    def __new__(cls, suit, suit_value, value):
         """
         Parameters
         ----------
@@ -68,9 +97,48 @@ class Card:
             card's face value
 
         """
-        self.__card_suit_name = suit
-        self.__card_suit_rank = suit_value
-        self.__card_value = value
+        key = (suit, suit_value, value)
+        card = cls.__cache.get(key)
+        if card is None:
+            card = object.__new__(cls)
+            object.__setattr__(card, '_Card__card_suit_name', suit)
+            object.__setattr__(card, '_Card__card_suit_rank', suit_value)
+            object.__setattr__(card, '_Card__card_value', value)
+            object.__setattr__(card, '_Card__card_hash', hash(key))
+            card = cls.__cache.setdefault(key, card)
+        return card
+
+    def __setattr__(self, name, value):
+        """
+        Cards are immutable
+        """
+        raise AttributeError('Card objects are immutable')
+
+    def __delattr__(self, name):
+        """
+        Cards are immutable
+        """
+        raise AttributeError('Card objects are immutable')
+
+    def __reduce__(self):
+        """
+        Pickle cards by value so they are interned again when loaded
+        """
+        return (Card, (self.__card_suit_name, self.__card_suit_rank, self.__card_value))
+
+    @classmethod
+    def get_cache_size(cls):
+        """
+        Returns the number of interned cards still in use
+        """
+        return len(cls.__cache)
+
+    @classmethod
+    def clear_cache(cls):
+        """
+        Forget the interned cards, cards already handed out stay valid
+        """
+        cls.__cache.clear()
 
     def __str__(self):
         """
@@ -99,11 +167,327 @@ class Card:
         """
         return self.__card_value
 
+    def __eq__(self, other):
+        """
+        Cards are equal when suit name, suit rank and value are equal
+        """
+        if not isinstance(other, Card):
+            return NotImplemented
+        return (self.__card_suit_name == other.get_suit_name() and
+                self.__card_suit_rank == other.get_suit_rank() and
+                self.__card_value == other.get_value())
+
+    def __hash__(self):
+        """
+        Returns a hash consistent with __eq__, cached when the card is created
+        """
+        return self.__card_hash
+
+
+class CardSequence:
+    """
+    A read only, live view of the cards remaining in a deck. Card objects are
+    only created when an entry is looked up, the deck itself only holds the
+    card tables and the order of the cards
+
+    ...
+
+    Attributes
+    ----------
+    __deck: Deck
+        the deck this view looks into
+
+    """
+    def __init__(self, deck):
+        """
+        Parameters
+        ----------
+        deck: Deck
+            the deck to look into
+        """
+        self.__deck = deck
+
+    def __len__(self):
+        """
+        Returns the number of cards remaining in the deck
+        """
+        return self.__deck.get_number_of_cards()
+
+    def __getitem__(self, idx):
+        """
+        Returns the card, or list of cards for a slice, at the position idx
+        """
+        size = self.__deck.get_number_of_cards()
+        if isinstance(idx, slice):
+            return [self.__deck.get_card_at(i) for i in range(*idx.indices(size))]
+        if idx < 0:
+            idx += size
+        if not -1 < idx < size:
+            raise IndexError('deck index out of range')
+        return self.__deck.get_card_at(idx)
+
+    def __iter__(self):
+        """
+        Iterate over the remaining cards from the top of the deck
+        """
+        deck = self.__deck
+        for position in range(deck.get_number_of_cards()):
+            yield deck.get_card_at(position)
+
+
+class GameStats:
+    """
+    This class collects call counts and timings for the instrumented parts
+    of a game: shuffles, draws, hand scoring, winner selection and whole
+    games. Deck and Game only record into it when they are given one, so an
+    uninstrumented game pays a single None check per operation. One
+    GameStats can be shared by games played in several threads
+
+    ...
+
+    Attributes
+    ----------
+    __counts: dict
+        the number of calls recorded per operation
+
+    __times: dict
+        the total time recorded per operation, in nanoseconds
+
+    __lock: threading.Lock
+        held while the counts and times are changed
+
+    Methods
+    -------
+    record(name, elapsed):
+        adds one call of elapsed nanoseconds to an operation
+
+    get_count(name):
+        returns the number of calls of an operation
+
+    get_time(name):
+        returns the total nanoseconds spent in an operation
+
+    get_operations:
+        returns the names of the recorded operations
+
+    merge(other):
+        adds the counts and times of another GameStats
+
+    reset:
+        clears all counts and times
+
+    """
+    def __init__(self):
+        self.__counts = {}
+        self.__times = {}
+        self.__lock = threading.Lock()
+
+    def __str__(self):
+        """
+        Returns a table of the recorded operations
+        """
+        lines = ['{:10s} {:>10s} {:>14s} {:>12s}'.format('operation', 'calls', 'total ms', 'mean us')]
+        for name in self.get_operations():
+            count = self.__counts[name]
+            elapsed = self.__times[name]
+            lines.append('{:10s} {:10d} {:14.3f} {:12.3f}'.format(
+                name, count, elapsed / 1e6, elapsed / count / 1e3))
+        return '\n'.join(lines)
+
+    def record(self, name, elapsed):
+        """
+        Record one call of the operation name that took elapsed nanoseconds
+        """
+        with self.__lock:
+            self.__counts[name] = self.__counts.get(name, 0) + 1
+            self.__times[name] = self.__times.get(name, 0) + elapsed
+
+    def get_count(self, name):
+        """
+        Return the number of calls recorded for an operation
+        """
+        return self.__counts.get(name, 0)
+
+    def get_time(self, name):
+        """
+        Return the total time recorded for an operation, in nanoseconds
+        """
+        return self.__times.get(name, 0)
+
+    def get_operations(self):
+        """
+        Return the names of the recorded operations
+        """
+        return list(self.__counts.keys())
+
+    def merge(self, other):
+        """
+        Add the counts and times of another GameStats to this one
+        """
+        with self.__lock:
+            for name in other.get_operations():
+                self.__counts[name] = self.__counts.get(name, 0) + other.get_count(name)
+                self.__times[name] = self.__times.get(name, 0) + other.get_time(name)
+        return self
+
+    def reset(self):
+        """
+        Clear all counts and times
+        """
+        with self.__lock:
+            self.__counts = {}
+            self.__times = {}
+
+
+class DeckTemplate:
+    """
+    This class holds the card tables shared by every deck with the same
+    range and suits. The tables are built once and never changed, a new
+    deck only copies the template's order and shuffles it
+
+    ...
+
+    Attributes
+    ----------
+    __suit_names: tuple of str
+        the suit names, indexed by the suit index of a card
+
+    __suit_index: array of int
+        the suit index of each card
+
+    __suit_rank: array of int
+        the suit rank of each card
+
+    __value: array of int
+        the face value of each card
+
+    __order: array of int
+        the card indexes in the unshuffled deck order
+
+    __cards: tuple of Card
+        the interned Card of each card index, built on first use
+
+    Methods
+    -------
+    get_suit_names:
+        returns the suit names
+
+    get_suit_indexes:
+        returns the suit index of each card
+
+    get_suit_ranks:
+        returns the suit rank of each card
+
+    get_values:
+        returns the value of each card
+
+    get_order:
+        returns the unshuffled card order
+
+    get_cards:
+        returns the Card of each card index
+
+    """
+    def __init__(self, card_range, suit_items):
+        """
+        Parameters
+        ----------
+        card_range: int
+            the cards of each suit run from 1 to card_range
+
+        suit_items: tuple of (str, int)
+            the suit names and ranks, in deck order
+        """
+        self.__suit_names = tuple(name for name, rank in suit_items)
+        self.__suit_index = array('i')
+        self.__suit_rank = array('i')
+        self.__value = array('i')
+        values = range(1, card_range + 1)
+        for idx, (suit, rank) in enumerate(suit_items):
+            self.__suit_index.extend([idx] * card_range)
+            self.__suit_rank.extend([rank] * card_range)
+            self.__value.extend(values)
+        self.__order = array('i', range(len(self.__value)))
+        self.__cards = None
+
+    def get_suit_names(self):
+        """
+        Return the suit names, indexed by suit index
+        """
+        return self.__suit_names
+
+    def get_suit_indexes(self):
+        """
+        Return the suit index of each card
+        """
+        return self.__suit_index
+
+    def get_suit_ranks(self):
+        """
+        Return the suit rank of each card
+        """
+        return self.__suit_rank
+
+    def get_values(self):
+        """
+        Return the value of each card
+        """
+        return self.__value
+
+    def get_order(self):
+        """
+        Return the card indexes in unshuffled order
+        """
+        return self.__order
+
+    def get_cards(self):
+        """
+        Return the Card of each card index. The cards are built the first
+        time they are asked for and kept, so every deck made from this
+        template shares the same Card objects
+        """
+        cards = self.__cards
+        if cards is None:
+            names = self.__suit_names
+            cards = self.__cards = tuple(Card(names[s], r, v) for s, r, v in
+                                         zip(self.__suit_index, self.__suit_rank, self.__value))
+        return cards
+
+
+@functools.lru_cache(maxsize=128)
+def get_deck_template(card_range, suit_items):
+    """
+    Return the cached DeckTemplate for a card range and a tuple of
+    (suit name, suit rank) pairs
+    """
+    return DeckTemplate(card_range, suit_items)
+
+
+@functools.lru_cache(maxsize=128)
+def get_sorted_order(card_range, suit_names, sort_by):
+    """
+    Return the card indexes of a full deck sorted by the suits in sort_by,
+    then by value. Card index i of a DeckTemplate is the card of suit
+    i // card_range with value i % card_range + 1, so the order is built
+    directly without comparing cards. The result is cached and must not
+    be changed
+    """
+    order = array('i')
+    for s in sort_by:
+        start = suit_names.index(s) * card_range
+        order.extend(range(start, start + card_range))
+    return order
+
 
 class Deck:
     """
     This class represents the deck for the game.
 
+    The cards are not stored as Card objects, each card is an index into a set
+    of parallel typed arrays holding the suit index, the suit rank and the
+    value of the card. The deck order is an array of those indexes, and Card
+    objects are only created when asked for.
+
     ...
 
     Attributes
@@ -111,11 +495,41 @@ class Deck:
     __card_range: int
         the range of the cards to use, it represents the cards from 1 to __card_range
 
-    __suits: str
+    __suits: dict
         the suits and suit rank to use for the deck.
 
-    __stack: list
-        the actual deck, a list of cards
+    __suit_items: tuple of (str, int)
+        the suit names and ranks, indexed by suit index
+
+    __suit_names: tuple of str
+        the suit names, indexed by the suit index of a card
+
+    __suit_index: array of int
+        the suit index of each card, shared with the DeckTemplate
+
+    __suit_rank: array of int
+        the suit rank of each card, shared with the DeckTemplate
+
+    __value: array of int
+        the face value of each card, shared with the DeckTemplate
+
+    __template: DeckTemplate
+        the shared template the card tables come from
+
+    __cards: tuple of Card
+        the template's Card of each card index, None until a card is asked for
+
+    __stack: array of int
+        the actual deck, the card indexes in deck order
+
+    __top: int
+        the position of the top card in __stack, cards before it have been drawn
+
+    __rng: random.Random
+        the random number generator used to shuffle the deck
+
+    __stats: GameStats
+        where shuffle and draw timings are recorded, None to not record them
 
     Methods
     -------
@@ -125,11 +539,47 @@ class Deck:
     get_suits:
         returns the __suits value
 
+    get_suit_items:
+        returns the suit names and ranks in suit index order
+
     get_deck:
-        returns the __stack
+        returns a live view of the cards in the deck
+
+    get_card(card_index):
+        returns a Card for the specified card index
+
+    get_card_at(position):
+        returns the Card at the specified position from the top of the deck
+
+    get_number_of_cards:
+        returns the number of cards remaining in the deck
+
+    get_order:
+        returns the remaining card indexes in deck order
+
+    set_order(order):
+        replaces the cards in the deck with the card indexes in order
+
+    draw_many(k):
+        draws up to k cards off the top of the deck
+
+    draw_indexes(k):
+        draws up to k card indexes off the top of the deck
+
+    discard(k):
+        removes up to k cards off the top of the deck without drawing them
+
+    get_suit_indexes:
+        returns the suit index of each card
+
+    get_suit_ranks:
+        returns the suit rank of each card
+
+    get_values:
+        returns the value of each card
 
     """
-    def __init__(self, card_range, suits):
+    def __init__(self, card_range, suits, rng=None, stats=None, shuffled=True):
         """
         Parameters
         ----------
@@ -138,14 +588,35 @@ class Deck:
 
         suits: str
             the card suits and rank to use for the cards
+
+        rng: random.Random, optional
+            the random number generator to shuffle with, defaults to the
+            module level random generator
+
+        stats: GameStats, optional
+            records the time spent shuffling and drawing
+
+        shuffled: bool, optional
+            shuffle the new deck, default True. An unshuffled deck is in
+            suit then value order
         """
         self.__card_range = card_range
         self.__suits = suits
-        self.__stack = []
-        for suit in self.__suits.keys():
-            for i in range(1,self.__card_range+1):
-                self.__stack.append(Card(suit, self.__suits[suit], i))
-        self.shuffle()
+        self.__suit_items = tuple(suits.items())
+        self.__rng = random if rng is None else rng
+        self.__stats = stats
+        # the card tables come from the shared template, only the order is copied
+        template = get_deck_template(card_range, self.__suit_items)
+        self.__template = template
+        self.__cards = None
+        self.__suit_names = template.get_suit_names()
+        self.__suit_index = template.get_suit_indexes()
+        self.__suit_rank = template.get_suit_ranks()
+        self.__value = template.get_values()
+        self.__stack = array('i', template.get_order())
+        self.__top = 0
+        if shuffled:
+            self.shuffle()
 
     def __str__(self):
         """
@@ -166,31 +637,148 @@ class Deck:
         """
         return self.__suits
 
+    def get_suit_items(self):
+        """
+        Return the (suit name, suit rank) pairs, indexed by suit index
+        """
+        return self.__suit_items
+
     def get_deck(self):
         """
-        Return the value of __stack
+        Return a live view of the cards in the deck, top card first
+        """
+        return CardSequence(self)
+
+    def get_card(self, card_index):
+        """
+        Return a Card for the specified card index
+        """
+        cards = self.__cards
+        if cards is None:
+            cards = self.__cards = self.__template.get_cards()
+        return cards[card_index]
+
+    def get_card_at(self, position):
+        """
+        Return the Card at the specified position, counted from the top of the deck
+        """
+        return self.get_card(self.__stack[self.__top + position])
+
+    def get_number_of_cards(self):
+        """
+        Return the number of cards remaining in the deck
+        """
+        return len(self.__stack) - self.__top
+
+    def get_order(self):
+        """
+        Return the remaining card indexes in deck order, top card first
+        """
+        return self.__stack[self.__top:]
+
+    def set_order(self, order):
+        """
+        Replace the cards in the deck with the card indexes in order, top
+        card first, as returned by get_order. Raises ValueError if an index
+        is not a card of the deck or appears more than once
+        """
+        order = array('i', order)
+        seen = bytearray(len(self.__value))
+        for c in order:
+            if not -1 < c < len(seen) or seen[c]:
+                raise ValueError('card index {} is not valid for the deck'.format(c))
+            seen[c] = 1
+        self.__stack = order
+        self.__top = 0
+
+    def get_suit_indexes(self):
+        """
+        Return the suit index of each card
+        """
+        return self.__suit_index
+
+    def get_suit_ranks(self):
+        """
+        Return the suit rank of each card
+        """
+        return self.__suit_rank
+
+    def get_values(self):
         """
-        return self.__stack
+        Return the value of each card
+        """
+        return self.__value
 
     def shuffle(self):
         """
         Does a random shuffle on the deck
         """
-        for i in reversed(range(1, len(self.__stack))):
-            j = int(random.random() * (i+1))
-            self.__stack[i], self.__stack[j] = self.__stack[j], self.__stack[i]
+        if self.__stats is not None:
+            start = time.perf_counter_ns()
+        stack = self.__stack
+        top = self.__top
+        for i in reversed(range(top + 1, len(stack))):
+            j = top + int(self.__rng.random() * (i - top + 1))
+            stack[i], stack[j] = stack[j], stack[i]
+        if self.__stats is not None:
+            self.__stats.record('shuffle', time.perf_counter_ns() - start)
 
     def get_top_card(self):
         """
         Get the top card off the stack, watching out for an empty deck. If the
         deck doesn't contain any more cards, return None
         """
-        stack_size = len(self.__stack)
-        if stack_size == 0:
-            return None
-        c = self.__stack.pop(0)
+        if self.__stats is not None:
+            start = time.perf_counter_ns()
+        if self.__top == len(self.__stack):
+            c = None
+        else:
+            c = self.get_card(self.__stack[self.__top])
+            self.__top += 1
+        if self.__stats is not None:
+            self.__stats.record('draw', time.perf_counter_ns() - start)
         return c
 
+    def draw_many(self, k):
+        """
+        Draw up to k cards off the top of the deck in one call. If the deck
+        runs out, the returned list holds the cards that were left, an empty
+        deck returns an empty list
+        """
+        if self.__stats is not None:
+            start = time.perf_counter_ns()
+        top = self.__top
+        drawn = self.__stack[top:top + k]
+        self.__top = top + len(drawn)
+        cards = [self.get_card(c) for c in drawn]
+        if self.__stats is not None:
+            self.__stats.record('draw', time.perf_counter_ns() - start)
+        return cards
+
+    def draw_indexes(self, k):
+        """
+        Draw up to k cards off the top of the deck and return their card
+        indexes, without creating Card objects. If the deck runs out, the
+        returned array holds the indexes of the cards that were left
+        """
+        if self.__stats is not None:
+            start = time.perf_counter_ns()
+        top = self.__top
+        drawn = self.__stack[top:top + k]
+        self.__top = top + len(drawn)
+        if self.__stats is not None:
+            self.__stats.record('draw', time.perf_counter_ns() - start)
+        return drawn
+
+    def discard(self, k):
+        """
+        Remove up to k cards off the top of the deck without creating Card
+        objects for them. Returns the number of cards removed
+        """
+        count = min(k, self.get_number_of_cards())
+        self.__top += count
+        return count
+
     def sort_cards_by(self, sort_by):
         """
         Sorts the cards in the order specified by sort_by
@@ -202,41 +790,828 @@ class Deck:
             sorted cards are also sorted by card value
 
         """
-        cards = {}
-        # get the suits to order the deck by
-        for s in self.__suits.keys():
-            cards[s] = []
-
-        # split the deck into entries in a dict, the key is the suit
-        # and the contents of the entry are the cards of the suita
-        for c in self.__stack:
-            cards[c.get_suit_name()].append(c)
-
-        # subfunction for sorting by card value
-        def get_value(c):
-            return c.get_value()
-
-        # sort the cards
-        for i in cards.keys():
-            cards[i].sort(key=get_value)
-
         # make sure all the sort_by suits are in the card deck
-        # if not return False
+        # if not return False, before any work is done
         for s in sort_by:
-            if s not in cards.keys():
+            if s not in self.__suits:
                 return False
 
-        # now create list order as specified in sort_by
-        new_deck = []
-        for s in sort_by:
-            for c in cards[s]:
-                new_deck.append(c)
+        # the template lays the cards out by suit then value, so the sorted
+        # order of a full deck is known up front and cached per shape
+        sorted_order = get_sorted_order(self.__card_range, self.__suit_names, tuple(sort_by))
+        if self.get_number_of_cards() == len(self.__value):
+            new_deck = array('i', sorted_order)
+        else:
+            # bucket the remaining cards by card index, then read the
+            # buckets back in sorted order
+            present = bytearray(len(self.__value))
+            for c in self.get_order():
+                present[c] = 1
+            new_deck = array('i', [c for c in sorted_order if present[c]])
+
         # and assign it back to the stack
         self.__stack = new_deck
+        self.__top = 0
 
         return True
 
 
+class LazyColumn:
+    """
+    A read only card table of a LazyDeck. The entry of a card index is
+    worked out from the index when it is looked up instead of being stored
+
+    ...
+
+    Attributes
+    ----------
+    __card_range: int
+        the number of cards of each suit
+
+    __size: int
+        the number of card indexes
+
+    __suit_column: tuple
+        the entry of each suit index, None for the card values
+
+    """
+    __slots__ = ('__card_range', '__size', '__suit_column')
+
+    def __init__(self, card_range, size, suit_column=None):
+        """
+        Parameters
+        ----------
+        card_range: int
+            the number of cards of each suit
+
+        size: int
+            the number of card indexes
+
+        suit_column: sequence, optional
+            the entry of each suit index. Without it the entry of a card
+            index is the value of the card
+        """
+        self.__card_range = card_range
+        self.__size = size
+        self.__suit_column = None if suit_column is None else tuple(suit_column)
+
+    def __len__(self):
+        """
+        Returns the number of card indexes
+        """
+        return self.__size
+
+    def __getitem__(self, card_index):
+        """
+        Returns the entry of a card index
+        """
+        if not -1 < card_index < self.__size:
+            raise IndexError('card index out of range')
+        if self.__suit_column is None:
+            return card_index % self.__card_range + 1
+        return self.__suit_column[card_index // self.__card_range]
+
+
+# number of Feistel rounds used by LazyDeck's permutation
+FEISTEL_ROUNDS = 8
+
+
+def feistel_permute(x, keys, half_bits, size):
+    """
+    Map x in [0, size) to its place in a pseudo random permutation of
+    [0, size). A balanced Feistel network permutes [0, 4**half_bits), and
+    values that land outside [0, size) are walked through it again until
+    they land inside, which keeps the mapping a permutation of [0, size)
+    """
+    mask = (1 << half_bits) - 1
+    shift = 64 - half_bits
+    while True:
+        left = x >> half_bits
+        right = x & mask
+        for key in keys:
+            # multiplicative hash, the top bits depend on every input bit
+            f = ((right ^ key) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+            left, right = right, left ^ (f >> shift)
+        x = (left << half_bits) | right
+        if x < size:
+            return x
+
+
+class LazyDeck:
+    """
+    This class is a deck that never holds its cards. The card at each
+    position is worked out when it is drawn, by passing the position
+    through a seeded pseudo random permutation of the deck, so memory does
+    not grow with the card range and shuffling costs nothing up front.
+
+    Card index i is the card of suit i // card_range with value
+    i % card_range + 1, the same layout Deck uses.
+
+    ...
+
+    Attributes
+    ----------
+    __card_range: int
+        the range of the cards to use, it represents the cards from 1 to __card_range
+
+    __suits: dict
+        the suits and suit rank to use for the deck.
+
+    __suit_items: tuple of (str, int)
+        the suit names and ranks, indexed by suit index
+
+    __suit_order: tuple of int
+        the suit indexes the deck is made of, in unshuffled order
+
+    __layers: list of tuple
+        one (offset, size, half bits, keys) entry per shuffle, newest last. A
+        shuffle permutes the positions from offset to the end of the deck
+
+    __top: int
+        the position of the top card, cards before it have been drawn
+
+    __rng: random.Random
+        the random number generator the permutation keys are drawn from
+
+    __stats: GameStats
+        where shuffle and draw timings are recorded, None to not record them
+
+    Methods
+    -------
+    get_card_range:
+        returns the __card_range value
+
+    get_suits:
+        returns the __suits value
+
+    get_suit_items:
+        returns the suit names and ranks in suit index order
+
+    get_suit_ranks:
+        returns the suit rank of each card index, worked out on lookup
+
+    get_values:
+        returns the value of each card index, worked out on lookup
+
+    get_deck:
+        returns a live view of the cards in the deck
+
+    get_card(card_index):
+        returns a Card for the specified card index
+
+    get_card_index_at(position):
+        returns the card index at a position from the top of the deck
+
+    get_card_at(position):
+        returns the Card at a position from the top of the deck
+
+    get_number_of_cards:
+        returns the number of cards remaining in the deck
+
+    get_order:
+        returns the remaining card indexes in deck order, built on demand
+
+    shuffle:
+        shuffles the remaining cards
+
+    get_top_card:
+        draws the top card
+
+    draw_many(k):
+        draws up to k cards off the top of the deck
+
+    draw_indexes(k):
+        draws up to k card indexes off the top of the deck
+
+    discard(k):
+        removes up to k cards off the top of the deck without drawing them
+
+    sort_cards_by(sort_by):
+        sorts an undealt deck by suit and value
+
+    """
+    def __init__(self, card_range, suits, rng=None, stats=None):
+        """
+        Parameters
+        ----------
+        card_range: int
+            the value for __card_range
+
+        suits: dict
+            the card suits and rank to use for the cards
+
+        rng: random.Random, optional
+            the random number generator for the permutation keys, defaults
+            to the module level random generator
+
+        stats: GameStats, optional
+            records the time spent shuffling and drawing
+        """
+        self.__card_range = card_range
+        self.__suits = suits
+        self.__suit_items = tuple(suits.items())
+        self.__suit_order = tuple(range(len(self.__suit_items)))
+        self.__layers = []
+        self.__top = 0
+        self.__rng = random if rng is None else rng
+        self.__stats = stats
+        self.shuffle()
+
+    def __str__(self):
+        """
+        Returns the string representation for the Deck
+        """
+        return "Card/range: {}, Suits: {}".format(
+            self.__card_range,self.__suits)
+
+    def get_card_range(self):
+        """
+        Return the value of __card_range
+        """
+        return self.__card_range
+
+    def get_suits(self):
+        """
+        Return the value of __suits
+        """
+        return self.__suits
+
+    def get_suit_items(self):
+        """
+        Return the (suit name, suit rank) pairs, indexed by suit index
+        """
+        return self.__suit_items
+
+    def get_suit_ranks(self):
+        """
+        Return the suit rank of each card index. Nothing is stored, each
+        rank is worked out from the card index when it is looked up
+        """
+        return LazyColumn(self.__card_range, len(self.__suit_items) * self.__card_range,
+                          [rank for name, rank in self.__suit_items])
+
+    def get_values(self):
+        """
+        Return the value of each card index. Nothing is stored, each value
+        is worked out from the card index when it is looked up
+        """
+        return LazyColumn(self.__card_range, len(self.__suit_items) * self.__card_range)
+
+    def get_deck(self):
+        """
+        Return a live view of the cards in the deck, top card first
+        """
+        return CardSequence(self)
+
+    def get_card(self, card_index):
+        """
+        Return a Card for the specified card index
+        """
+        suit, rank = self.__suit_items[card_index // self.__card_range]
+        return Card(suit, rank, card_index % self.__card_range + 1)
+
+    def __size(self):
+        return len(self.__suit_order) * self.__card_range
+
+    def get_card_index_at(self, position):
+        """
+        Return the card index at the specified position, counted from the
+        top of the deck
+        """
+        p = self.__top + position
+        for offset, size, half_bits, keys in reversed(self.__layers):
+            p = offset + feistel_permute(p - offset, keys, half_bits, size)
+        card_range = self.__card_range
+        return self.__suit_order[p // card_range] * card_range + p % card_range
+
+    def get_card_at(self, position):
+        """
+        Return the Card at the specified position, counted from the top of the deck
+        """
+        return self.get_card(self.get_card_index_at(position))
+
+    def get_number_of_cards(self):
+        """
+        Return the number of cards remaining in the deck
+        """
+        return self.__size() - self.__top
+
+    def get_order(self):
+        """
+        Return the remaining card indexes in deck order, top card first. This
+        builds the whole order, so it costs memory in proportion to the deck
+        """
+        return array('q', (self.get_card_index_at(i)
+                           for i in range(self.get_number_of_cards())))
+
+    def shuffle(self):
+        """
+        Does a random shuffle of the remaining cards. Only the keys of a new
+        permutation layer are drawn, no card is touched
+        """
+        if self.__stats is not None:
+            start = time.perf_counter_ns()
+        size = self.get_number_of_cards()
+        if size > 1:
+            half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+            keys = tuple(self.__rng.getrandbits(64) for i in range(FEISTEL_ROUNDS))
+            self.__layers.append((self.__top, size, half_bits, keys))
+        if self.__stats is not None:
+            self.__stats.record('shuffle', time.perf_counter_ns() - start)
+
+    def get_top_card(self):
+        """
+        Get the top card off the deck, watching out for an empty deck. If the
+        deck doesn't contain any more cards, return None
+        """
+        if self.__stats is not None:
+            start = time.perf_counter_ns()
+        if self.get_number_of_cards() == 0:
+            c = None
+        else:
+            c = self.get_card_at(0)
+            self.__top += 1
+        if self.__stats is not None:
+            self.__stats.record('draw', time.perf_counter_ns() - start)
+        return c
+
+    def draw_many(self, k):
+        """
+        Draw up to k cards off the top of the deck in one call. If the deck
+        runs out, the returned list holds the cards that were left
+        """
+        if self.__stats is not None:
+            start = time.perf_counter_ns()
+        count = min(k, self.get_number_of_cards())
+        cards = [self.get_card_at(i) for i in range(count)]
+        self.__top += count
+        if self.__stats is not None:
+            self.__stats.record('draw', time.perf_counter_ns() - start)
+        return cards
+
+    def draw_indexes(self, k):
+        """
+        Draw up to k cards off the top of the deck and return their card
+        indexes, without creating Card objects
+        """
+        if self.__stats is not None:
+            start = time.perf_counter_ns()
+        count = min(k, self.get_number_of_cards())
+        drawn = array('q', (self.get_card_index_at(i) for i in range(count)))
+        self.__top += count
+        if self.__stats is not None:
+            self.__stats.record('draw', time.perf_counter_ns() - start)
+        return drawn
+
+    def discard(self, k):
+        """
+        Remove up to k cards off the top of the deck without working out
+        which cards they are. Returns the number of cards removed
+        """
+        count = min(k, self.get_number_of_cards())
+        self.__top += count
+        return count
+
+    def sort_cards_by(self, sort_by):
+        """
+        Sorts the cards in the order specified by sort_by. The sorted order
+        is worked out arithmetically, so it is only available before any
+        card has been drawn. Returns False if a suit is not in the deck
+
+        Parameters
+        ----------
+        sort_by: list of str, required
+            A list of suits that specifies what order to sort the deck. The
+            sorted cards are also sorted by card value
+
+        Raises ValueError if cards have already been drawn
+        """
+        names = [name for name, rank in self.__suit_items]
+        for s in sort_by:
+            if s not in names:
+                return False
+        if self.__top != 0:
+            raise ValueError('a lazy deck can only be sorted before cards are drawn')
+        self.__suit_order = tuple(names.index(s) for s in sort_by)
+        self.__layers = []
+        return True
+
+
+class Shoe:
+    """
+    This class represents a shoe, several copies of the same deck dealt as one.
+
+    The shoe does not hold its cards in an order. It keeps how many copies
+    of each card are left, in a Fenwick tree over the card indexes, and every
+    draw picks one of the remaining cards uniformly at random. A draw costs
+    O(log n) for n distinct cards and the memory used does not grow with the
+    number of copies.
+
+    The shoe still plugs in where a Deck is used: get_order, get_deck,
+    get_card_at, set_order and sort_cards_by fix an order for the cards left,
+    a random one unless it is sorted or set, and the draws then follow it
+    until the shoe is shuffled or reset. Only a fixed order costs memory in
+    proportion to the number of cards.
+
+    ...
+
+    Attributes
+    ----------
+    __card_range: int
+        the range of the cards to use, it represents the cards from 1 to __card_range
+
+    __suits: dict
+        the suits and suit rank to use for the cards
+
+    __suit_items: tuple of (str, int)
+        the suit names and ranks, indexed by suit index
+
+    __copies: int
+        the number of copies of each card in a full shoe
+
+    __suit_index, __suit_rank, __value: array of int
+        the card tables, shared with the DeckTemplate
+
+    __template: DeckTemplate
+        the shared template the card tables come from
+
+    __cards: tuple of Card
+        the template's Card of each card index, None until a card is asked for
+
+    __counts: array of int
+        the number of copies left of each card
+
+    __tree: array of int
+        Fenwick tree over __counts, __tree[i] covers the cards up to index i - 1
+
+    __remaining: int
+        the number of cards left in the shoe
+
+    __order: array of int
+        the card indexes left in deck order, None while the draws are random
+
+    __top: int
+        the position of the top card in __order
+
+    __rng: random.Random
+        the random number generator the cards are drawn with
+
+    __stats: GameStats
+        where draw timings are recorded, None to not record them
+
+    Methods
+    -------
+    get_card_range:
+        returns the __card_range value
+
+    get_suits:
+        returns the __suits value
+
+    get_suit_items:
+        returns the suit names and ranks in suit index order
+
+    get_copies:
+        returns the number of copies of each card in a full shoe
+
+    get_card(card_index):
+        returns a Card for the specified card index
+
+    get_count(card_index):
+        returns the number of copies left of a card
+
+    get_number_of_cards:
+        returns the number of cards remaining in the shoe
+
+    get_order:
+        fixes the order of the cards left and returns their card indexes
+
+    set_order(order):
+        puts the shoe in the order of the card indexes in order
+
+    get_deck:
+        returns a live view of the cards left, in the fixed order
+
+    get_card_at(position):
+        returns the Card at a position of the fixed order
+
+    sort_cards_by(sort_by):
+        fixes the order of the cards left sorted by suit and value
+
+    shuffle:
+        goes back to drawing at random
+
+    reset:
+        puts every card back in the shoe
+
+    get_top_card:
+        draws a random card
+
+    draw_many(k):
+        draws up to k random cards
+
+    draw_indexes(k):
+        draws up to k random card indexes
+
+    discard(k):
+        removes up to k random cards without drawing them
+
+    get_suit_indexes, get_suit_ranks, get_values:
+        return the card tables
+
+    """
+    def __init__(self, card_range, suits, copies, rng=None, stats=None):
+        """
+        Parameters
+        ----------
+        card_range: int
+            the value for __card_range
+
+        suits: dict
+            the card suits and rank to use for the cards
+
+        copies: int
+            the number of copies of each card
+
+        rng: random.Random, optional
+            the random number generator to draw with, defaults to the
+            module level random generator
+
+        stats: GameStats, optional
+            records the time spent drawing
+        """
+        if copies < 1:
+            raise ValueError('a shoe needs at least one copy of the deck')
+        self.__card_range = card_range
+        self.__suits = suits
+        self.__suit_items = tuple(suits.items())
+        self.__copies = copies
+        self.__rng = random if rng is None else rng
+        self.__stats = stats
+        template = get_deck_template(card_range, self.__suit_items)
+        self.__template = template
+        self.__cards = None
+        self.__suit_index = template.get_suit_indexes()
+        self.__suit_rank = template.get_suit_ranks()
+        self.__value = template.get_values()
+        self.reset()
+
+    def __str__(self):
+        """
+        Returns the string representation for the Shoe
+        """
+        return "Card/range: {}, Suits: {}, Copies: {}".format(
+            self.__card_range, self.__suits, self.__copies)
+
+    def get_card_range(self):
+        """
+        Return the value of __card_range
+        """
+        return self.__card_range
+
+    def get_suits(self):
+        """
+        Return the value of __suits
+        """
+        return self.__suits
+
+    def get_suit_items(self):
+        """
+        Return the (suit name, suit rank) pairs, indexed by suit index
+        """
+        return self.__suit_items
+
+    def get_copies(self):
+        """
+        Return the number of copies of each card in a full shoe
+        """
+        return self.__copies
+
+    def get_card(self, card_index):
+        """
+        Return a Card for the specified card index
+        """
+        cards = self.__cards
+        if cards is None:
+            cards = self.__cards = self.__template.get_cards()
+        return cards[card_index]
+
+    def get_count(self, card_index):
+        """
+        Return the number of copies left of the card at card_index
+        """
+        return self.__counts[card_index]
+
+    def get_number_of_cards(self):
+        """
+        Return the number of cards remaining in the shoe
+        """
+        return self.__remaining
+
+    def get_suit_indexes(self):
+        """
+        Return the suit index of each card
+        """
+        return self.__suit_index
+
+    def get_suit_ranks(self):
+        """
+        Return the suit rank of each card
+        """
+        return self.__suit_rank
+
+    def get_values(self):
+        """
+        Return the value of each card
+        """
+        return self.__value
+
+    def shuffle(self):
+        """
+        Go back to drawing at random if an order was fixed, each draw is
+        then a uniform pick from the cards left
+        """
+        self.__order = None
+
+    def reset(self):
+        """
+        Put every card back in the shoe
+        """
+        self.__set_counts(array('q', [self.__copies]) * len(self.__value))
+        self.__order = None
+
+    def __set_counts(self, counts):
+        """
+        Set the number of copies left of each card and rebuild the Fenwick tree
+        """
+        size = len(counts)
+        self.__counts = counts
+        # build the Fenwick tree in O(n), each node passes its total to its parent
+        tree = array('q', [0]) + counts
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self.__tree = tree
+        self.__remaining = sum(counts)
+        self.__top = 0
+
+    def __fixed_order(self):
+        """
+        Return the fixed order of the shoe, fixing a random one of the cards
+        left if there is none
+        """
+        if self.__order is None:
+            order = array('i')
+            for c, count in enumerate(self.__counts):
+                order.extend([c] * count)
+            rng = self.__rng
+            for i in reversed(range(1, len(order))):
+                j = int(rng.random() * (i + 1))
+                order[i], order[j] = order[j], order[i]
+            self.__order = order
+            self.__top = 0
+        return self.__order
+
+    def get_order(self):
+        """
+        Return the card indexes left in deck order, top card first. A shoe
+        drawing at random first fixes a random order, which the next draws
+        follow
+        """
+        return self.__fixed_order()[self.__top:]
+
+    def set_order(self, order):
+        """
+        Replace the cards in the shoe with the card indexes in order, top
+        card first, as returned by get_order. Raises ValueError if an index
+        is not a card of the shoe or appears more than get_copies() times
+        """
+        order = array('i', order)
+        counts = array('q', bytes(8 * len(self.__value)))
+        for c in order:
+            if not -1 < c < len(counts) or counts[c] == self.__copies:
+                raise ValueError('card index {} is not valid for the shoe'.format(c))
+            counts[c] += 1
+        self.__set_counts(counts)
+        self.__order = order
+
+    def get_deck(self):
+        """
+        Return a live view of the cards left, top card first. The shoe's
+        order is fixed as by get_order
+        """
+        self.__fixed_order()
+        return CardSequence(self)
+
+    def get_card_at(self, position):
+        """
+        Return the Card at the specified position of the fixed order,
+        counted from the top of the shoe
+        """
+        return self.get_card(self.__fixed_order()[self.__top + position])
+
+    def sort_cards_by(self, sort_by):
+        """
+        Sorts the cards left in the order specified by sort_by, the draws
+        then follow that order. As for a Deck, the cards of suits not in
+        sort_by are removed. Returns False if a suit is not in the shoe
+
+        Parameters
+        ----------
+        sort_by: list of str, required
+            A list of suits that specifies what order to sort the shoe. The
+            sorted cards are also sorted by card value
+
+        """
+        for s in sort_by:
+            if s not in self.__suits:
+                return False
+        names = tuple(name for name, rank in self.__suit_items)
+        counts = self.__counts
+        order = array('i')
+        for c in get_sorted_order(self.__card_range, names, tuple(sort_by)):
+            order.extend([c] * counts[c])
+        self.set_order(order)
+        return True
+
+    def __draw_index(self):
+        """
+        Remove a card, the next of the fixed order or a random one, and
+        return its index, the shoe must not be empty
+        """
+        tree = self.__tree
+        size = len(tree) - 1
+        if self.__order is not None:
+            pos = self.__order[self.__top]
+            self.__top += 1
+        else:
+            # find the card holding the r-th remaining copy
+            r = self.__rng.randrange(self.__remaining)
+            pos = 0
+            bit = 1 << (size.bit_length() - 1)
+            while bit:
+                nxt = pos + bit
+                if nxt <= size and tree[nxt] <= r:
+                    pos = nxt
+                    r -= tree[nxt]
+                bit >>= 1
+        i = pos + 1
+        while i <= size:
+            tree[i] -= 1
+            i += i & -i
+        self.__counts[pos] -= 1
+        self.__remaining -= 1
+        return pos
+
+    def get_top_card(self):
+        """
+        Draw a random card from the shoe. If the shoe doesn't contain any
+        more cards, return None
+        """
+        if self.__stats is not None:
+            start = time.perf_counter_ns()
+        c = self.get_card(self.__draw_index()) if self.__remaining else None
+        if self.__stats is not None:
+            self.__stats.record('draw', time.perf_counter_ns() - start)
+        return c
+
+    def draw_many(self, k):
+        """
+        Draw up to k random cards in one call. If the shoe runs out, the
+        returned list holds the cards that were left
+        """
+        if self.__stats is not None:
+            start = time.perf_counter_ns()
+        count = min(k, self.__remaining)
+        cards = [self.get_card(self.__draw_index()) for i in range(count)]
+        if self.__stats is not None:
+            self.__stats.record('draw', time.perf_counter_ns() - start)
+        return cards
+
+    def draw_indexes(self, k):
+        """
+        Draw up to k random cards in one call and return their card
+        indexes, without creating Card objects
+        """
+        if self.__stats is not None:
+            start = time.perf_counter_ns()
+        count = min(k, self.__remaining)
+        drawn = array('i', [self.__draw_index() for i in range(count)])
+        if self.__stats is not None:
+            self.__stats.record('draw', time.perf_counter_ns() - start)
+        return drawn
+
+    def discard(self, k):
+        """
+        Remove up to k random cards without creating Card objects for them.
+        Returns the number of cards removed
+        """
+        count = min(k, self.__remaining)
+        for i in range(count):
+            self.__draw_index()
+        return count
+
+
 class Player:
     """
     This class represents a game player
@@ -246,7 +1621,12 @@ class Player:
     Attributes
     ----------
     __hand: list
-        the last hand drawn by the player
+        the last hand drawn by the player, Card objects or the card indexes
+        of __hand_deck
+
+    __hand_deck: Deck
+        the deck the card indexes of __hand belong to, None if __hand
+        holds Card objects
 
     __score: int
         the cummulative score for the player
@@ -254,6 +1634,12 @@ class Player:
     __id: str
         the player's name
 
+    __leaderboard: Leaderboard
+        told about every change of the score, None if there is none
+
+    __scoring_rule: ScoringRule
+        scores the hands, None for the suit rank times value of the game
+
     Methods
     -------
     get_id:
@@ -274,12 +1660,38 @@ class Player:
     score_hand(hand):
         scores the specified hand of cards
 
+    score_card_indexes(hand, deck):
+        scores a hand of card indexes of deck
+
     """
 
-    def __init__(self):
+    def __init__(self, rng=None, leaderboard=None, player_id=None, scoring_rule=None):
+        """
+        Parameters
+        ----------
+        rng: random.Random, optional
+            the random number generator used to pick the player's name,
+            defaults to the module level random generator
+
+        leaderboard: Leaderboard, optional
+            the leaderboard to report the player's score to
+
+        player_id: str, optional
+            the player's name, picked at random if not given
+
+        scoring_rule: ScoringRule, optional
+            the rule that scores the player's hands, from cards.scoring
+        """
         self.__hand = []
+        self.__hand_deck = None
         self.__score = 0
-        self.__id = random.choice(NAMES)
+        if player_id is None:
+            player_id = (random if rng is None else rng).choice(NAMES)
+        self.__id = player_id
+        self.__leaderboard = leaderboard
+        self.__scoring_rule = scoring_rule
+        if leaderboard is not None:
+            leaderboard.add(self, self.__score)
 
     def get_id(self):
         """
@@ -292,11 +1704,15 @@ class Player:
         set the current player's hand
         """
         self.__hand = cards
+        self.__hand_deck = None
 
     def get_hand(self):
         """
-        return the current hand
+        return the current hand, a hand dealt as card indexes is turned
+        into Card objects here
         """
+        if self.__hand_deck is not None:
+            return [self.__hand_deck.get_card(c) for c in self.__hand]
         return self.__hand
 
     def score(self, value):
@@ -304,6 +1720,8 @@ class Player:
         set the current score
         """
         self.__score = value
+        if self.__leaderboard is not None:
+            self.__leaderboard.update(self, value)
 
     def get_score(self):
         """
@@ -317,15 +1735,41 @@ class Player:
 
         The score is the cummulative score of all cards. A card's score
         is the value of the suit's rank multiplied by the value of the
-        card
+        card, unless the player has a scoring rule
         """
-        score = 0
-        for card in hand:
-            rank = card.get_suit_rank()
-            value = card.get_value()
-            score += rank * value
+        if self.__scoring_rule is not None:
+            score = self.__scoring_rule.score_hand(hand)
+        else:
+            score = 0
+            for card in hand:
+                rank = card.get_suit_rank()
+                value = card.get_value()
+                score += rank * value
         self.__score += score
         self.__hand = hand
+        self.__hand_deck = None
+        if self.__leaderboard is not None:
+            self.__leaderboard.update(self, self.__score)
+
+    def score_card_indexes(self, hand, deck):
+        """
+        Score a hand given as card indexes of deck, as drawn by
+        deck.draw_indexes. The cards are scored from the deck's rank and
+        value tables, Card objects are only created if get_hand asks for them
+        """
+        if self.__scoring_rule is not None:
+            score = self.__scoring_rule.score_card_indexes(hand, deck)
+        else:
+            ranks = deck.get_suit_ranks()
+            values = deck.get_values()
+            score = 0
+            for c in hand:
+                score += ranks[c] * values[c]
+        self.__score += score
+        self.__hand = hand
+        self.__hand_deck = deck
+        if self.__leaderboard is not None:
+            self.__leaderboard.update(self, self.__score)
 
 class Players:
     """
@@ -353,17 +1797,34 @@ class Players:
         returns the value of __number_of_players
     """
 
-    def __init__(self, number_of_players):
+    def __init__(self, number_of_players, rng=None, leaderboard=None, player_ids=None,
+                 scoring_rule=None):
         """
         Parameters
         ----------
         number_of_players: int
             number of players in the game
+
+        rng: random.Random, optional
+            the random number generator handed to each Player
+
+        leaderboard: Leaderboard, optional
+            the leaderboard every Player reports its score to, players join
+            it in seat order
+
+        player_ids: sequence of str, optional
+            the name of the player in each seat, picked at random if not given
+
+        scoring_rule: ScoringRule, optional
+            the rule that scores every player's hands
         """
+        if player_ids is not None and len(player_ids) != number_of_players:
+            raise ValueError('one player id is needed per player')
         self.__players = []
         self.__number_of_players = number_of_players
-        for i in range(1,self.__number_of_players+1):
-            self.__players.append(Player())
+        for i in range(self.__number_of_players):
+            player_id = None if player_ids is None else player_ids[i]
+            self.__players.append(Player(rng, leaderboard, player_id, scoring_rule))
 
     def get_players(self):
         """
@@ -387,33 +1848,256 @@ class Players:
         return self.__number_of_players
 
 
+# Game events, handed to the listener of Game.deal and Game.play
+
+# a player's turn to draw a hand starts
+TurnEvent = namedtuple('TurnEvent', ['turn', 'seat', 'player_id'])
+
+# a card was drawn into the current hand
+CardDrawnEvent = namedtuple('CardDrawnEvent', ['turn', 'seat', 'index', 'suit', 'rank', 'value'])
+
+# a hand was scored, score is the player's cumulative score
+HandScoredEvent = namedtuple('HandScoredEvent', ['turn', 'seat', 'hand_score', 'score'])
+
+# all cards have been drawn and the winner determined
+GameFinishedEvent = namedtuple('GameFinishedEvent',
+                               ['winner_seat', 'winner_id', 'winning_score', 'player_ids', 'scores'])
+
+
+class DebugPrinter:
+    """
+    This class is a game event listener that prints the debug output of a game
+    """
+    def __call__(self, event):
+        """
+        Print the debug lines for an event
+        """
+        if isinstance(event, CardDrawnEvent):
+            print('\t{} card:{} rank:{} value:{}'.format(event.index, event.suit,
+                                                          event.rank, event.value))
+        elif isinstance(event, TurnEvent):
+            print(40 * '-')
+            print('{} Playing: {}'.format(event.turn, event.player_id))
+        elif isinstance(event, HandScoredEvent):
+            print('\tScore {}'.format(event.score))
+        elif isinstance(event, GameFinishedEvent):
+            print('Scoring...')
+            for player_id, score in zip(event.player_ids, event.scores):
+                print('Score for {} is {}'.format(player_id, score))
+
+
+def combine_listeners(*listeners):
+    """
+    Return a listener that hands each event to all the given listeners,
+    None entries are skipped. Returns None when there is nothing to call
+    """
+    listeners = [l for l in listeners if l is not None]
+    if not listeners:
+        return None
+    if len(listeners) == 1:
+        return listeners[0]
+    def listener(event):
+        for l in listeners:
+            l(event)
+    return listener
+
+
+class GameResult:
+    """
+    This class holds the outcome of a game
+
+    ...
+
+    Attributes
+    ----------
+    __player_ids: tuple of str
+        the name of the player in each seat
+
+    __scores: tuple of int
+        the final score of each seat
+
+    __winners: tuple of int
+        the seats with the highest score, more than one when the game is tied
+
+    __trajectory: array of int
+        the cumulative score of every seat after every round, round by round
+
+    Methods
+    -------
+    get_winner:
+        returns the winning seat, the lowest seat of a tie
+
+    get_winners:
+        returns all the seats with the highest score
+
+    is_tie:
+        returns True if more than one seat has the highest score
+
+    get_winner_id:
+        returns the name of the winning player
+
+    get_winning_score:
+        returns the highest score
+
+    get_scores:
+        returns the final score of each seat
+
+    get_player_ids:
+        returns the name of the player in each seat
+
+    get_trajectory:
+        returns the per round scores as a flat array
+
+    get_number_of_rounds:
+        returns the number of rounds played
+
+    get_round_scores(round_number):
+        returns the cumulative scores after a round
+
+    """
+    def __init__(self, player_ids, scores, trajectory):
+        """
+        Parameters
+        ----------
+        player_ids: sequence of str
+            the name of the player in each seat
+
+        scores: sequence of int
+            the final score of each seat
+
+        trajectory: array of int
+            the cumulative scores of all seats after each round
+        """
+        self.__player_ids = tuple(player_ids)
+        self.__scores = tuple(scores)
+        best = max(self.__scores) if self.__scores else 0
+        self.__winners = tuple(seat for seat, score in enumerate(self.__scores) if score == best)
+        self.__trajectory = trajectory
+
+    def __str__(self):
+        """
+        Returns the string representation of the result
+        """
+        if self.is_tie():
+            return 'Game tied between {} with a score of {}'.format(
+                ', '.join(str(self.__player_ids[seat]) for seat in self.__winners),
+                self.get_winning_score())
+        return 'Game won by {} with a score of {}'.format(
+            self.get_winner_id(), self.get_winning_score())
+
+    def get_winner(self):
+        """
+        Returns the winning seat. For a tie this is the lowest tied seat
+        """
+        return self.__winners[0] if self.__winners else None
+
+    def get_winners(self):
+        """
+        Returns all the seats with the highest score
+        """
+        return self.__winners
+
+    def is_tie(self):
+        """
+        Returns True if more than one seat has the highest score
+        """
+        return len(self.__winners) > 1
+
+    def get_winner_id(self):
+        """
+        Returns the name of the winning player
+        """
+        winner = self.get_winner()
+        return None if winner is None else self.__player_ids[winner]
+
+    def get_winning_score(self):
+        """
+        Returns the highest score of the game
+        """
+        winner = self.get_winner()
+        return 0 if winner is None else self.__scores[winner]
+
+    def get_scores(self):
+        """
+        Returns the final score of each seat
+        """
+        return self.__scores
+
+    def get_player_ids(self):
+        """
+        Returns the name of the player in each seat
+        """
+        return self.__player_ids
+
+    def get_trajectory(self):
+        """
+        Returns the cumulative score of every seat after every round, as a
+        flat array of number of rounds times number of seats entries
+        """
+        return self.__trajectory
+
+    def get_number_of_rounds(self):
+        """
+        Returns the number of rounds played
+        """
+        if not self.__scores:
+            return 0
+        return len(self.__trajectory) // len(self.__scores)
+
+    def get_round_scores(self, round_number):
+        """
+        Returns the cumulative scores of all seats after the round round_number
+        """
+        seats = len(self.__scores)
+        return self.__trajectory[round_number * seats:(round_number + 1) * seats]
+
+
 class Game:
     """
     This class represents the actual game and contains the logic for it
 
+    A Game keeps no state between the games it plays, the deck and players
+    of a game hold all of it, so one Game can play games in several threads
+    at once
+
     Attributes
     ----------
     __num_cards_per_hand: int
         the number of cards to draw for a hand
 
+    __stats: GameStats
+        where scoring, winner selection and game timings are recorded, None
+        to not record them
+
     Methods
     -------
 
     get_num_cards_per_hand:
         returns the number of cards to use in a hand
 
+    get_stats:
+        returns the GameStats of the game, or None
+
+    deal:
+        deal and score all the hands of a game
+
     play:
-        play the game
+        play the game and return a GameResult
 
     """
-    def __init__(self, cards_per_hand):
+    def __init__(self, cards_per_hand, stats=None):
         """
         Attributes
         ----------
         cards_per_hand:
             the number of cards to use in a hand
+
+        stats: GameStats, optional
+            records the time spent scoring hands, picking the winner and
+            playing whole games
         """
         self.__num_cards_per_hand = cards_per_hand
+        self.__stats = stats
 
     def get_num_cards_per_hand(self):
         """
@@ -421,59 +2105,388 @@ class Game:
         """
         return self.__num_cards_per_hand
 
-    def play(self, players, deck, debug=False):
+    def get_stats(self):
         """
-        play the game. The game's logic is that each player draws the
-        number of cards to be used in  a hand. Each hand is individually
-        scored. The game is played until all cards have been drawn.
+        Returns the GameStats of the game, or None if it is not instrumented
         """
-        d = deck
+        return self.__stats
+
+    def deal(self, players, deck, debug=False, listener=None):
+        """
+        deal the game's hands. Each player draws the number of cards to be
+        used in a hand and each hand is individually scored, until all
+        cards have been drawn. The winner is not determined. Returns the
+        cumulative score of every seat after every round as a flat array
+
+        listener, if given, is called with a TurnEvent, CardDrawnEvent and
+        HandScoredEvent for every turn, card and hand. With debug set the
+        events are also printed
+        """
+        if debug:
+            listener = combine_listeners(DebugPrinter(), listener)
         p = players
+        num_cards = self.get_num_cards_per_hand()
+        stats = self.__stats
 
         # play game. Each player draws the specified number of cards
         # by talking the cards off the top of the deck. Once the deck
         # is empty, leave the draw cards loop and score the hand
         done = False
-        iterations = 0
+        turn = 0
+        trajectory = array('q')
         while not done:
-            for player in p.get_players():
-                hand = []
-                if debug:
-                    print(40 * '-')
-                    print('{} Playing: {}'.format(iterations, player.get_id()))
-                    iterations += 1
-                counter = 0
-                for i in range(1,self.get_num_cards_per_hand()+1):
-                    card = deck.get_top_card()
-                    if not card:
-                        done = True
-                        break
-                    if debug:
-                        print('\t{} card:{} rank:{} value:{}'.format(counter,
-                                                    card.get_suit_name(),
-                                                    card.get_suit_rank(),
-                                                    card.get_value()))
-                        counter += 1
-                    hand.append(card)
-                player.score_hand(hand)
-                if debug:
-                    print('\tScore {}'.format(player.get_score()))
+            for seat, player in enumerate(p.get_players()):
+                if listener is not None:
+                    listener(TurnEvent(turn, seat, player.get_id()))
+                # the hand is drawn and scored as card indexes, Card
+                # objects are only made for the listener
+                hand = deck.draw_indexes(num_cards)
+                if len(hand) < num_cards:
+                    done = True
+                if listener is not None:
+                    for counter, c in enumerate(hand):
+                        card = deck.get_card(c)
+                        listener(CardDrawnEvent(turn, seat, counter,
+                                                card.get_suit_name(),
+                                                card.get_suit_rank(),
+                                                card.get_value()))
+                    before = player.get_score()
+                if stats is None:
+                    player.score_card_indexes(hand, deck)
+                else:
+                    start = time.perf_counter_ns()
+                    player.score_card_indexes(hand, deck)
+                    stats.record('score', time.perf_counter_ns() - start)
+                if listener is not None:
+                    listener(HandScoredEvent(turn, seat, player.get_score() - before,
+                                             player.get_score()))
+                turn += 1
+            trajectory.extend(player.get_score() for player in p.get_players())
             if done: break
+        return trajectory
+
+    def play(self, players, deck, debug=False, listener=None):
+        """
+        play the game. The game's logic is that each player draws the
+        number of cards to be used in  a hand. Each hand is individually
+        scored. The game is played until all cards have been drawn.
+        Returns a GameResult, the highest score wins and every seat sharing
+        it is listed as a winner
+
+        listener, if given, receives the events of Game.deal and a final
+        GameFinishedEvent
+        """
+        if debug:
+            listener = combine_listeners(DebugPrinter(), listener)
+        stats = self.__stats
+        if stats is not None:
+            game_start = time.perf_counter_ns()
+        p = players
+        trajectory = self.deal(players, deck, listener=listener)
+
         # score the game and determine the winner
-        if debug: print('Scoring...')
-        max_score = 0
-        max_id = 0
-
-        for player in p.get_players():
-            score = player.get_score()
-            if debug:
-                print('Score for {} is {}'.format(player.get_id(), score))
-            if score > max_score:
-                max_score = player.get_score()
-                max_id = player.get_id()
-
-        print('Game won by {} with a score of {}'.format(max_id, max_score))
-        return
+        if stats is not None:
+            start = time.perf_counter_ns()
+        result = GameResult([player.get_id() for player in p.get_players()],
+                            [player.get_score() for player in p.get_players()],
+                            trajectory)
+        if stats is not None:
+            stats.record('winner', time.perf_counter_ns() - start)
+
+        if listener is not None:
+            listener(GameFinishedEvent(result.get_winner(), result.get_winner_id(),
+                                       result.get_winning_score(),
+                                       result.get_player_ids(), result.get_scores()))
+
+        if stats is not None:
+            stats.record('game', time.perf_counter_ns() - game_start)
+        return result
+
+
+class GameSpec:
+    """
+    This class is the compiled, validated settings of a game. It is
+    hashable, so it can key caches, and builds the game, players and deck
+    for a game from the cached deck template
+
+    ...
+
+    Attributes
+    ----------
+    __number_of_players: int
+        the number of players in the game
+
+    __cards_per_hand: int
+        the number of cards drawn per hand
+
+    __card_range: int
+        the cards of each suit run from 1 to __card_range
+
+    __suit_items: tuple of (str, int)
+        the suit names and ranks, in deck order
+
+    Methods
+    -------
+    from_options(options):
+        compiles the spec from the command line options
+
+    compile(number_of_players, cards_per_hand, card_range, suits):
+        returns the cached spec for the settings
+
+    from_dict(settings, defaults):
+        compiles the spec from a dictionary such as a parsed JSON object
+
+    get_number_of_players:
+        returns the number of players
+
+    get_cards_per_hand:
+        returns the number of cards per hand
+
+    get_card_range:
+        returns the card range
+
+    get_suits:
+        returns the suits as a dictionary of suit name to rank
+
+    get_suit_items:
+        returns the suits as a tuple of (name, rank) pairs
+
+    get_deck_size:
+        returns the number of cards in the deck
+
+    get_template:
+        returns the shared DeckTemplate
+
+    create_game(stats):
+        returns a new Game
+
+    create_players(rng, scoring_rule):
+        returns new Players
+
+    create_deck(rng, stats, lazy):
+        returns a new, shuffled Deck or LazyDeck
+
+    create_shoe(copies, rng, stats):
+        returns a new, full Shoe
+
+    play(rng, stats, scoring_rule, listener):
+        plays a game with new players and deck drawn from one rng
+
+    """
+    def __init__(self, number_of_players, cards_per_hand, card_range, suits):
+        """
+        Parameters
+        ----------
+        number_of_players: int
+            number of players in the game
+
+        cards_per_hand: int
+            the number of cards drawn per hand
+
+        card_range: int
+            the cards of each suit run from 1 to card_range
+
+        suits: str, dict or tuple of (str, int)
+            the suits and their rank, as the command line string, a
+            dictionary of suit name to rank or a tuple of pairs
+
+        Raises ValueError if a setting is not valid, including a number
+        that is not whole such as 13.7
+        """
+        if isinstance(suits, str):
+            suits = parse_suits(suits)
+        if isinstance(suits, dict):
+            suits = suits.items()
+        self.__suit_items = tuple((str(name), whole_number(rank, 'suit rank'))
+                                  for name, rank in suits)
+        self.__number_of_players = whole_number(number_of_players, 'number of players')
+        self.__cards_per_hand = whole_number(cards_per_hand, 'number of cards per hand')
+        self.__card_range = whole_number(card_range, 'range of cards')
+
+        if self.__number_of_players < 1:
+            raise ValueError('number of players must be at least 1')
+        if self.__cards_per_hand < 1:
+            raise ValueError('number of cards per hand must be at least 1')
+        if self.__card_range < 1:
+            raise ValueError('range of cards must be at least 1')
+        if not self.__suit_items:
+            raise ValueError('at least one suit is needed')
+        if len(set(name for name, rank in self.__suit_items)) != len(self.__suit_items):
+            raise ValueError('suit names must be unique')
+
+    def __key(self):
+        return (self.__number_of_players, self.__cards_per_hand,
+                self.__card_range, self.__suit_items)
+
+    def __eq__(self, other):
+        """
+        Specs are equal when all their settings are equal
+        """
+        if not isinstance(other, GameSpec):
+            return NotImplemented
+        return self.__key() == other.__key()
+
+    def __hash__(self):
+        """
+        Returns a hash consistent with __eq__
+        """
+        return hash(self.__key())
+
+    def __str__(self):
+        """
+        Returns the string representation of the spec
+        """
+        return 'Players: {}, Cards per hand: {}, Range: {}, Suits: {}'.format(
+            self.__number_of_players, self.__cards_per_hand,
+            self.__card_range, self.get_suits())
+
+    @classmethod
+    def from_options(cls, options):
+        """
+        Compile the spec from the parsed command line options, using the
+        defaults for the options that are not set
+        """
+        players = DEFAULT_NUMBER_OF_PLAYERS
+        num_of_cards_per_hand = DEFAULT_NUMBER_OF_CARDS_PER_HAND
+        suits = DEFAULT_SUITS
+        card_range = DEFAULT_RANGE_OF_CARDS
+
+        # check to see if any of the defaults are to be overridden
+        if options.players is not None:
+            players = options.players
+        if options.num_of_cards is not None:
+            num_of_cards_per_hand = options.num_of_cards
+        if options.range is not None:
+            card_range = options.range
+        if options.suits is not None:
+            suits = options.suits
+
+        return cls.compile(players, num_of_cards_per_hand, card_range, suits)
+
+    @classmethod
+    def compile(cls, number_of_players, cards_per_hand, card_range, suits):
+        """
+        Return the spec for the settings. Every spec is cached, keyed by
+        the settings once the numbers are checked to be whole, so
+        compiling the same settings again, as numbers or as command line
+        strings, is a dictionary lookup
+
+        Raises ValueError if a setting is not valid
+        """
+        if isinstance(suits, dict):
+            suits = tuple(suits.items())
+        if isinstance(suits, tuple):
+            suits = tuple((name, whole_number(rank, 'suit rank')) for name, rank in suits)
+        return _compile_spec(whole_number(number_of_players, 'number of players'),
+                             whole_number(cards_per_hand, 'number of cards per hand'),
+                             whole_number(card_range, 'range of cards'),
+                             suits)
+
+    @classmethod
+    def from_dict(cls, settings, defaults=None):
+        """
+        Compile the spec from a dictionary with any of the keys "players",
+        "cards_per_hand", "range" and "suits", other keys are ignored. The
+        settings left out are taken from the defaults spec, or the game
+        defaults. "suits" is a suit string or a dictionary of suit name
+        to rank
+        """
+        if defaults is None:
+            defaults = cls.compile(DEFAULT_NUMBER_OF_PLAYERS, DEFAULT_NUMBER_OF_CARDS_PER_HAND,
+                                   DEFAULT_RANGE_OF_CARDS, DEFAULT_SUITS)
+        suits = settings.get('suits', defaults.get_suit_items())
+        if isinstance(suits, dict):
+            suits = tuple(suits.items())
+        elif not isinstance(suits, (str, tuple)):
+            raise ValueError('suits must be a string or a dictionary of suit name to rank')
+        return cls.compile(settings.get('players', defaults.get_number_of_players()),
+                           settings.get('cards_per_hand', defaults.get_cards_per_hand()),
+                           settings.get('range', defaults.get_card_range()),
+                           suits)
+
+    def get_number_of_players(self):
+        """
+        Return the number of players
+        """
+        return self.__number_of_players
+
+    def get_cards_per_hand(self):
+        """
+        Return the number of cards drawn per hand
+        """
+        return self.__cards_per_hand
+
+    def get_card_range(self):
+        """
+        Return the card range
+        """
+        return self.__card_range
+
+    def get_suits(self):
+        """
+        Return the suits as a new dictionary of suit name to rank
+        """
+        return dict(self.__suit_items)
+
+    def get_suit_items(self):
+        """
+        Return the suits as a tuple of (name, rank) pairs
+        """
+        return self.__suit_items
+
+    def get_deck_size(self):
+        """
+        Return the number of cards in the deck
+        """
+        return self.__card_range * len(self.__suit_items)
+
+    def get_template(self):
+        """
+        Return the shared DeckTemplate for this spec
+        """
+        return get_deck_template(self.__card_range, self.__suit_items)
+
+    def create_game(self, stats=None):
+        """
+        Return a new Game for this spec
+        """
+        return Game(self.__cards_per_hand, stats)
+
+    def create_players(self, rng=None, scoring_rule=None):
+        """
+        Return new Players for this spec, scoring with scoring_rule if given
+        """
+        return Players(self.__number_of_players, rng, scoring_rule=scoring_rule)
+
+    def create_deck(self, rng=None, stats=None, lazy=False):
+        """
+        Return a new, shuffled Deck for this spec, or a LazyDeck if lazy is set
+        """
+        if lazy:
+            return LazyDeck(self.__card_range, self.get_suits(), rng, stats)
+        return Deck(self.__card_range, self.get_suits(), rng, stats)
+
+    def create_shoe(self, copies, rng=None, stats=None):
+        """
+        Return a new Shoe of copies decks for this spec
+        """
+        return Shoe(self.__card_range, self.get_suits(), copies, rng, stats)
+
+    def play(self, rng=None, stats=None, scoring_rule=None, listener=None):
+        """
+        Play a game of this spec and return its GameResult. The players and
+        then the deck are created from rng, so a game with its own
+        random.Random shares no random state with games in other threads and
+        a seeded rng always plays the same game
+        """
+        players = self.create_players(rng, scoring_rule)
+        deck = self.create_deck(rng, stats)
+        return self.create_game(stats).play(players, deck, listener=listener)
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_spec(number_of_players, cards_per_hand, card_range, suits):
+    return GameSpec(number_of_players, cards_per_hand, card_range, suits)
 
 
 def parse_command_line ():
@@ -486,6 +2499,38 @@ def parse_command_line ():
     parser.add_argument('-p', '--players', dest='players', help='number of players')
     parser.add_argument('-n', '--number_of_cards', dest='num_of_cards', help='number of cards to play per hand')
     parser.add_argument('-d', '--debug',  action='store_true', dest='debug', help='output debug info')
+    parser.add_argument('--lazy',  action='store_true', dest='lazy',
+                        help='use a deck that draws through a permutation instead of holding its cards')
+    parser.add_argument('--shoe', dest='shoe', type=int,
+                        help='deal from a shoe of this many decks')
+    parser.add_argument('--profile',  action='store_true', dest='profile',
+                        help='output call counts and timings for the game')
+    parser.add_argument('--serve',  action='store_true', dest='serve',
+                        help='keep running and play the games requested as JSON lines on stdin')
+    parser.add_argument('--socket', dest='socket',
+                        help='keep running and play the games requested on this Unix socket')
+    parser.add_argument('-g', '--games', dest='games', type=int,
+                        help='play this many games of every configuration and report the win rates')
+    parser.add_argument('--seed', dest='seed', type=int, help='random seed, for repeatable games')
+    parser.add_argument('-c', '--config-file', dest='config_file',
+                        help='file of game configurations, one JSON object per line')
+    parser.add_argument('--sweep', dest='sweep',
+                        help='JSON file of setting lists, play --games games of every combination')
+    parser.add_argument('-o', '--output', dest='output',
+                        help='file the aggregated results of --games, as JSON, or the --sweep '
+                             'table, as CSV, are written to')
+    parser.add_argument('--target-width', dest='target_width', type=float,
+                        help='stop --games early once every win rate is known to within this width')
+    parser.add_argument('--checkpoint', dest='checkpoint',
+                        help='save the progress of --games to this file and resume from it')
+    parser.add_argument('--record', dest='record',
+                        help='append a compact record of the game to this file')
+    parser.add_argument('--replay', dest='replay',
+                        help='play the games recorded in this file again')
+    parser.add_argument('--threads',  action='store_true', dest='threads',
+                        help='play --games in threads rather than processes')
+    parser.add_argument('-w', '--workers', dest='workers', type=int,
+                        help='number of worker processes for --games, default: number of CPUs')
     parser.add_argument('-r', '--range', dest='range',
                         help='range of numbers to use, default: 13')
     parser.add_argument('-s', '--suits', dest='suits',
@@ -496,27 +2541,71 @@ def parse_command_line ():
     return options
 
 
-def initialize_variables(options):
+def card_memory_report(card_range, suits, number_of_decks=1000):
     """
-    Initialize the game's variables and create thet game, players and card deck
+    Compare the memory used by the Card objects of number_of_decks decks
+    with one suits and range, when each deck had its own cards with a
+    __dict__ per card, against the shared, slotted cards. Returns a
+    dictionary of the sizes in bytes
+    """
+    class DictCard:
+        # the layout Card had before it was slotted and interned
+        def __init__(self, suit, suit_value, value):
+            self.card_suit_name = suit
+            self.card_suit_rank = suit_value
+            self.card_value = value
+
+    suit_name, suit_rank = next(iter(suits.items()))
+    dict_card = DictCard(suit_name, suit_rank, card_range)
+    dict_card_bytes = sys.getsizeof(dict_card) + sys.getsizeof(dict_card.__dict__)
+    slots_card_bytes = sys.getsizeof(Card(suit_name, suit_rank, card_range))
+    cards_per_deck = card_range * len(suits)
+
+    per_deck = cards_per_deck * dict_card_bytes
+    shared = cards_per_deck * slots_card_bytes
+    return {
+        'cards_per_deck': cards_per_deck,
+        'dict_card_bytes': dict_card_bytes,
+        'slots_card_bytes': slots_card_bytes,
+        'unshared_bytes': per_deck * number_of_decks,
+        'shared_bytes': shared,
+        'saved_bytes_per_deck': per_deck - shared / number_of_decks,
+    }
+
+
+def whole_number(value, name):
     """
-    # set the games defaults
-    players = DEFAULT_NUMBER_OF_PLAYERS
-    num_of_cards_per_hand = DEFAULT_NUMBER_OF_CARDS_PER_HAND
-    suits = DEFAULT_SUITS
-    card_range = DEFAULT_RANGE_OF_CARDS
-
-    # check to see if any of the defaults are to be overridden
-    if options.players is not None:
-        players = options.players
-    if options.num_of_cards is not None:
-        num_of_cards_per_hand = options.num_of_cards
-    if options.range is not None:
-        card_range = options.range
-    if options.suits is not None:
-        suits = options.suits
-
-    # convert the input suit string to a dictionary
+    Return the setting value as an int. Ints, whole floats and strings of
+    an int are accepted, anything else, such as 13.7, "13.7" or True,
+    raises ValueError naming the setting
+    """
+    if not isinstance(value, bool):
+        if isinstance(value, str):
+            try:
+                return int(value)
+            except ValueError:
+                pass
+        elif isinstance(value, float):
+            if value.is_integer():
+                return int(value)
+        else:
+            try:
+                return operator.index(value)
+            except TypeError:
+                pass
+    raise ValueError('{} must be a whole number, not {!r}'.format(name, value))
+
+
+def parse_suits(suits):
+    """
+    Convert a suit string such as "diamonds:4,hearts:3" to a dictionary of
+    suit name to suit rank. The parsing is cached per string
+    """
+    return dict(_parse_suit_items(suits))
+
+
+@functools.lru_cache(maxsize=128)
+def _parse_suit_items(suits):
     card_suits = suits.split(',')
     temp = {}
     for suit in card_suits:
@@ -524,31 +2613,93 @@ def initialize_variables(options):
         t = suit[:idx]
         v = suit[idx+1:]
         temp[t] = int(v)
+    return tuple(temp.items())
+
+
+def deal_seats(number_of_players, cards_per_hand, deck_size):
+    """
+    Return the seat each deck position is dealt to by Game.play. The players
+    take turns drawing cards_per_hand cards until the deck is empty, so
+    position i goes to seat (i // cards_per_hand) % number_of_players
+    """
+    return array('i', ((i // cards_per_hand) % number_of_players
+                       for i in range(deck_size)))
+
 
-    suits = temp
+def initialize_variables(options):
+    """
+    Initialize the game's variables and create thet game, players and card deck
+    """
+    # compile the options, falling back on the defaults, to a GameSpec
+    spec = GameSpec.from_options(options)
 
     if options.debug:
         print('Options:')
-        print('\tNumber of players:        {} {}'.format(players,type(players)))
-        print('\tNumber of cards per hand: {} {}'.format(num_of_cards_per_hand,type(num_of_cards_per_hand)))
-        print('\tSuits:                    {} {}'.format(suits,type(suits)))
-        print('\tRange of cards:           {} {}'.format(card_range,type(card_range)))
+        print('\tNumber of players:        {}'.format(spec.get_number_of_players()))
+        print('\tNumber of cards per hand: {}'.format(spec.get_cards_per_hand()))
+        print('\tSuits:                    {}'.format(spec.get_suits()))
+        print('\tRange of cards:           {}'.format(spec.get_card_range()))
+
+    # instrument the game and deck when profiling
+    stats = None
+    if getattr(options, 'profile', False):
+        stats = GameStats()
+
+    # a seeded game draws its players and deck from its own random stream
+    rng = None
+    if getattr(options, 'seed', None) is not None:
+        rng = random.Random(options.seed)
 
     # Create the components and return them
-    g = Game(int(num_of_cards_per_hand))
-    p = Players(int(players))
-    d = Deck(int(card_range), suits)
+    g = spec.create_game(stats)
+    p = spec.create_players(rng)
+    if getattr(options, 'shoe', None):
+        d = spec.create_shoe(options.shoe, rng, stats)
+    else:
+        d = spec.create_deck(rng, stats, getattr(options, 'lazy', False))
 
     return g,p,d
 
 
 def main():
     options = parse_command_line()
+    if options.serve or options.socket:
+        # only the service needs asyncio, so it is imported when asked for
+        from cards import service
+        service.run(options)
+        return
+    if options.sweep:
+        # sweeps are played by the batch engine, which needs numpy
+        from cards import sweep
+        sweep.run_sweep_file(options)
+        return
+    if options.games is not None or options.config_file:
+        # many games are played by the Monte Carlo runner
+        from cards import simulation
+        simulation.run_batch(options)
+        return
+    if options.replay:
+        from cards import replay
+        replay.replay_file(options.replay, options.debug)
+        return
     game, players, deck = initialize_variables(options)
-    game.play(players, deck, options.debug)
+    if options.record:
+        # the record is taken before the game draws from the deck, a seeded
+        # Deck is recorded by its seed and any other deck or shoe by its order
+        from cards import replay
+        seed = None if options.lazy or options.shoe else options.seed
+        record = replay.record_game(GameSpec.from_options(options), players, deck, seed)
+        with open(options.record, 'ab') as f:
+            replay.write_records(f, [record])
+    result = game.play(players, deck, options.debug)
+    print(result)
+    if options.profile:
+        print(game.get_stats())
 
 
 if __name__ == '__main__':
+    # make the cards package importable when run as a script
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     main()
     quit()
 
@@ -0,0 +1,357 @@
+"""
+Checkpoint and resume for long Monte Carlo runs. A MonteCarloRunner plays
+its games in blocks, each block with its own random stream seeded from the
+master seed, so the whole state of a run is its settings, the master seed,
+the number of blocks played and the merged SimulationResult so far.
+
+run_with_checkpoints() saves that state to a small binary file as the
+blocks finish, and when started again with the same file it carries on
+after the last saved block. Because a block's games depend only on its
+seed, a resumed run ends with exactly the result of an uninterrupted one.
+
+The file is written to a temporary file next to it and moved over it with
+os.replace, so a crash while saving leaves the previous checkpoint intact.
+"""
+
+import os
+import random
+import struct
+import time
+
+from cards import simulation
+
+# checkpoint layouts, little endian
+CHECKPOINT_MAGIC = b'CGCK'
+CHECKPOINT_VERSION = 1
+HEADER_FORMAT = struct.Struct('<4sBHHIIQQQ')  # magic, version, players, cards per hand, range,
+                                              # block size, games to play, blocks done, games done
+SEED_FORMAT = struct.Struct('<H')             # length of the seed bytes, followed by the seed
+SUITS_FORMAT = struct.Struct('<B')            # number of suits
+SUIT_FORMAT = struct.Struct('<iB')            # rank, name length, followed by the name
+ENTRIES_FORMAT = struct.Struct('<I')          # number of histogram entries of a seat
+ENTRY_FORMAT = struct.Struct('<qQ')           # score, number of games
+
+# seconds between checkpoints
+DEFAULT_CHECKPOINT_INTERVAL = 30.0
+
+
+class Checkpoint:
+    """
+    This class is the saved state of a Monte Carlo run
+
+    ...
+
+    Attributes
+    ----------
+    __settings: tuple
+        the (number_of_players, cards_per_hand, card_range, suits) of the run
+
+    __block_size: int
+        the number of games per block
+
+    __number_of_games: int
+        the number of games the run plays
+
+    __seed: int
+        the master seed
+
+    __blocks_done: int
+        the number of blocks played, always the first blocks of the run
+
+    __result: SimulationResult
+        the merged result of the blocks played
+
+    Methods
+    -------
+    get_settings, get_block_size, get_number_of_games, get_seed,
+    get_blocks_done, get_result:
+        return the saved state
+
+    matches(runner, number_of_games):
+        returns True if the checkpoint belongs to a run of runner
+
+    to_bytes:
+        returns the packed checkpoint
+
+    from_bytes(data):
+        unpacks a checkpoint
+
+    """
+    def __init__(self, settings, block_size, number_of_games, seed, blocks_done, result):
+        """
+        Raises ValueError if the suits do not fit the checkpoint layout
+        """
+        suits = settings[3]
+        if len(suits) > 0xFF:
+            raise ValueError('a checkpoint holds at most 255 suits')
+        if any(len(name.encode('utf-8')) > 0xFF for name in suits):
+            raise ValueError('suit names must be at most 255 bytes long')
+        self.__settings = settings
+        self.__block_size = block_size
+        self.__number_of_games = number_of_games
+        self.__seed = seed
+        self.__blocks_done = blocks_done
+        self.__result = result
+
+    def get_settings(self):
+        """
+        Return the (number_of_players, cards_per_hand, card_range, suits) of the run
+        """
+        return self.__settings
+
+    def get_block_size(self):
+        """
+        Return the number of games per block
+        """
+        return self.__block_size
+
+    def get_number_of_games(self):
+        """
+        Return the number of games the run plays
+        """
+        return self.__number_of_games
+
+    def get_seed(self):
+        """
+        Return the master seed
+        """
+        return self.__seed
+
+    def get_blocks_done(self):
+        """
+        Return the number of blocks played
+        """
+        return self.__blocks_done
+
+    def get_result(self):
+        """
+        Return the merged result of the blocks played
+        """
+        return self.__result
+
+    def matches(self, runner, number_of_games):
+        """
+        Return True if the checkpoint was saved by a run of number_of_games
+        games with the settings of runner
+        """
+        # the suit order is part of the settings, it fixes the card indexes
+        settings = runner.get_settings()
+        return (self.__settings[:3] == settings[:3] and
+                list(self.__settings[3].items()) == list(settings[3].items()) and
+                self.__block_size == runner.get_block_size() and
+                self.__number_of_games == number_of_games)
+
+    def to_bytes(self):
+        """
+        Return the checkpoint packed into bytes
+        """
+        players, cards_per_hand, card_range, suits = self.__settings
+        result = self.__result
+        data = bytearray(HEADER_FORMAT.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION,
+                                            players, cards_per_hand, card_range,
+                                            self.__block_size, self.__number_of_games,
+                                            self.__blocks_done, result.get_games()))
+        seed = self.__seed.to_bytes((self.__seed.bit_length() + 8) // 8, 'little', signed=True)
+        data += SEED_FORMAT.pack(len(seed))
+        data += seed
+        data += SUITS_FORMAT.pack(len(suits))
+        for name, rank in suits.items():
+            name = name.encode('utf-8')
+            data += SUIT_FORMAT.pack(rank, len(name))
+            data += name
+        data += struct.pack('<{}Q'.format(players), *result.get_wins())
+        for histogram in result.get_score_histograms():
+            data += ENTRIES_FORMAT.pack(len(histogram))
+            for score in sorted(histogram):
+                data += ENTRY_FORMAT.pack(score, histogram[score])
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Unpack a checkpoint packed by to_bytes. Raises ValueError if data
+        is not a checkpoint or is truncated
+        """
+        view = memoryview(data)
+        try:
+            (magic, version, players, cards_per_hand, card_range, block_size,
+             number_of_games, blocks_done, games) = HEADER_FORMAT.unpack_from(view, 0)
+        except struct.error:
+            raise ValueError('checkpoint is too short')
+        if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+            raise ValueError('not a checkpoint')
+        try:
+            return cls.__unpack_body(view, players, cards_per_hand, card_range, block_size,
+                                     number_of_games, blocks_done, games)
+        except struct.error:
+            raise ValueError('checkpoint is truncated')
+
+    @classmethod
+    def __unpack_body(cls, view, players, cards_per_hand, card_range, block_size,
+                      number_of_games, blocks_done, games):
+        """
+        Unpack the checkpoint after its header
+        """
+        offset = HEADER_FORMAT.size
+        length, = SEED_FORMAT.unpack_from(view, offset)
+        offset += SEED_FORMAT.size
+        seed = int.from_bytes(view[offset:offset + length], 'little', signed=True)
+        offset += length
+        count, = SUITS_FORMAT.unpack_from(view, offset)
+        offset += SUITS_FORMAT.size
+        suits = {}
+        for i in range(count):
+            rank, length = SUIT_FORMAT.unpack_from(view, offset)
+            offset += SUIT_FORMAT.size
+            suits[bytes(view[offset:offset + length]).decode('utf-8')] = rank
+            offset += length
+        wins = struct.unpack_from('<{}Q'.format(players), view, offset)
+        offset += 8 * players
+        histograms = []
+        for seat in range(players):
+            entries, = ENTRIES_FORMAT.unpack_from(view, offset)
+            offset += ENTRIES_FORMAT.size
+            histogram = {}
+            for i in range(entries):
+                score, n = ENTRY_FORMAT.unpack_from(view, offset)
+                offset += ENTRY_FORMAT.size
+                histogram[score] = n
+            histograms.append(histogram)
+        result = simulation.SimulationResult.from_counts(games, wins, histograms)
+        return cls((players, cards_per_hand, card_range, suits), block_size,
+                   number_of_games, seed, blocks_done, result)
+
+
+def save_checkpoint(path, checkpoint):
+    """
+    Write a checkpoint to path, through a temporary file so the previous
+    checkpoint is kept if the write does not finish
+    """
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(checkpoint.to_bytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def load_checkpoint(path):
+    """
+    Return the Checkpoint saved at path, or None if there is none
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    return Checkpoint.from_bytes(data)
+
+
+def run_with_checkpoints(runner, number_of_games, path, seed=None, workers=None,
+                         interval=DEFAULT_CHECKPOINT_INTERVAL, use_threads=False,
+                         width=None, z=simulation.DEFAULT_Z):
+    """
+    Play number_of_games games with runner, saving a checkpoint to path at
+    most every interval seconds and when the run ends, and return the
+    merged SimulationResult. If path holds a checkpoint of the same run the
+    games already played are not played again. With a width the run stops
+    early under the rule of MonteCarloRunner.run_adaptive, and gives the
+    same result.
+
+    Parameters
+    ----------
+    runner: MonteCarloRunner
+        the settings of the games
+
+    number_of_games: int
+        the number of games to play
+
+    path: str
+        the checkpoint file
+
+    seed: int, optional
+        the master seed. Without one a resumed run keeps the seed of its
+        checkpoint and a new run picks one at random
+
+    workers: int, optional
+        the number of worker processes, defaults to the number of CPUs
+
+    interval: float, optional
+        the least number of seconds between checkpoints
+
+    use_threads: bool, optional
+        play the blocks in a pool of worker threads instead of processes
+
+    width: float, optional
+        stop once the confidence interval of every seat's win probability
+        is narrower than width, number_of_games is then the most games played
+
+    z: float, optional
+        the normal quantile of the intervals, 1.96 for 95% confidence
+
+    Raises ValueError if path holds a checkpoint of a different run,
+    including one saved with another seed
+    """
+    number_of_games = int(number_of_games)
+    checkpoint = load_checkpoint(path)
+    if checkpoint is not None:
+        if (not checkpoint.matches(runner, number_of_games) or
+                seed is not None and seed != checkpoint.get_seed()):
+            raise ValueError('{} is the checkpoint of a different run'.format(path))
+        seed = checkpoint.get_seed()
+        blocks_done = checkpoint.get_blocks_done()
+        result = checkpoint.get_result()
+    else:
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+        blocks_done = 0
+        result = simulation.SimulationResult(runner.get_settings()[0])
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    settings = runner.get_settings()
+    blocks = runner.blocks(number_of_games, seed)[blocks_done:]
+
+    def save():
+        save_checkpoint(path, Checkpoint(settings, runner.get_block_size(), number_of_games,
+                                         seed, blocks_done, result))
+
+    def done():
+        return width is not None and all(high - low < width for low, high in
+                                         result.get_confidence_intervals(z))
+
+    # saved before playing, so a run that cannot be saved fails at once
+    save()
+    if done():
+        # a resumed adaptive run that had already stopped
+        blocks = []
+    last_save = time.monotonic()
+    if workers == 1 or len(blocks) < 2:
+        finished = (simulation.play_block(*settings, games, block_seed)
+                    for games, block_seed in blocks)
+        pool = None
+    else:
+        pool = simulation.make_executor(workers, use_threads)
+        futures = [pool.submit(simulation.play_block, *settings, games, block_seed)
+                   for games, block_seed in blocks]
+        finished = (future.result() for future in futures)
+    try:
+        # blocks are merged in order, so the checkpoint always covers the
+        # first blocks_done blocks
+        for block_result in finished:
+            result.merge(block_result)
+            blocks_done += 1
+            if done():
+                break
+            if time.monotonic() - last_save >= interval:
+                save()
+                last_save = time.monotonic()
+    finally:
+        # also save when interrupted, the blocks merged so far are kept
+        if pool is not None:
+            for future in futures:
+                future.cancel()
+        save()
+        if pool is not None:
+            pool.shutdown()
+    return result
@@ -0,0 +1,268 @@
+"""
+Buffered sinks for the game event stream. A sink is a listener for
+Game.deal and Game.play: it is called with each event and keeps the
+encoded events in memory until its buffer fills, so tracing a game costs
+a few appends rather than a print per card.
+
+JsonlSink writes one JSON object per line. BinarySink writes fixed layout
+struct records, with suit names and player ids written once to a string
+table and referenced by number; read_binary() turns such a file back into
+events.
+"""
+
+import json
+import struct
+
+from cards import card_game
+
+# default number of bytes or lines held before the buffer is written out
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+# binary record types
+STRING_RECORD = 0
+TURN_RECORD = 1
+CARD_RECORD = 2
+HAND_RECORD = 3
+FINISHED_RECORD = 4
+
+# binary record layouts, every record starts with its type byte
+# seats, string ids and counts are 32 bit, tables can have more than 65535 seats
+STRING_FORMAT = struct.Struct('<BII')         # type, string id, length
+TURN_FORMAT = struct.Struct('<BIII')          # type, turn, seat, player id
+CARD_FORMAT = struct.Struct('<BIIIIii')       # type, turn, seat, index, suit, rank, value
+HAND_FORMAT = struct.Struct('<BIIqq')         # type, turn, seat, hand score, score
+FINISHED_FORMAT = struct.Struct('<BIIqI')     # type, winner seat, winner id, score, players
+SCORE_FORMAT = struct.Struct('<Iq')           # player id, score, once per player
+
+
+def event_to_dict(event):
+    """
+    Return an event as a dictionary with its type under "event"
+    """
+    record = {'event': type(event).__name__}
+    record.update(event._asdict())
+    return record
+
+
+def collect_events(game, players, deck):
+    """
+    Play a game and return the list of its events
+    """
+    events = []
+    game.play(players, deck, listener=events.append)
+    return events
+
+
+class JsonlSink:
+    """
+    This class is an event listener that writes events as JSON lines
+
+    ...
+
+    Attributes
+    ----------
+    __file: file object
+        the text file the lines are written to
+
+    __buffer: list of str
+        the encoded lines not yet written
+
+    __buffer_size: int
+        the number of lines held before they are written
+
+    Methods
+    -------
+    flush:
+        writes the buffered lines to the file
+
+    close:
+        flushes the buffer
+
+    """
+    def __init__(self, file, buffer_size=1024):
+        """
+        Parameters
+        ----------
+        file: file object
+            a text file opened for writing
+
+        buffer_size: int, optional
+            the number of lines held before they are written
+        """
+        self.__file = file
+        self.__buffer = []
+        self.__buffer_size = buffer_size
+
+    def __call__(self, event):
+        """
+        Buffer one event
+        """
+        self.__buffer.append(json.dumps(event_to_dict(event)))
+        if len(self.__buffer) >= self.__buffer_size:
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def flush(self):
+        """
+        Write the buffered lines to the file
+        """
+        if self.__buffer:
+            self.__file.write('\n'.join(self.__buffer))
+            self.__file.write('\n')
+            self.__buffer = []
+
+    def close(self):
+        """
+        Write out anything still buffered, the file itself is left open
+        """
+        self.flush()
+
+
+class BinarySink:
+    """
+    This class is an event listener that writes events as compact binary records
+
+    ...
+
+    Attributes
+    ----------
+    __file: file object
+        the binary file the records are written to
+
+    __buffer: bytearray
+        the encoded records not yet written
+
+    __buffer_size: int
+        the number of bytes held before they are written
+
+    __strings: dict
+        the id of every suit name and player id written so far
+
+    Methods
+    -------
+    flush:
+        writes the buffered records to the file
+
+    close:
+        flushes the buffer
+
+    """
+    def __init__(self, file, buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        Parameters
+        ----------
+        file: file object
+            a binary file opened for writing
+
+        buffer_size: int, optional
+            the number of bytes held before they are written
+        """
+        self.__file = file
+        self.__buffer = bytearray()
+        self.__buffer_size = buffer_size
+        self.__strings = {}
+
+    def __call__(self, event):
+        """
+        Buffer one event
+        """
+        buf = self.__buffer
+        if isinstance(event, card_game.CardDrawnEvent):
+            buf += CARD_FORMAT.pack(CARD_RECORD, event.turn, event.seat, event.index,
+                                    self.__string_id(event.suit), event.rank, event.value)
+        elif isinstance(event, card_game.TurnEvent):
+            buf += TURN_FORMAT.pack(TURN_RECORD, event.turn, event.seat,
+                                    self.__string_id(event.player_id))
+        elif isinstance(event, card_game.HandScoredEvent):
+            buf += HAND_FORMAT.pack(HAND_RECORD, event.turn, event.seat,
+                                    event.hand_score, event.score)
+        elif isinstance(event, card_game.GameFinishedEvent):
+            ids = [self.__string_id(player_id) for player_id in event.player_ids]
+            buf += FINISHED_FORMAT.pack(FINISHED_RECORD, event.winner_seat,
+                                        self.__string_id(event.winner_id),
+                                        event.winning_score, len(ids))
+            for string_id, score in zip(ids, event.scores):
+                buf += SCORE_FORMAT.pack(string_id, score)
+        if len(buf) >= self.__buffer_size:
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __string_id(self, value):
+        """
+        Return the id of a string, adding a string record the first time
+        """
+        value = str(value)
+        string_id = self.__strings.get(value)
+        if string_id is None:
+            string_id = len(self.__strings)
+            self.__strings[value] = string_id
+            data = value.encode('utf-8')
+            self.__buffer += STRING_FORMAT.pack(STRING_RECORD, string_id, len(data))
+            self.__buffer += data
+        return string_id
+
+    def flush(self):
+        """
+        Write the buffered records to the file
+        """
+        if self.__buffer:
+            self.__file.write(self.__buffer)
+            self.__buffer = bytearray()
+
+    def close(self):
+        """
+        Write out anything still buffered, the file itself is left open
+        """
+        self.flush()
+
+
+def read_binary(data):
+    """
+    Decode the bytes written by a BinarySink, yielding the events in order
+    """
+    strings = {}
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        record = view[offset]
+        if record == STRING_RECORD:
+            _, string_id, length = STRING_FORMAT.unpack_from(view, offset)
+            offset += STRING_FORMAT.size
+            strings[string_id] = bytes(view[offset:offset + length]).decode('utf-8')
+            offset += length
+        elif record == TURN_RECORD:
+            _, turn, seat, player = TURN_FORMAT.unpack_from(view, offset)
+            offset += TURN_FORMAT.size
+            yield card_game.TurnEvent(turn, seat, strings[player])
+        elif record == CARD_RECORD:
+            _, turn, seat, index, suit, rank, value = CARD_FORMAT.unpack_from(view, offset)
+            offset += CARD_FORMAT.size
+            yield card_game.CardDrawnEvent(turn, seat, index, strings[suit], rank, value)
+        elif record == HAND_RECORD:
+            _, turn, seat, hand_score, score = HAND_FORMAT.unpack_from(view, offset)
+            offset += HAND_FORMAT.size
+            yield card_game.HandScoredEvent(turn, seat, hand_score, score)
+        elif record == FINISHED_RECORD:
+            _, seat, winner, score, count = FINISHED_FORMAT.unpack_from(view, offset)
+            offset += FINISHED_FORMAT.size
+            player_ids = []
+            scores = []
+            for i in range(count):
+                player, player_score = SCORE_FORMAT.unpack_from(view, offset)
+                offset += SCORE_FORMAT.size
+                player_ids.append(strings[player])
+                scores.append(player_score)
+            yield card_game.GameFinishedEvent(seat, strings[winner], score,
+                                              tuple(player_ids), tuple(scores))
+        else:
+            raise ValueError('unknown record type {} at offset {}'.format(record, offset))
@@ -0,0 +1,282 @@
+"""
+Exact odds for the card game. Game.play deals every card of the deck, so a
+game is a random split of the deck into one hand per seat, with hand sizes
+fixed by the number of players and cards per hand. The score distribution
+of each seat and the probability of each seat winning are counted exactly
+with dynamic programming over the deck's multiset of card scores, no games
+are played.
+
+The marginal score distributions come from subset sums, with one state
+per hand size and score, so they grow with the square of the deck size.
+With two players the second hand is the rest of the deck, so the win
+probabilities come from the same subset sums. With more players they need
+the joint distribution of the scores, whose number of states grows
+exponentially with the number of players; it is only practical for three
+or four players on small decks. A setup that needs more than max_states
+states, in either step, raises ValueError instead of running for minutes.
+The subset sums are checked against a close bound before any work is
+done, and a failure is cached like a result.
+"""
+
+import functools
+from collections import Counter
+from math import comb, factorial
+
+from cards import card_game
+
+# most states of the subset sums or the joint distribution before exact_odds
+# gives up, about a second or two of work
+DEFAULT_MAX_STATES = 50000
+
+
+class ExactResult:
+    """
+    This class holds the exact odds for one game setup
+
+    ...
+
+    Attributes
+    ----------
+    __hand_sizes: tuple of int
+        the number of cards each seat is dealt over a game
+
+    __score_distributions: tuple of dict
+        for each seat, a dictionary of final score to probability
+
+    __win_probabilities: tuple of float
+        the probability of each seat winning, ties go to the lowest seat as
+        in Game.play
+
+    Methods
+    -------
+    get_hand_sizes:
+        returns the number of cards dealt to each seat
+
+    get_score_distributions:
+        returns the final score distribution of each seat
+
+    get_win_probabilities:
+        returns the win probability of each seat
+
+    """
+    def __init__(self, hand_sizes, score_distributions, win_probabilities):
+        self.__hand_sizes = hand_sizes
+        self.__score_distributions = score_distributions
+        self.__win_probabilities = win_probabilities
+
+    def __str__(self):
+        """
+        Returns the string representation of the result
+        """
+        return 'Hand sizes: {}, Win probabilities: {}'.format(
+            self.__hand_sizes, self.__win_probabilities)
+
+    def get_hand_sizes(self):
+        """
+        Return the number of cards dealt to each seat over a game
+        """
+        return self.__hand_sizes
+
+    def get_score_distributions(self):
+        """
+        Return, for each seat, a dictionary of final score to probability
+        """
+        return self.__score_distributions
+
+    def get_win_probabilities(self):
+        """
+        Return the probability of each seat winning the game
+        """
+        return self.__win_probabilities
+
+
+def score_groups(card_range, ranks):
+    """
+    Return the deck as a sorted list of (card score, number of cards) pairs
+    """
+    counts = Counter(rank * value for rank in ranks
+                     for value in range(1, card_range + 1))
+    return sorted(counts.items())
+
+
+def subset_sum_states(groups, max_size):
+    """
+    Return an upper bound on the number of (size, score) states of
+    subset_sums, for each size the number of scores between the lowest and
+    the highest hand of that size. The scores in between are nearly all
+    reachable, so the bound is close
+    """
+    scores = [score for score, count in groups for i in range(count)]
+    low = high = 0
+    states = 1
+    for size in range(1, min(max_size, len(scores)) + 1):
+        low += scores[size - 1]
+        high += scores[-size]
+        states += high - low + 1
+    return states
+
+
+def subset_sums(groups, max_size, max_states=None):
+    """
+    Count the hands of each size up to max_size by score. Returns a list
+    indexed by hand size of dictionaries of score to number of hands.
+    Raises ValueError, before doing the work, if the bound of
+    subset_sum_states is more than max_states, None for no limit
+    """
+    if max_states is not None and subset_sum_states(groups, max_size) > max_states:
+        raise ValueError('the exact score distributions of this deck need more than {} '
+                         'states, use the Monte Carlo runner for this setup'.format(max_states))
+    ways = [Counter() for i in range(max_size + 1)]
+    ways[0][0] = 1
+    for score, count in groups:
+        new_ways = [Counter() for i in range(max_size + 1)]
+        for size in range(max_size + 1):
+            for total, n in ways[size].items():
+                for taken in range(min(count, max_size - size) + 1):
+                    new_ways[size + taken][total + taken * score] += n * comb(count, taken)
+        ways = new_ways
+    return ways
+
+
+def compositions(total, parts):
+    """
+    Yield every way of writing total as an ordered sum of parts non-negative ints
+    """
+    if parts == 1:
+        yield (total,)
+        return
+    for first in range(total + 1):
+        for rest in compositions(total - first, parts - 1):
+            yield (first,) + rest
+
+
+def two_player_win_counts(ways, hand_sizes, deck_total):
+    """
+    Count the deals won by each seat of a two player game from the subset
+    sums of subset_sums. The second hand is whatever the first leaves, so
+    the first seat wins every deal where its score is at least half the deck
+    """
+    first = sum(n for total, n in ways[hand_sizes[0]].items() if 2 * total >= deck_total)
+    return [first, comb(sum(hand_sizes), hand_sizes[0]) - first]
+
+
+def joint_win_counts(groups, hand_sizes, max_states=DEFAULT_MAX_STATES):
+    """
+    Count the deals won by each seat. The deck is dealt group by group, the
+    state is the cards and score held by every seat but the last, whose
+    hand is whatever is left. Raises ValueError if there are more than
+    max_states states, None for no limit
+    """
+    players = len(hand_sizes)
+    last = players - 1
+    deck_total = sum(score * count for score, count in groups)
+    states = {((0,) * last, (0,) * last): 1}
+    dealt = 0
+    for score, count in groups:
+        dealt += count
+        splits = [(split, factorial(count) // _product(factorial(a) for a in split))
+                  for split in compositions(count, players)]
+        new_states = Counter()
+        for (sizes, scores), n in states.items():
+            for split, ways in splits:
+                new_sizes = tuple(s + a for s, a in zip(sizes, split))
+                if any(s > limit for s, limit in zip(new_sizes, hand_sizes)):
+                    continue
+                if dealt - sum(new_sizes) > hand_sizes[last]:
+                    continue
+                new_scores = tuple(t + a * score for t, a in zip(scores, split))
+                new_states[(new_sizes, new_scores)] += n * ways
+            if max_states is not None and len(new_states) > max_states:
+                raise ValueError('the exact odds of {} players need more than {} states, '
+                                 'use the Monte Carlo runner for this setup'.format(
+                                     players, max_states))
+        states = new_states
+
+    wins = [0] * players
+    for (sizes, scores), n in states.items():
+        final = scores + (deck_total - sum(scores),)
+        wins[final.index(max(final))] += n
+    return wins
+
+
+def _product(values):
+    result = 1
+    for v in values:
+        result *= v
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def _solve(number_of_players, cards_per_hand, card_range, ranks, max_states):
+    # a setup over the state limit is cached as its error, so asking again
+    # does not redo the work
+    try:
+        return _solve_setup(number_of_players, cards_per_hand, card_range, ranks, max_states)
+    except ValueError as e:
+        return e
+
+
+def _solve_setup(number_of_players, cards_per_hand, card_range, ranks, max_states):
+    deck_size = card_range * len(ranks)
+    seats = card_game.deal_seats(number_of_players, cards_per_hand, deck_size)
+    hand_sizes = tuple(seats.count(seat) for seat in range(number_of_players))
+    groups = score_groups(card_range, ranks)
+
+    ways = subset_sums(groups, max(hand_sizes), max_states)
+    distributions = []
+    for size in hand_sizes:
+        hands = comb(deck_size, size)
+        distributions.append({score: n / hands for score, n in sorted(ways[size].items())})
+
+    if number_of_players == 1:
+        wins = [1]
+    elif number_of_players == 2:
+        deck_total = sum(score * count for score, count in groups)
+        wins = two_player_win_counts(ways, hand_sizes, deck_total)
+    else:
+        wins = joint_win_counts(groups, hand_sizes, max_states)
+    deals = sum(wins)
+    return ExactResult(hand_sizes, tuple(distributions), tuple(w / deals for w in wins))
+
+
+def exact_odds(number_of_players, cards_per_hand, card_range, suits,
+               max_states=DEFAULT_MAX_STATES):
+    """
+    Return the ExactResult for a game setup. Results are cached by setup, the
+    suit names do not matter so setups with the same suit ranks share an entry
+
+    Parameters
+    ----------
+    number_of_players: int
+        number of players in the game
+
+    cards_per_hand: int
+        the number of cards drawn per hand
+
+    card_range: int
+        the cards of each suit run from 1 to card_range
+
+    suits: str or dict
+        the suits and their rank, either as the command line string or as
+        a dictionary of suit name to rank
+
+    max_states: int, optional
+        the most states of the subset sums, and of the joint score
+        distribution for three or more players, None for no limit
+
+    Raises ValueError if the setup needs more than max_states states
+    """
+    if isinstance(suits, str):
+        suits = card_game.parse_suits(suits)
+    result = _solve(int(number_of_players), int(cards_per_hand), int(card_range),
+                    tuple(sorted(suits.values())), max_states)
+    if isinstance(result, ValueError):
+        raise ValueError(str(result))
+    return result
+
+
+def clear_cache():
+    """
+    Drop all the cached results
+    """
+    _solve.cache_clear()
@@ -0,0 +1,193 @@
+"""
+Incremental leaderboard for the card game. Players given a Leaderboard
+report every score change to it, so the current leader, the top k and the
+rank of any player can be read at any point of a game, or across the games
+of a tournament, without rescanning all the players.
+
+The leader and top-k queries use a heap with lazy deletion, the rank query
+a Fenwick tree over the score values. Both cost O(log n) per update.
+Scores may be negative, suits can have negative ranks.
+"""
+
+import heapq
+
+# scores are kept in a Fenwick tree over [0, 2**SCORE_BITS), shifted by
+# SCORE_OFFSET so scores from -2**47 up to 2**47 fit
+SCORE_BITS = 48
+SCORE_OFFSET = 1 << (SCORE_BITS - 1)
+
+
+class Leaderboard:
+    """
+    This class ranks entrants, players or anything hashable, by score
+
+    ...
+
+    Attributes
+    ----------
+    __scores: dict
+        the current score of each entrant
+
+    __order: dict
+        the order each entrant joined in, breaks ties between equal scores
+
+    __versions: dict
+        the number of times each entrant's score has been set
+
+    __heap: list of tuple
+        (-score, order, version, entrant) entries, entries from an older
+        version are skipped and dropped when they reach the top
+
+    __tree: dict
+        sparse Fenwick tree counting the entrants at each score
+
+    Methods
+    -------
+    add(entrant, score):
+        adds an entrant
+
+    update(entrant, score):
+        sets the score of an entrant
+
+    add_points(entrant, points):
+        adds points to the score of an entrant
+
+    get_score(entrant):
+        returns the score of an entrant
+
+    get_leader():
+        returns the entrant with the highest score and its score
+
+    top_k(k):
+        returns the k best entrants and their scores
+
+    get_rank(entrant):
+        returns 1 plus the number of entrants with a higher score
+
+    """
+    def __init__(self):
+        self.__scores = {}
+        self.__order = {}
+        self.__versions = {}
+        self.__heap = []
+        self.__tree = {}
+
+    def __len__(self):
+        """
+        Returns the number of entrants
+        """
+        return len(self.__scores)
+
+    def __contains__(self, entrant):
+        """
+        Returns True if entrant is on the leaderboard
+        """
+        return entrant in self.__scores
+
+    def __fenwick_add(self, score, delta):
+        if not -SCORE_OFFSET <= score < SCORE_OFFSET:
+            raise ValueError('scores must be between -2**{0} and 2**{0}'.format(SCORE_BITS - 1))
+        i = score + SCORE_OFFSET + 1
+        tree = self.__tree
+        limit = 1 << SCORE_BITS
+        while i <= limit:
+            tree[i] = tree.get(i, 0) + delta
+            i += i & -i
+
+    def __fenwick_count_to(self, score):
+        # number of entrants with a score of at most score
+        i = min(score + SCORE_OFFSET + 1, 1 << SCORE_BITS)
+        tree = self.__tree
+        count = 0
+        while i > 0:
+            count += tree.get(i, 0)
+            i -= i & -i
+        return count
+
+    def add(self, entrant, score=0):
+        """
+        Add an entrant with a starting score. Adding an entrant that is
+        already on the leaderboard sets its score
+        """
+        if entrant in self.__scores:
+            self.update(entrant, score)
+            return
+        self.__fenwick_add(score, 1)
+        self.__order[entrant] = len(self.__order)
+        self.__versions[entrant] = 0
+        self.__scores[entrant] = score
+        heapq.heappush(self.__heap, (-score, self.__order[entrant], 0, entrant))
+
+    def update(self, entrant, score):
+        """
+        Set the score of an entrant, adding it if it is new
+        """
+        old = self.__scores.get(entrant)
+        if old is None:
+            self.add(entrant, score)
+            return
+        if old == score:
+            return
+        self.__fenwick_add(score, 1)
+        self.__fenwick_add(old, -1)
+        self.__scores[entrant] = score
+        version = self.__versions[entrant] + 1
+        self.__versions[entrant] = version
+        heapq.heappush(self.__heap, (-score, self.__order[entrant], version, entrant))
+        # drop the stale entries once they outnumber the live ones
+        if len(self.__heap) > 2 * len(self.__scores) + 16:
+            self.__heap = [(-s, self.__order[e], self.__versions[e], e)
+                           for e, s in self.__scores.items()]
+            heapq.heapify(self.__heap)
+
+    def add_points(self, entrant, points):
+        """
+        Add points to the score of an entrant, adding it if it is new
+        """
+        self.update(entrant, self.__scores.get(entrant, 0) + points)
+
+    def get_score(self, entrant):
+        """
+        Return the score of an entrant
+        """
+        return self.__scores[entrant]
+
+    def __is_current(self, entry):
+        score, order, version, entrant = entry
+        return self.__versions[entrant] == version
+
+    def get_leader(self):
+        """
+        Return (entrant, score) for the highest score, the earliest entrant
+        for a tie, or None if the leaderboard is empty
+        """
+        heap = self.__heap
+        while heap and not self.__is_current(heap[0]):
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        score, order, version, entrant = heap[0]
+        return entrant, -score
+
+    def top_k(self, k):
+        """
+        Return a list of (entrant, score) for the k highest scores, best
+        first, equal scores in the order the entrants joined
+        """
+        heap = self.__heap
+        best = []
+        while heap and len(best) < k:
+            entry = heapq.heappop(heap)
+            if self.__is_current(entry):
+                best.append(entry)
+        for entry in best:
+            heapq.heappush(heap, entry)
+        return [(entrant, -score) for score, order, version, entrant in best]
+
+    def get_rank(self, entrant):
+        """
+        Return the rank of an entrant, 1 plus the number of entrants with a
+        strictly higher score, so tied entrants share a rank
+        """
+        score = self.__scores[entrant]
+        return 1 + len(self.__scores) - self.__fenwick_count_to(score)
@@ -0,0 +1,518 @@
+"""
+Columnar player store for games with very many seats. Instead of one
+Player object per seat, PlayerTable keeps the seat names, cumulative scores
+and last-hand pointers in arrays. Scores can be updated for many seats in
+one call and the leading seats found without building any objects.
+
+The Players/Player accessors still work: get_players() and get_player()
+return lightweight views onto the table, so a PlayerTable can be handed to
+Game.play like a Players.
+
+numpy is used for the bulk operations when it is installed, the table
+works without it.
+"""
+
+import heapq
+import random
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the bulk operations fall back to loops
+    np = None
+
+from cards import card_game
+
+
+class PlayerView:
+    """
+    This class is the Player interface onto one seat of a PlayerTable
+
+    ...
+
+    Attributes
+    ----------
+    __table: PlayerTable
+        the table holding the seat
+
+    __seat: int
+        the seat this view looks at
+
+    Methods
+    -------
+    get_seat:
+        returns the seat of this view
+
+    get_id:
+        returns the players id/name
+
+    hand:
+        sets the current value of the seat's hand
+
+    get_hand:
+        returns the seat's last hand
+
+    score:
+        sets the seat's score
+
+    get_score:
+        returns the seat's score
+
+    score_hand(hand):
+        scores the specified hand of cards
+
+    score_card_indexes(hand, deck):
+        scores a hand of card indexes of deck
+
+    """
+    __slots__ = ('__table', '__seat')
+
+    def __init__(self, table, seat):
+        """
+        Parameters
+        ----------
+        table: PlayerTable
+            the table holding the seat
+
+        seat: int
+            the seat to look at
+        """
+        self.__table = table
+        self.__seat = seat
+
+    def get_seat(self):
+        """
+        return the seat of this view
+        """
+        return self.__seat
+
+    def get_id(self):
+        """
+        return the player's name
+        """
+        return self.__table.get_id(self.__seat)
+
+    def hand(self, cards):
+        """
+        set the current player's hand
+        """
+        self.__table.set_hand(self.__seat, cards)
+
+    def get_hand(self):
+        """
+        return the current hand
+        """
+        return self.__table.get_hand(self.__seat)
+
+    def score(self, value):
+        """
+        set the current score
+        """
+        self.__table.set_score(self.__seat, value)
+
+    def get_score(self):
+        """
+        return the current score
+        """
+        return self.__table.get_score(self.__seat)
+
+    def score_hand(self, hand):
+        """
+        Score the specified hand of cards, a card's score is the value of
+        the suit's rank multiplied by the value of the card, unless the
+        table has a scoring rule
+        """
+        rule = self.__table.get_scoring_rule()
+        if rule is not None:
+            score = rule.score_hand(hand)
+        else:
+            score = 0
+            for card in hand:
+                score += card.get_suit_rank() * card.get_value()
+        self.__table.add_score(self.__seat, score)
+        self.__table.set_hand(self.__seat, hand)
+
+    def score_card_indexes(self, hand, deck):
+        """
+        Score a hand given as card indexes of deck from the deck's rank and
+        value tables, or the score table of the table's scoring rule,
+        without creating Card objects
+        """
+        rule = self.__table.get_scoring_rule()
+        if rule is not None:
+            score = rule.score_card_indexes(hand, deck)
+        else:
+            ranks = deck.get_suit_ranks()
+            values = deck.get_values()
+            score = 0
+            for c in hand:
+                score += ranks[c] * values[c]
+        self.__table.add_score(self.__seat, score)
+        self.__table.set_hand(self.__seat, hand, deck)
+
+
+class PlayerViews:
+    """
+    This class is a read only sequence of PlayerView objects over a
+    PlayerTable, the views are created as they are looked up
+    """
+    def __init__(self, table):
+        """
+        Parameters
+        ----------
+        table: PlayerTable
+            the table to look into
+        """
+        self.__table = table
+
+    def __len__(self):
+        """
+        Returns the number of seats
+        """
+        return self.__table.get_number_of_players()
+
+    def __getitem__(self, idx):
+        """
+        Returns the view, or list of views for a slice, of the seat at idx
+        """
+        size = self.__table.get_number_of_players()
+        if isinstance(idx, slice):
+            return [PlayerView(self.__table, i) for i in range(*idx.indices(size))]
+        if idx < 0:
+            idx += size
+        if not -1 < idx < size:
+            raise IndexError('player index out of range')
+        return PlayerView(self.__table, idx)
+
+    def __iter__(self):
+        """
+        Iterate over views of all the seats
+        """
+        table = self.__table
+        for seat in range(table.get_number_of_players()):
+            yield PlayerView(table, seat)
+
+
+class PlayerTable:
+    """
+    This class holds the players of a game column by column
+
+    ...
+
+    Attributes
+    ----------
+    __number_of_players: int
+        the number of seats
+
+    __name_index: array of int
+        index into card_game.NAMES of each seat's name
+
+    __scores: array of int
+        the cumulative score of each seat
+
+    __hand_start: array of int
+        where each seat's slot starts in __hand_store
+
+    __hand_length: array of int
+        the number of cards in each seat's last hand
+
+    __hand_capacity: array of int
+        the size of each seat's slot, a hand that fits is written over the last
+
+    __hand_used: int
+        the total size of the slots, __hand_store is compacted when it grows
+        to twice this
+
+    __hand_store: list
+        the slots holding the last hand of every seat. A card is a Card
+        object or a card index of the seat's deck in __hand_decks
+
+    __hand_decks: list of Deck
+        the deck the card indexes of each seat's last hand belong to
+
+    __scoring_rule: ScoringRule
+        the rule every seat's hands are scored with, None for the game's own
+
+    Methods
+    -------
+    get_players():
+        returns views of all the seats
+
+    get_player(idx):
+        returns a view of the seat at idx
+
+    get_number_of_players():
+        returns the number of seats
+
+    get_id(seat), get_score(seat), get_hand(seat):
+        the per seat accessors used by the views
+
+    get_scoring_rule():
+        returns the rule the hands are scored with
+
+    get_hand_store_size():
+        returns the number of cards held for the seats' last hands
+
+    get_scores():
+        returns the score column
+
+    add_scores(seats, points):
+        adds points to many seats at once
+
+    play_deck(deck, cards_per_hand):
+        deals a whole deck to the seats and scores it in bulk
+
+    top_k(k):
+        returns the k seats with the highest scores
+
+    reset():
+        clears the scores and hands
+
+    """
+    def __init__(self, number_of_players, rng=None, scoring_rule=None):
+        """
+        Parameters
+        ----------
+        number_of_players: int
+            number of seats in the game
+
+        rng: random.Random, optional
+            the random number generator used to pick the seat names
+
+        scoring_rule: ScoringRule, optional
+            the rule that scores every seat's hands
+        """
+        rng = random if rng is None else rng
+        self.__number_of_players = number_of_players
+        self.__name_index = array('H', rng.choices(range(len(card_game.NAMES)),
+                                                  k=number_of_players))
+        self.__scores = array('q', bytes(8 * number_of_players))
+        self.__hand_start = array('q', bytes(8 * number_of_players))
+        self.__hand_length = array('i', bytes(4 * number_of_players))
+        self.__hand_capacity = array('i', bytes(4 * number_of_players))
+        self.__hand_used = 0
+        self.__hand_store = []
+        self.__hand_decks = [None] * number_of_players
+        self.__scoring_rule = scoring_rule
+
+    def get_players(self):
+        """
+        Returns a sequence of views of all the seats
+        """
+        return PlayerViews(self)
+
+    def get_player(self, idx):
+        """
+        Returns a view of the seat at the specified index. If the index is
+        out of range return None
+        """
+        if -1 < idx < self.__number_of_players:
+            return PlayerView(self, idx)
+        return None
+
+    def get_number_of_players(self):
+        """
+        Return the number of seats
+        """
+        return self.__number_of_players
+
+    def get_id(self, seat):
+        """
+        Return the name of the player in a seat
+        """
+        return card_game.NAMES[self.__name_index[seat]]
+
+    def get_score(self, seat):
+        """
+        Return the score of a seat
+        """
+        return self.__scores[seat]
+
+    def set_score(self, seat, value):
+        """
+        Set the score of a seat
+        """
+        self.__scores[seat] = value
+
+    def add_score(self, seat, points):
+        """
+        Add points to the score of one seat
+        """
+        self.__scores[seat] += points
+
+    def get_hand(self, seat):
+        """
+        Return the last hand of a seat
+        """
+        start = self.__hand_start[seat]
+        hand = self.__hand_store[start:start + self.__hand_length[seat]]
+        deck = self.__hand_decks[seat]
+        # card indexes are only turned into Card objects when asked for
+        return [c if isinstance(c, card_game.Card) else deck.get_card(c) for c in hand]
+
+    def set_hand(self, seat, cards, deck=None):
+        """
+        Record the last hand of a seat, Card objects, or the card indexes of
+        deck if one is given. The hand is written over the seat's previous
+        one, so the store stays the size of one hand per seat
+        """
+        n = len(cards)
+        self.__hand_decks[seat] = deck
+        self.__hand_length[seat] = n
+        store = self.__hand_store
+        if n <= self.__hand_capacity[seat]:
+            start = self.__hand_start[seat]
+            store[start:start + n] = cards
+            return
+        # the hand does not fit the seat's slot, give it a new one at the end
+        self.__hand_used += n - self.__hand_capacity[seat]
+        self.__hand_start[seat] = len(store)
+        self.__hand_capacity[seat] = n
+        store.extend(cards)
+        if len(store) > 2 * self.__hand_used:
+            self.__compact_hands()
+
+    def __compact_hands(self):
+        """
+        Copy every seat's slot to a new store, dropping the abandoned slots
+        """
+        store = self.__hand_store
+        compact = []
+        for seat in range(self.__number_of_players):
+            start = self.__hand_start[seat]
+            self.__hand_start[seat] = len(compact)
+            compact.extend(store[start:start + self.__hand_capacity[seat]])
+        self.__hand_store = compact
+
+    def get_scoring_rule(self):
+        """
+        Return the rule the hands are scored with, None for the game's own
+        """
+        return self.__scoring_rule
+
+    def get_hand_store_size(self):
+        """
+        Return the number of cards held for the seats' last hands
+        """
+        return len(self.__hand_store)
+
+    def get_scores(self):
+        """
+        Return the score column, an array of int indexed by seat
+        """
+        return self.__scores
+
+    def add_scores(self, seats, points):
+        """
+        Add points[i] to the score of seats[i] for every i, a seat may appear
+        more than once
+        """
+        if np is not None:
+            np.add.at(np.frombuffer(self.__scores, dtype=np.int64),
+                      np.asarray(seats, dtype=np.intp),
+                      np.asarray(points, dtype=np.int64))
+            return
+        scores = self.__scores
+        for seat, p in zip(seats, points):
+            scores[seat] += p
+
+    def play_deck(self, deck, cards_per_hand):
+        """
+        Deal every remaining card of deck to the seats the way Game.deal
+        does and add the scores in bulk, recording each seat's last hand.
+        The cards are drawn with one draw_indexes call, so a Deck, LazyDeck
+        or Shoe can be played
+        """
+        order = deck.draw_indexes(deck.get_number_of_cards())
+        players = self.__number_of_players
+        # every seat takes a turn in the last round, the one where the deck
+        # runs out, so that is where each seat's last hand is, possibly empty
+        last_round = len(order) // (players * cards_per_hand)
+        card_scores = self.__card_scores(deck, order)
+        rule = self.__scoring_rule
+        if rule is None or rule.is_additive():
+            seats = card_game.deal_seats(players, cards_per_hand, len(order))
+            if np is not None:
+                seats = np.frombuffer(seats, dtype=np.int32)
+            self.add_scores(seats, card_scores)
+        elif np is not None:
+            # the rule adjusts hand totals, so the cards are summed hand by
+            # hand first, hand h goes to seat h % players
+            hands = (last_round + 1) * players
+            totals = np.zeros(hands, dtype=np.int64)
+            np.add.at(totals, np.arange(len(order)) // cards_per_hand, card_scores)
+            self.add_scores(np.arange(hands) % players, rule.hand_scores(totals))
+        else:
+            hands = (last_round + 1) * players
+            totals = [0] * hands
+            for position, score in enumerate(card_scores):
+                totals[position // cards_per_hand] += score
+            self.add_scores([h % players for h in range(hands)],
+                            [rule.hand_score(total) for total in totals])
+
+        tail = order[last_round * players * cards_per_hand:]
+        self.__hand_store = list(tail)
+        # every seat gets a slot of cards_per_hand, the unused ones padded
+        self.__hand_store.extend([0] * (players * cards_per_hand - len(tail)))
+        self.__hand_decks = [deck] * players
+        self.__hand_start = array('q', range(0, players * cards_per_hand, cards_per_hand))
+        self.__hand_length = array('i', (max(0, min(cards_per_hand, len(tail) - start))
+                                         for start in self.__hand_start))
+        self.__hand_capacity = array('i', [cards_per_hand]) * players
+        self.__hand_used = players * cards_per_hand
+
+    def __card_scores(self, deck, order):
+        """
+        Return the score of every card index of order, a numpy array when
+        numpy is installed, from the scoring rule's table or as the suit
+        rank times the value
+        """
+        rule = self.__scoring_rule
+        card_range = deck.get_card_range()
+        suit_items = deck.get_suit_items()
+        if rule is not None:
+            table = rule.get_score_table(card_range, suit_items)
+            if np is not None:
+                return np.frombuffer(table, dtype=np.int64)[np.asarray(order)]
+            return [table[c] for c in order]
+        # card index c is the card of suit c // card_range with value
+        # c % card_range + 1 in every deck, so no card tables are needed
+        ranks = [rank for name, rank in suit_items]
+        if np is not None:
+            idx = np.asarray(order, dtype=np.int64)
+            return np.array(ranks, dtype=np.int64)[idx // card_range] * (idx % card_range + 1)
+        return [ranks[c // card_range] * (c % card_range + 1) for c in order]
+
+    def top_k(self, k):
+        """
+        Return the k seats with the highest scores, best first. Equal scores
+        are ordered by seat
+        """
+        k = min(k, self.__number_of_players)
+        if np is not None and k > 0:
+            scores = np.frombuffer(self.__scores, dtype=np.int64)
+            if k < len(scores):
+                candidates = np.argpartition(-scores, k - 1)[:k]
+                # take every seat tied with the k-th best so ties are ordered by seat
+                cutoff = scores[candidates].min()
+                candidates = np.flatnonzero(scores >= cutoff)
+            else:
+                candidates = np.arange(len(scores))
+            order = np.lexsort((candidates, -scores[candidates]))
+            return candidates[order][:k].tolist()
+        scores = self.__scores
+        return heapq.nsmallest(k, range(self.__number_of_players),
+                               key=lambda seat: (-scores[seat], seat))
+
+    def reset(self):
+        """
+        Clear the scores and hands of every seat
+        """
+        n = self.__number_of_players
+        self.__scores[:] = array('q', bytes(8 * n))
+        self.__hand_start[:] = array('q', bytes(8 * n))
+        self.__hand_length[:] = array('i', bytes(4 * n))
+        self.__hand_capacity[:] = array('i', bytes(4 * n))
+        self.__hand_used = 0
+        self.__hand_store = []
+        self.__hand_decks = [None] * n
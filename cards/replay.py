@@ -0,0 +1,386 @@
+"""
+Compact game records and deterministic replay. A GameRecord holds what is
+needed to play a game again exactly: the GameSpec, the player ids, and
+either the seed the players and deck were created from or the deck order
+itself. Records pack to a few dozen bytes, so one can be kept for every
+game played, and replay() rebuilds the deck and re-runs Game.play to give
+the same GameResult, and the same events to a listener.
+
+Replaying a packed order skips the shuffle and the name picking, the deck
+is copied from the cached DeckTemplate and put in the recorded order. A
+game dealt from a Shoe is recorded by the order of the whole shoe and its
+number of copies, and replayed from a Shoe put in that order.
+"""
+
+import random
+import struct
+import sys
+from array import array
+
+from cards import card_game
+
+# record kinds
+SEED_RECORD = 1
+ORDER_RECORD = 2
+SHOE_RECORD = 3
+
+# record layouts, little endian
+RECORD_MAGIC = b'GR'
+RECORD_VERSION = 2
+HEADER_FORMAT = struct.Struct('<2sBBIIIB')   # magic, version, kind, players, cards per hand,
+                                             # range, number of suits
+# version 1 records had 16 bit player and cards per hand counts, they are still read
+HEADER_FORMATS = {1: struct.Struct('<2sBBHHIB'), RECORD_VERSION: HEADER_FORMAT}
+SUIT_FORMAT = struct.Struct('<iB')           # rank, name length, followed by the name
+SEED_FORMAT = struct.Struct('<Q')
+COPIES_FORMAT = struct.Struct('<I')          # copies of the deck in a shoe record
+LENGTH_FORMAT = struct.Struct('<I')          # length of a record in an archive
+
+# a player id byte of OTHER_NAME is followed by the length and the name,
+# any other value is an index into card_game.NAMES
+OTHER_NAME = 0xFF
+MAX_NAME_LENGTH = 0xFF
+
+
+def seed_fits(seed):
+    """
+    Return True if seed can be packed into a record, seeds are unsigned 64 bit
+    """
+    return 0 <= seed < 1 << 64
+
+
+def order_typecode(deck_size):
+    """
+    Return the smallest array typecode that holds every card index of a deck
+    """
+    if deck_size <= 1 << 8:
+        return 'B'
+    if deck_size <= 1 << 16:
+        return 'H'
+    return 'I'
+
+
+class GameRecord:
+    """
+    This class is the compact record of one game
+
+    ...
+
+    Attributes
+    ----------
+    __spec: GameSpec
+        the settings of the game
+
+    __player_ids: tuple of str
+        the name of the player in each seat
+
+    __seed: int
+        the seed the players and deck were created from, None if the deck
+        order is recorded instead
+
+    __order: array of int
+        the card indexes of the deck, top card first, None if the seed is
+        recorded instead
+
+    __copies: int
+        the number of copies of the deck in the shoe the game was dealt
+        from, 1 for a game dealt from a deck
+
+    Methods
+    -------
+    get_spec:
+        returns the GameSpec
+
+    get_player_ids:
+        returns the player ids
+
+    get_seed:
+        returns the seed, or None
+
+    get_order:
+        returns the deck order, or None
+
+    get_copies:
+        returns the number of copies of the deck the game was dealt from
+
+    to_bytes:
+        returns the packed record
+
+    from_bytes(data):
+        unpacks a record
+
+    """
+    def __init__(self, spec, player_ids, seed=None, order=None, copies=1):
+        """
+        Parameters
+        ----------
+        spec: GameSpec
+            the settings of the game
+
+        player_ids: sequence of str
+            the name of the player in each seat
+
+        seed: int, optional
+            the seed the players and deck were created from with
+            random.Random(seed), players first
+
+        order: sequence of int, optional
+            the card indexes of the deck before the game, top card first
+
+        copies: int, optional
+            the number of copies of the deck in the shoe the game was dealt
+            from, a shoe is recorded by its order
+
+        Exactly one of seed and order must be given, ValueError is raised
+        otherwise, when the order does not hold copies decks, and when a player id that is not in card_game.NAMES or a
+        suit name is longer than MAX_NAME_LENGTH bytes in UTF-8, or there
+        are more than 255 suits
+        """
+        if (seed is None) == (order is None):
+            raise ValueError('a record needs either a seed or a deck order')
+        if seed is not None and not seed_fits(seed):
+            raise ValueError('a recorded seed must fit in 64 bits')
+        if copies < 1 or copies > 1 and seed is not None:
+            raise ValueError('a shoe of one or more decks is recorded by its order')
+        if order is not None and len(order) != spec.get_deck_size() * copies:
+            raise ValueError('the recorded order must hold every card of the deck')
+        if len(player_ids) != spec.get_number_of_players():
+            raise ValueError('one player id is needed per player')
+        for player_id in player_ids:
+            if (player_id not in card_game.NAMES and
+                    len(player_id.encode('utf-8')) > MAX_NAME_LENGTH):
+                raise ValueError('a recorded player id must be at most {} bytes'.format(
+                    MAX_NAME_LENGTH))
+        suit_items = spec.get_suit_items()
+        if len(suit_items) > 0xFF:
+            raise ValueError('a record holds at most 255 suits')
+        if any(len(name.encode('utf-8')) > MAX_NAME_LENGTH for name, rank in suit_items):
+            raise ValueError('a recorded suit name must be at most {} bytes'.format(
+                MAX_NAME_LENGTH))
+        self.__spec = spec
+        self.__player_ids = tuple(player_ids)
+        self.__seed = seed
+        self.__order = None if order is None else array('i', order)
+        self.__copies = copies
+
+    def __eq__(self, other):
+        """
+        Records are equal when they replay the same way
+        """
+        if not isinstance(other, GameRecord):
+            return NotImplemented
+        return (self.__spec == other.get_spec() and
+                self.__player_ids == other.get_player_ids() and
+                self.__seed == other.get_seed() and
+                self.__order == other.get_order() and
+                self.__copies == other.get_copies())
+
+    def get_spec(self):
+        """
+        Return the GameSpec of the game
+        """
+        return self.__spec
+
+    def get_player_ids(self):
+        """
+        Return the name of the player in each seat
+        """
+        return self.__player_ids
+
+    def get_seed(self):
+        """
+        Return the seed of the game, None if the deck order is recorded
+        """
+        return self.__seed
+
+    def get_order(self):
+        """
+        Return the deck order of the game, None if the seed is recorded
+        """
+        return self.__order
+
+    def get_copies(self):
+        """
+        Return the number of copies of the deck the game was dealt from
+        """
+        return self.__copies
+
+    def to_bytes(self):
+        """
+        Return the record packed into bytes
+        """
+        spec = self.__spec
+        if self.__seed is not None:
+            kind = SEED_RECORD
+        else:
+            kind = SHOE_RECORD if self.__copies > 1 else ORDER_RECORD
+        suit_items = spec.get_suit_items()
+        data = bytearray(HEADER_FORMAT.pack(RECORD_MAGIC, RECORD_VERSION, kind,
+                                            spec.get_number_of_players(),
+                                            spec.get_cards_per_hand(),
+                                            spec.get_card_range(), len(suit_items)))
+        for name, rank in suit_items:
+            name = name.encode('utf-8')
+            data += SUIT_FORMAT.pack(rank, len(name))
+            data += name
+        for player_id in self.__player_ids:
+            if player_id in card_game.NAMES:
+                data.append(card_game.NAMES.index(player_id))
+            else:
+                name = player_id.encode('utf-8')
+                data.append(OTHER_NAME)
+                data.append(len(name))
+                data += name
+        if kind == SEED_RECORD:
+            data += SEED_FORMAT.pack(self.__seed)
+        else:
+            if kind == SHOE_RECORD:
+                data += COPIES_FORMAT.pack(self.__copies)
+            order = array(order_typecode(spec.get_deck_size()), self.__order)
+            if sys.byteorder == 'big':
+                order.byteswap()
+            data += order.tobytes()
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Unpack a record packed by to_bytes. Raises ValueError if data is
+        not a record or is cut short
+        """
+        view = memoryview(data)
+        if bytes(view[:2]) != RECORD_MAGIC or len(view) < 3 or view[2] not in HEADER_FORMATS:
+            raise ValueError('not a game record')
+        header = HEADER_FORMATS[view[2]]
+        try:
+            magic, version, kind, players, cards_per_hand, card_range, suit_count = \
+                header.unpack_from(view, 0)
+        except struct.error:
+            raise ValueError('game record is too short')
+        offset = header.size
+        try:
+            suits = []
+            for i in range(suit_count):
+                rank, length = SUIT_FORMAT.unpack_from(view, offset)
+                offset += SUIT_FORMAT.size
+                suits.append((bytes(view[offset:offset + length]).decode('utf-8'), rank))
+                offset += length
+            spec = card_game.GameSpec.compile(players, cards_per_hand, card_range,
+                                              tuple(suits))
+
+            player_ids = []
+            for i in range(players):
+                name = view[offset]
+                offset += 1
+                if name == OTHER_NAME:
+                    length = view[offset]
+                    player_ids.append(
+                        bytes(view[offset + 1:offset + 1 + length]).decode('utf-8'))
+                    offset += 1 + length
+                else:
+                    player_ids.append(card_game.NAMES[name])
+
+            if kind == SEED_RECORD:
+                return cls(spec, player_ids, seed=SEED_FORMAT.unpack_from(view, offset)[0])
+            copies = 1
+            if kind == SHOE_RECORD:
+                copies, = COPIES_FORMAT.unpack_from(view, offset)
+                offset += COPIES_FORMAT.size
+        except (struct.error, IndexError):
+            raise ValueError('game record is too short')
+        if kind not in (ORDER_RECORD, SHOE_RECORD):
+            raise ValueError('unknown game record kind {}'.format(kind))
+        order = array(order_typecode(spec.get_deck_size()))
+        size = spec.get_deck_size() * copies * order.itemsize
+        if len(view) - offset < size:
+            raise ValueError('game record is too short for its deck order')
+        order.frombytes(view[offset:offset + size])
+        if sys.byteorder == 'big':
+            order.byteswap()
+        return cls(spec, player_ids, order=order, copies=copies)
+
+
+def record_game(spec, players, deck, seed=None):
+    """
+    Return the GameRecord of a game that is about to be played. With a seed
+    the record holds the seed, which must be the one the players and then
+    the Deck were created from, otherwise it holds the deck order. A seed
+    that does not fit in a record, see seed_fits, is recorded by the deck
+    order as well. A Shoe is always recorded by its order, which this fixes
+    for the game
+    """
+    player_ids = [player.get_id() for player in players.get_players()]
+    if isinstance(deck, card_game.Shoe):
+        return GameRecord(spec, player_ids, order=deck.get_order(), copies=deck.get_copies())
+    if seed is not None and seed_fits(seed):
+        return GameRecord(spec, player_ids, seed=seed)
+    return GameRecord(spec, player_ids, order=deck.get_order())
+
+
+def play_recorded(spec, seed=None, listener=None):
+    """
+    Play a game of spec and return its GameResult and GameRecord. With a
+    seed the players and deck are created from random.Random(seed) and the
+    seed is recorded, without one the deck order is recorded
+    """
+    rng = None if seed is None else random.Random(seed)
+    players = spec.create_players(rng)
+    deck = spec.create_deck(rng)
+    record = record_game(spec, players, deck, seed)
+    return spec.create_game().play(players, deck, listener=listener), record
+
+
+def replay(record, listener=None):
+    """
+    Play the game of a record again and return its GameResult. Raises
+    ValueError if the record does not hold a valid game
+    """
+    spec = record.get_spec()
+    if record.get_seed() is not None:
+        rng = random.Random(record.get_seed())
+        players = spec.create_players(rng)
+        if tuple(player.get_id() for player in players.get_players()) != record.get_player_ids():
+            raise ValueError('the recorded player ids do not match the seed')
+        deck = spec.create_deck(rng)
+    else:
+        players = card_game.Players(spec.get_number_of_players(),
+                                    player_ids=record.get_player_ids())
+        if record.get_copies() > 1:
+            deck = spec.create_shoe(record.get_copies())
+        else:
+            deck = card_game.Deck(spec.get_card_range(), spec.get_suits(), shuffled=False)
+        deck.set_order(record.get_order())
+    return spec.create_game().play(players, deck, listener=listener)
+
+
+def write_records(file, records):
+    """
+    Append records to a binary archive file, each one prefixed by its length
+    """
+    for record in records:
+        data = record.to_bytes()
+        file.write(LENGTH_FORMAT.pack(len(data)))
+        file.write(data)
+
+
+def read_records(data):
+    """
+    Yield the records of an archive written by write_records
+    """
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        length, = LENGTH_FORMAT.unpack_from(view, offset)
+        offset += LENGTH_FORMAT.size
+        yield GameRecord.from_bytes(view[offset:offset + length])
+        offset += length
+
+
+def replay_file(path, debug=False):
+    """
+    Replay every record of an archive file and print the results
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    for record in read_records(data):
+        print(replay(record, card_game.DebugPrinter() if debug else None))
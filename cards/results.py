@@ -0,0 +1,410 @@
+"""
+Columnar result store for large numbers of games. ResultWriter appends one
+record per game, the winning seat, the final score of every seat, a
+configuration id and the seed, to one flat binary file per column in a
+directory. A small JSON manifest names the files and their types and
+holds the number of complete records.
+
+ResultStore maps the column files with numpy.memmap and answers win rate,
+score quantile and per configuration queries by walking the columns in
+chunks, so a store much larger than memory can be queried.
+
+The store needs numpy, which is an optional dependency of this package.
+"""
+
+import json
+import os
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only the result store needs it
+    np = None
+
+MANIFEST = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# number of records written per flush and read per query chunk
+DEFAULT_BUFFER_SIZE = 65536
+CHUNK_ROWS = 1 << 20
+
+
+def column_types(number_of_players):
+    """
+    Return the file, numpy type and row shape of each column
+    """
+    return {
+        'winner': ('winner.bin', '<i4', ()),
+        'scores': ('scores.bin', '<i8', (number_of_players,)),
+        'config': ('config.bin', '<i4', ()),
+        'seed': ('seed.bin', '<u8', ()),
+    }
+
+
+def read_manifest(directory):
+    """
+    Return the manifest of the store in directory, None if there is none
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class ResultWriter:
+    """
+    This class appends game records to a columnar result store
+
+    ...
+
+    Attributes
+    ----------
+    __directory: str
+        the directory of the store
+
+    __number_of_players: int
+        the number of seats of every game in the store
+
+    __rows: int
+        the number of records written to the column files
+
+    __types: dict
+        the file, numpy type and row shape of each column
+
+    __buffers: dict
+        the records not yet written, a list of arrays per column
+
+    __buffered: int
+        the number of records in __buffers
+
+    __buffer_size: int
+        the number of records held before they are written
+
+    Methods
+    -------
+    add(config, seed, scores, winner):
+        adds the record of one game
+
+    add_result(config, seed, result):
+        adds the record of a GameResult
+
+    add_many(configs, seeds, scores, winners):
+        adds the records of many games from arrays
+
+    flush:
+        writes the buffered records and the manifest
+
+    close:
+        flushes the buffer
+
+    """
+    def __init__(self, directory, number_of_players, buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        Parameters
+        ----------
+        directory: str
+            the directory of the store, created if needed. Records are
+            appended to a store that is already there
+
+        number_of_players: int
+            the number of seats of every game
+
+        buffer_size: int, optional
+            the number of records held before they are written
+
+        Raises ValueError if the store holds games with another number of seats
+        """
+        if np is None:
+            raise ImportError('the result store requires numpy')
+        os.makedirs(directory, exist_ok=True)
+        manifest = read_manifest(directory)
+        self.__directory = directory
+        self.__number_of_players = int(number_of_players)
+        self.__rows = 0
+        self.__types = column_types(self.__number_of_players)
+        if manifest is not None:
+            if manifest['number_of_players'] != self.__number_of_players:
+                raise ValueError('the store in {} has {} players'.format(
+                    directory, manifest['number_of_players']))
+            self.__rows = manifest['rows']
+            # keep appending with the types the store was written with
+            self.__types = {name: (column['file'], column['dtype'], tuple(column['shape']))
+                            for name, column in manifest['columns'].items()}
+        # drop anything written after the last manifest, a flush that did not finish
+        for name, (file, dtype, shape) in self.__types.items():
+            path = os.path.join(directory, file)
+            size = self.__rows * np.dtype(dtype).itemsize * int(np.prod(shape))
+            with open(path, 'ab') as f:
+                f.truncate(size)
+        self.__buffers = {name: [] for name in self.__types}
+        self.__buffered = 0
+        self.__buffer_size = buffer_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_rows(self):
+        """
+        Return the number of records in the store, including buffered ones
+        """
+        return self.__rows + self.__buffered
+
+    def add(self, config, seed, scores, winner=None):
+        """
+        Add the record of one game. The winner defaults to the lowest seat
+        with the highest score
+        """
+        if winner is None:
+            winner = scores.index(max(scores))
+        self.add_many([config], [seed], [scores], [winner])
+
+    def add_result(self, config, seed, result):
+        """
+        Add the record of a card_game.GameResult
+        """
+        self.add(config, seed, list(result.get_scores()), result.get_winner())
+
+    def add_many(self, configs, seeds, scores, winners=None):
+        """
+        Add the records of many games. scores has one row per game, as the
+        scores returned by BatchGame.play_permutations, and winners
+        defaults to the lowest seat with the highest score of each row.
+        Raises ValueError if a winner is not a seat
+        """
+        scores = np.asarray(scores, dtype=np.int64).reshape(-1, self.__number_of_players)
+        rows = len(scores)
+        if winners is None:
+            winners = scores.argmax(axis=1)
+        winners = np.asarray(winners, dtype=np.int64)
+        if winners.size and (winners.min() < 0 or winners.max() >= self.__number_of_players):
+            raise ValueError('winners must be seats from 0 to {}'.format(
+                self.__number_of_players - 1))
+        columns = {
+            'winner': winners.astype(np.int32),
+            'scores': scores,
+            'config': np.broadcast_to(np.asarray(configs, dtype=np.int32), (rows,)),
+            'seed': np.broadcast_to(np.asarray(seeds, dtype=np.uint64), (rows,)),
+        }
+        for name, values in columns.items():
+            if len(values) != rows:
+                raise ValueError('every column needs one value per game')
+            self.__buffers[name].append(values)
+        self.__buffered += rows
+        if self.__buffered >= self.__buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered records to the column files and then the
+        manifest, so readers only ever see complete records
+        """
+        if not self.__buffered:
+            return
+        for name, (file, dtype, shape) in self.__types.items():
+            data = np.concatenate(self.__buffers[name]).astype(dtype, copy=False)
+            with open(os.path.join(self.__directory, file), 'ab') as f:
+                f.write(np.ascontiguousarray(data).tobytes())
+            self.__buffers[name] = []
+        self.__rows += self.__buffered
+        self.__buffered = 0
+
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'rows': self.__rows,
+            'number_of_players': self.__number_of_players,
+            'columns': {name: {'file': file, 'dtype': dtype, 'shape': list(shape)}
+                        for name, (file, dtype, shape) in self.__types.items()},
+        }
+        path = os.path.join(self.__directory, MANIFEST)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        """
+        Write out anything still buffered
+        """
+        self.flush()
+
+
+class ResultStore:
+    """
+    This class queries a columnar result store through memory maps
+
+    ...
+
+    Attributes
+    ----------
+    __directory: str
+        the directory of the store
+
+    __rows: int
+        the number of records in the store
+
+    __number_of_players: int
+        the number of seats of every game
+
+    __columns: dict
+        the memory mapped array of each column
+
+    Methods
+    -------
+    get_rows:
+        returns the number of records
+
+    get_number_of_players:
+        returns the number of seats
+
+    get_column(name):
+        returns the memory mapped column
+
+    win_rates(config):
+        returns the fraction of games won by each seat
+
+    score_quantiles(quantiles, config):
+        returns the final score quantiles of each seat
+
+    group_by_config:
+        returns the games, wins, win rates and mean scores per configuration
+
+    """
+    def __init__(self, directory, chunk_rows=CHUNK_ROWS):
+        """
+        Parameters
+        ----------
+        directory: str
+            the directory of the store
+
+        chunk_rows: int, optional
+            the number of records read at a time by the queries
+        """
+        if np is None:
+            raise ImportError('the result store requires numpy')
+        manifest = read_manifest(directory)
+        if manifest is None:
+            raise ValueError('no result store in {}'.format(directory))
+        self.__directory = directory
+        self.__rows = manifest['rows']
+        self.__number_of_players = manifest['number_of_players']
+        self.__chunk_rows = chunk_rows
+        self.__columns = {}
+        for name, column in manifest['columns'].items():
+            shape = (self.__rows,) + tuple(column['shape'])
+            if self.__rows:
+                self.__columns[name] = np.memmap(os.path.join(directory, column['file']),
+                                                 dtype=column['dtype'], mode='r', shape=shape)
+            else:
+                self.__columns[name] = np.empty(shape, dtype=column['dtype'])
+
+    def get_rows(self):
+        """
+        Return the number of records in the store
+        """
+        return self.__rows
+
+    def get_number_of_players(self):
+        """
+        Return the number of seats of every game
+        """
+        return self.__number_of_players
+
+    def get_column(self, name):
+        """
+        Return the memory mapped array of a column: "winner", "scores",
+        "config" or "seed"
+        """
+        return self.__columns[name]
+
+    def __chunks(self, config=None):
+        """
+        Yield (winners, scores, configs) for each chunk of records, only
+        the records of config if one is given
+        """
+        columns = self.__columns
+        for start in range(0, self.__rows, self.__chunk_rows):
+            stop = start + self.__chunk_rows
+            winners = columns['winner'][start:stop]
+            scores = columns['scores'][start:stop]
+            configs = columns['config'][start:stop]
+            if config is not None:
+                mask = configs == config
+                winners, scores, configs = winners[mask], scores[mask], configs[mask]
+            yield winners, scores, configs
+
+    def win_rates(self, config=None):
+        """
+        Return the fraction of games won by each seat, over the games of
+        config if one is given
+        """
+        wins = np.zeros(self.__number_of_players, dtype=np.int64)
+        for winners, scores, configs in self.__chunks(config):
+            wins += np.bincount(winners, minlength=self.__number_of_players)
+        games = max(int(wins.sum()), 1)
+        return (wins / games).tolist()
+
+    def score_quantiles(self, quantiles, config=None):
+        """
+        Return, for each seat, the final score at each of the quantiles, a
+        sequence of fractions from 0 to 1, over the games of config if one
+        is given. A quantile is the lowest score reached or passed by that
+        fraction of the games
+        """
+        histograms = [Counter() for i in range(self.__number_of_players)]
+        for winners, scores, configs in self.__chunks(config):
+            for seat, histogram in enumerate(histograms):
+                values, counts = np.unique(scores[:, seat], return_counts=True)
+                histogram.update(dict(zip(values.tolist(), counts.tolist())))
+
+        result = []
+        for histogram in histograms:
+            values = np.array(sorted(histogram), dtype=np.int64)
+            if not len(values):
+                result.append([None] * len(quantiles))
+                continue
+            cumulative = np.cumsum([histogram[v] for v in values.tolist()])
+            total = cumulative[-1]
+            positions = np.searchsorted(cumulative, np.asarray(quantiles) * total, side='left')
+            positions = np.minimum(positions, len(values) - 1)
+            result.append(values[positions].tolist())
+        return result
+
+    def group_by_config(self):
+        """
+        Return a dictionary of configuration id to a dictionary with the
+        "games", "wins", "win_rates" and "mean_scores" of that configuration
+        """
+        players = self.__number_of_players
+        wins = {}
+        totals = {}
+        for winners, scores, configs in self.__chunks():
+            # number the ids of the chunk 0, 1, ... so the sums are sized by
+            # the ids present rather than by the largest id
+            ids, inverse = np.unique(configs, return_inverse=True)
+            chunk_wins = np.bincount(inverse * players + winners,
+                                     minlength=len(ids) * players).reshape(len(ids), players)
+            chunk_totals = np.zeros((len(ids), players))
+            for seat in range(players):
+                chunk_totals[:, seat] = np.bincount(inverse, weights=scores[:, seat],
+                                                    minlength=len(ids))
+            for i, config in enumerate(ids.tolist()):
+                if config in wins:
+                    wins[config] += chunk_wins[i]
+                    totals[config] += chunk_totals[i]
+                else:
+                    wins[config] = chunk_wins[i].astype(np.int64)
+                    totals[config] = chunk_totals[i]
+
+        groups = {}
+        for config in sorted(wins):
+            games = int(wins[config].sum())
+            groups[config] = {
+                'games': games,
+                'wins': wins[config].tolist(),
+                'win_rates': (wins[config] / games).tolist(),
+                'mean_scores': (totals[config] / games).tolist(),
+            }
+        return groups
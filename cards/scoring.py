@@ -0,0 +1,283 @@
+"""
+Scoring rules for the card game. The game scores a card as its suit rank
+times its value and a hand as the sum of its cards. A ScoringRule replaces
+that: it gives the score of every card, and may adjust the total of each
+hand, for example to cap it.
+
+Every rule has these paths:
+
+    score_hand(hand)
+        the scalar path used by Player.score_hand, one dictionary lookup
+        per Card
+
+    get_score_table(card_range, suit_items)
+        the score of every card index of a deck, worked out once per deck
+        shape and cached
+
+    score_card_indexes(hand, deck)
+        the path used by Game.deal, which deals card indexes, one lookup
+        per card in the score table of the deck
+
+    score_hands(hands, card_range, suit_items)
+        the vectorized path, scores a whole matrix of hands of card
+        indexes with one table lookup per card, used by BatchGame
+
+numpy is only needed for the vectorized path.
+"""
+
+import abc
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only score_hands needs it
+    np = None
+
+
+class ScoringRule(abc.ABC):
+    """
+    This class is the abstract base of the scoring rules, a rule implements
+    card_score and, if it changes hand totals, overrides hand_score and
+    hand_scores
+
+    ...
+
+    Attributes
+    ----------
+    __card_scores: dict
+        the score of every Card scored so far
+
+    __tables: dict
+        the score table of every deck shape asked for, keyed by
+        (card_range, suit_items)
+
+    __last_table: tuple
+        the (suit_items, card_range, score table) of the last deck scored
+        by score_card_indexes, so the hands of a game skip the table
+        lookup. Only the deck's suit tuple is held, not the deck
+
+    Methods
+    -------
+    card_score(suit, rank, value):
+        returns the score of one card
+
+    hand_score(total):
+        returns the score of a hand from the sum of its card scores
+
+    hand_scores(totals):
+        hand_score for an array of totals
+
+    is_additive:
+        returns True if a hand scores the sum of its cards
+
+    score_hand(hand):
+        returns the score of a hand of Card objects
+
+    get_score_table(card_range, suit_items):
+        returns the score of every card index of a deck
+
+    score_card_indexes(hand, deck):
+        returns the score of a hand of card indexes of deck
+
+    score_hands(hands, card_range, suit_items):
+        returns the scores of a matrix of hands of card indexes
+
+    """
+    def __init__(self):
+        self.__card_scores = {}
+        self.__tables = {}
+        self.__last_table = (None, None, None)
+
+    @abc.abstractmethod
+    def card_score(self, suit, rank, value):
+        """
+        Return the score of the card with the suit name, suit rank and value
+        """
+
+    def hand_score(self, total):
+        """
+        Return the score of a hand whose card scores add up to total
+        """
+        return total
+
+    def hand_scores(self, totals):
+        """
+        Return hand_score of every entry of a numpy array of totals
+        """
+        return totals
+
+    def is_additive(self):
+        """
+        Return True if a hand scores the sum of its card scores, so the
+        scores of a game can be summed card by card rather than hand by hand
+        """
+        return type(self).hand_score is ScoringRule.hand_score
+
+    def score_hand(self, hand):
+        """
+        Return the score of a hand of Card objects
+        """
+        card_scores = self.__card_scores
+        total = 0
+        for card in hand:
+            score = card_scores.get(card)
+            if score is None:
+                score = self.card_score(card.get_suit_name(), card.get_suit_rank(),
+                                        card.get_value())
+                card_scores[card] = score
+            total += score
+        return self.hand_score(total)
+
+    def get_score_table(self, card_range, suit_items):
+        """
+        Return an array holding the score of every card index of the deck
+        with card_range and suit_items, a tuple of (name, rank) pairs. The
+        table is cached and must not be changed
+        """
+        key = (card_range, tuple(suit_items))
+        table = self.__tables.get(key)
+        if table is None:
+            # card index i is the card of suit i // card_range with value
+            # i % card_range + 1, as in card_game.DeckTemplate
+            table = array('q')
+            values = range(1, card_range + 1)
+            for name, rank in key[1]:
+                table.extend(self.card_score(name, rank, v) for v in values)
+            self.__tables[key] = table
+        return table
+
+    def score_card_indexes(self, hand, deck):
+        """
+        Return the score of a hand of card indexes of deck, as dealt by
+        Game.deal, with one score table lookup per card
+        """
+        suit_items = deck.get_suit_items()
+        card_range = deck.get_card_range()
+        last_items, last_range, table = self.__last_table
+        if suit_items is not last_items or card_range != last_range:
+            table = self.get_score_table(card_range, suit_items)
+            self.__last_table = (suit_items, card_range, table)
+        total = 0
+        for c in hand:
+            total += table[c]
+        return self.hand_score(total)
+
+    def score_hands(self, hands, card_range, suit_items):
+        """
+        Return the score of every hand of hands, a numpy array of card
+        indexes whose last axis runs over the cards of a hand. An index of
+        -1 is an empty slot and scores nothing
+        """
+        if np is None:
+            raise ImportError('scoring hands in bulk requires numpy')
+        table = np.frombuffer(self.get_score_table(card_range, suit_items), dtype=np.int64)
+        # the extra zero at the end is the score of the empty slot -1
+        table = np.append(table, 0)
+        return self.hand_scores(table[np.asarray(hands)].sum(axis=-1))
+
+
+class RankTimesValue(ScoringRule):
+    """
+    This class is the game's own rule, a card scores its suit rank times its value
+    """
+    def card_score(self, suit, rank, value):
+        """
+        Return the suit rank times the value
+        """
+        return rank * value
+
+
+class ValueOnly(ScoringRule):
+    """
+    This class scores a card by its value, the suits do not matter
+    """
+    def card_score(self, suit, rank, value):
+        """
+        Return the value
+        """
+        return value
+
+
+class SuitBonus(ScoringRule):
+    """
+    This class adds a fixed bonus per suit to the score of another rule
+
+    ...
+
+    Attributes
+    ----------
+    __rule: ScoringRule
+        the rule the bonuses are added to
+
+    __bonuses: dict
+        the bonus of each suit name, suits not in it get none
+
+    """
+    def __init__(self, bonuses, rule=None):
+        """
+        Parameters
+        ----------
+        bonuses: dict
+            the bonus added to the score of each card of a suit, by suit name
+
+        rule: ScoringRule, optional
+            the rule the bonuses are added to, defaults to RankTimesValue
+        """
+        super().__init__()
+        self.__rule = RankTimesValue() if rule is None else rule
+        self.__bonuses = dict(bonuses)
+
+    def card_score(self, suit, rank, value):
+        """
+        Return the score of the other rule plus the bonus of the suit
+        """
+        return self.__rule.card_score(suit, rank, value) + self.__bonuses.get(suit, 0)
+
+
+class CappedHand(ScoringRule):
+    """
+    This class caps the score of every hand of another rule
+
+    ...
+
+    Attributes
+    ----------
+    __rule: ScoringRule
+        the rule that scores the cards
+
+    __cap: int
+        the highest score a hand can get
+
+    """
+    def __init__(self, cap, rule=None):
+        """
+        Parameters
+        ----------
+        cap: int
+            the highest score a hand can get
+
+        rule: ScoringRule, optional
+            the rule that scores the cards, defaults to RankTimesValue. Its
+            own hand adjustments are not applied
+        """
+        super().__init__()
+        self.__rule = RankTimesValue() if rule is None else rule
+        self.__cap = cap
+
+    def card_score(self, suit, rank, value):
+        """
+        Return the score of the other rule
+        """
+        return self.__rule.card_score(suit, rank, value)
+
+    def hand_score(self, total):
+        """
+        Return the total, or the cap if the total is higher
+        """
+        return min(total, self.__cap)
+
+    def hand_scores(self, totals):
+        """
+        Return the totals limited to the cap
+        """
+        return np.minimum(totals, self.__cap)
@@ -0,0 +1,216 @@
+"""
+Long running game service. Instead of starting a process per game, the
+service is started once and reads game requests as JSON lines, from stdin
+or from the connections to a local Unix socket, and writes one JSON line
+back per request as soon as its game is played.
+
+A request is a JSON object, every field is optional:
+
+    {"id": 7, "players": 3, "cards_per_hand": 2, "range": 13,
+     "suits": "red:3,yellow:2,green:1", "seed": 42, "lazy": false}
+
+Missing settings are taken from the service defaults, the command line
+options it was started with. "suits" may also be an object of suit name to
+rank. With a "seed" the game is reproducible, the deck and the player names
+are drawn from random.Random(seed). The games are played in worker threads,
+so many requests can be in flight at once and a response is written as
+soon as its game finishes, not in request order. The response echoes "id"
+and holds the result:
+
+    {"id": 7, "winner": 1, "winners": [1], "winner_id": "Emma",
+     "winning_score": 312, "player_ids": [...], "scores": [...]}
+
+or {"id": 7, "error": "..."} if the request could not be played. Requests
+for more than MAX_DECK_SIZE cards or MAX_PLAYERS players are refused, so
+one request cannot exhaust the memory of the service.
+
+Specs are compiled once per setting through GameSpec.compile and every
+deck of a spec is copied from the shared, cached DeckTemplate, so a
+request costs about what its game does.
+"""
+
+import asyncio
+import json
+import random
+import sys
+
+from cards import card_game
+
+# longest request line accepted from a socket connection
+MAX_LINE_LENGTH = 1024 * 1024
+
+# most requests of one stream played at once, reading waits beyond it
+MAX_PENDING_REQUESTS = 64
+
+# largest deck and most players of a requested game
+MAX_DECK_SIZE = 1 << 16
+MAX_PLAYERS = 1 << 16
+
+
+def result_to_dict(result):
+    """
+    Return a GameResult as a dictionary ready for JSON
+    """
+    return {
+        'winner': result.get_winner(),
+        'winners': list(result.get_winners()),
+        'winner_id': result.get_winner_id(),
+        'winning_score': result.get_winning_score(),
+        'player_ids': list(result.get_player_ids()),
+        'scores': list(result.get_scores()),
+    }
+
+
+def check_limits(spec):
+    """
+    Raise ValueError if the game of spec is larger than the service plays
+    """
+    if spec.get_deck_size() > MAX_DECK_SIZE:
+        raise ValueError('the deck must have at most {} cards'.format(MAX_DECK_SIZE))
+    if spec.get_number_of_players() > MAX_PLAYERS:
+        raise ValueError('the game must have at most {} players'.format(MAX_PLAYERS))
+
+
+def handle_request(line, default_spec, stats=None):
+    """
+    Play the game asked for by one request line and return the response
+    dictionary. A request that cannot be played, for any reason, gets an
+    "error" response instead of raising, so one bad line does not stop the
+    service
+    """
+    request = {}
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            request = {}
+            raise ValueError('a request must be a JSON object')
+        spec = card_game.GameSpec.from_dict(request, default_spec)
+        check_limits(spec)
+        rng = random.Random(request['seed']) if 'seed' in request else None
+        game = spec.create_game(stats)
+        players = spec.create_players(rng)
+        deck = spec.create_deck(rng, stats, bool(request.get('lazy', False)))
+        response = result_to_dict(game.play(players, deck))
+    except Exception as e:
+        response = {'error': str(e) or type(e).__name__}
+    if 'id' in request:
+        response['id'] = request['id']
+    return response
+
+
+def encode_response(response):
+    """
+    Return a response as one JSON line
+    """
+    return json.dumps(response) + '\n'
+
+
+async def answer_requests(read_line, write_response, default_spec, stats=None):
+    """
+    Read request lines by awaiting read_line until it returns an empty
+    line, and play each request in the event loop's default executor, up
+    to MAX_PENDING_REQUESTS at once. write_response is awaited with each
+    response as soon as its game finishes, so the event loop keeps serving
+    other requests and connections while a large game is played
+    """
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(MAX_PENDING_REQUESTS)
+    pending = set()
+
+    async def answer(line):
+        try:
+            response = await loop.run_in_executor(None, handle_request, line,
+                                                  default_spec, stats)
+            await write_response(response)
+        finally:
+            slots.release()
+
+    while True:
+        line = await read_line()
+        if not line:
+            break
+        if not line.strip():
+            continue
+        await slots.acquire()
+        task = asyncio.create_task(answer(line))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.gather(*pending)
+
+
+async def serve_stream(reader, writer, default_spec, stats=None):
+    """
+    Answer the requests read from an asyncio stream until it is closed,
+    writing each response as soon as it is ready
+    """
+    lock = asyncio.Lock()
+
+    async def write_response(response):
+        # one response at a time, drain must not be awaited concurrently
+        async with lock:
+            writer.write(encode_response(response).encode('utf-8'))
+            await writer.drain()
+
+    try:
+        await answer_requests(reader.readline, write_response, default_spec, stats)
+    finally:
+        writer.close()
+
+
+async def start_socket_server(path, default_spec, stats=None):
+    """
+    Start serving requests on a Unix socket at path and return the
+    asyncio server. Every connection is served concurrently
+    """
+    async def on_connect(reader, writer):
+        await serve_stream(reader, writer, default_spec, stats)
+
+    return await asyncio.start_unix_server(on_connect, path, limit=MAX_LINE_LENGTH)
+
+
+async def serve_socket(path, default_spec, stats=None):
+    """
+    Serve requests on a Unix socket at path until the task is cancelled
+    """
+    server = await start_socket_server(path, default_spec, stats)
+    async with server:
+        await server.serve_forever()
+
+
+async def serve_stdio(default_spec, stats=None, stdin=None, stdout=None):
+    """
+    Answer the requests read from stdin until it ends, writing the
+    responses to stdout. The lines are read in a worker thread, so stdin
+    may be a pipe, a terminal or a file
+    """
+    stdin = sys.stdin if stdin is None else stdin
+    stdout = sys.stdout if stdout is None else stdout
+    loop = asyncio.get_running_loop()
+
+    async def read_line():
+        return await loop.run_in_executor(None, stdin.readline)
+
+    async def write_response(response):
+        stdout.write(encode_response(response))
+        stdout.flush()
+
+    await answer_requests(read_line, write_response, default_spec, stats)
+
+
+def run(options):
+    """
+    Run the service for the parsed command line options, on the socket
+    given by --socket or on stdin and stdout
+    """
+    default_spec = card_game.GameSpec.from_options(options)
+    stats = card_game.GameStats() if options.profile else None
+    try:
+        if options.socket:
+            asyncio.run(serve_socket(options.socket, default_spec, stats))
+        else:
+            asyncio.run(serve_stdio(default_spec, stats))
+    except KeyboardInterrupt:
+        pass
+    if stats is not None:
+        print(stats, file=sys.stderr)
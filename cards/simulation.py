@@ -0,0 +1,564 @@
+"""
+Monte Carlo runner for the card game. Games are played with the regular
+Deck, Players and Game classes, spread over a pool of worker processes.
+
+The games are split into fixed size blocks and every block gets its own
+random.Random stream, seeded from the master seed by block number. The
+blocks, and so the merged result, are the same no matter how many workers
+play them.
+"""
+
+import json
+import math
+import os
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from cards import card_game
+
+# number of games played with one random stream
+DEFAULT_BLOCK_SIZE = 1000
+
+# normal quantile of the confidence intervals, 1.96 for 95%
+DEFAULT_Z = 1.96
+
+
+def wilson_interval(wins, games, z=DEFAULT_Z):
+    """
+    Return the (low, high) Wilson score interval of a win probability
+    estimated from wins out of games
+    """
+    if not games:
+        return (0.0, 1.0)
+    p = wins / games
+    z2 = z * z
+    scale = 1 + z2 / games
+    center = (p + z2 / (2 * games)) / scale
+    half = z / scale * math.sqrt(p * (1 - p) / games + z2 / (4 * games * games))
+    return (max(0.0, center - half), min(1.0, center + half))
+
+
+class SimulationResult:
+    """
+    This class holds the merged outcome of a set of games
+
+    ...
+
+    Attributes
+    ----------
+    __games: int
+        the number of games played
+
+    __wins: list of int
+        the number of games won by each seat
+
+    __score_histograms: list of Counter
+        for each seat, the number of games that ended with each final score
+
+    Methods
+    -------
+    from_counts(games, wins, score_histograms):
+        returns a result holding the given counts
+
+    get_games:
+        returns the number of games played
+
+    get_wins:
+        returns the wins per seat
+
+    get_score_histograms:
+        returns the final score histogram of each seat
+
+    get_win_rates:
+        returns the fraction of games won by each seat
+
+    get_score_summaries:
+        returns the mean, standard deviation, minimum and maximum final
+        score of each seat
+
+    get_confidence_intervals(z):
+        returns the Wilson interval of the win probability of each seat
+
+    add_game(scores):
+        records one game from its final scores
+
+    merge(other):
+        adds the games of another result to this one
+
+    """
+    def __init__(self, number_of_players):
+        """
+        Parameters
+        ----------
+        number_of_players: int
+            the number of seats in each game
+        """
+        self.__games = 0
+        self.__wins = [0] * number_of_players
+        self.__score_histograms = [Counter() for i in range(number_of_players)]
+
+    def __str__(self):
+        """
+        Returns the string representation of the result
+        """
+        return 'Games: {}, Wins: {}'.format(self.__games, self.__wins)
+
+    @classmethod
+    def from_counts(cls, games, wins, score_histograms):
+        """
+        Return a result holding the given game count, wins per seat and
+        score histogram per seat, as saved from another result
+        """
+        result = cls(len(wins))
+        result.__games = games
+        result.__wins = list(wins)
+        result.__score_histograms = [Counter(histogram) for histogram in score_histograms]
+        return result
+
+    def __eq__(self, other):
+        """
+        Results are equal when the game counts, wins and histograms are equal
+        """
+        if not isinstance(other, SimulationResult):
+            return NotImplemented
+        return (self.__games == other.get_games() and
+                self.__wins == other.get_wins() and
+                self.__score_histograms == other.get_score_histograms())
+
+    def get_games(self):
+        """
+        Return the number of games played
+        """
+        return self.__games
+
+    def get_wins(self):
+        """
+        Return the number of games won by each seat
+        """
+        return self.__wins
+
+    def get_score_histograms(self):
+        """
+        Return the final score histogram of each seat
+        """
+        return self.__score_histograms
+
+    def get_win_rates(self):
+        """
+        Return the fraction of games won by each seat
+        """
+        games = max(self.__games, 1)
+        return [w / games for w in self.__wins]
+
+    def get_confidence_intervals(self, z=DEFAULT_Z):
+        """
+        Return the (low, high) Wilson score interval of the win probability
+        of each seat
+        """
+        return [wilson_interval(wins, self.__games, z) for wins in self.__wins]
+
+    def get_score_summaries(self):
+        """
+        Return, for each seat, a dictionary with the mean, standard
+        deviation, minimum and maximum of its final scores, computed from
+        the score histogram
+        """
+        summaries = []
+        for histogram in self.__score_histograms:
+            games = sum(histogram.values())
+            if not games:
+                summaries.append({'mean': 0.0, 'stdev': 0.0, 'min': 0, 'max': 0})
+                continue
+            mean = sum(score * n for score, n in histogram.items()) / games
+            variance = sum((score - mean) ** 2 * n for score, n in histogram.items()) / games
+            summaries.append({'mean': mean, 'stdev': math.sqrt(variance),
+                              'min': min(histogram), 'max': max(histogram)})
+        return summaries
+
+    def add_game(self, scores):
+        """
+        Record one game from its final scores, the highest score wins and
+        ties go to the lowest seat
+        """
+        winner = scores.index(max(scores))
+        self.__games += 1
+        self.__wins[winner] += 1
+        for seat, score in enumerate(scores):
+            self.__score_histograms[seat][score] += 1
+
+    def merge(self, other):
+        """
+        Add the games of other to this result
+        """
+        self.__games += other.get_games()
+        for seat, wins in enumerate(other.get_wins()):
+            self.__wins[seat] += wins
+        for seat, histogram in enumerate(other.get_score_histograms()):
+            self.__score_histograms[seat].update(histogram)
+        return self
+
+
+def block_seeds(seed, number_of_blocks):
+    """
+    Return the seed of each block, drawn in block order from the master seed
+    """
+    master = random.Random(seed)
+    return [master.getrandbits(64) for i in range(number_of_blocks)]
+
+
+def make_executor(workers, use_threads=False):
+    """
+    Return a pool of workers worker processes, or of threads if
+    use_threads is set. The games of a block share no state with other
+    blocks, so threads give the same results as processes without the cost
+    of starting processes and pickling results. They only run in parallel
+    on a free-threaded Python
+    """
+    if use_threads:
+        return ThreadPoolExecutor(max_workers=workers)
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def play_block(number_of_players, cards_per_hand, card_range, suits, games, seed):
+    """
+    Play games games with their own random stream and return a
+    SimulationResult. This is the unit of work handed to the worker processes
+    """
+    rng = random.Random(seed)
+    result = SimulationResult(number_of_players)
+    game = card_game.Game(cards_per_hand)
+    for i in range(games):
+        players = card_game.Players(number_of_players, rng)
+        deck = card_game.Deck(card_range, suits, rng)
+        game.deal(players, deck)
+        result.add_game([player.get_score() for player in players.get_players()])
+    return result
+
+
+class MonteCarloRunner:
+    """
+    This class runs many games with the same settings over a process pool
+
+    ...
+
+    Attributes
+    ----------
+    __number_of_players: int
+        the number of players in each game
+
+    __cards_per_hand: int
+        the number of cards drawn per hand
+
+    __card_range: int
+        the cards of each suit run from 1 to card_range
+
+    __suits: dict
+        the suits and their rank
+
+    __block_size: int
+        the number of games played per random stream
+
+    Methods
+    -------
+    from_spec(spec, block_size):
+        returns a runner for the settings of a GameSpec
+
+    get_settings:
+        returns the settings handed to play_block
+
+    get_block_size:
+        returns the number of games per block
+
+    blocks(number_of_games, seed):
+        returns the games and seed of every block of a run
+
+    run(number_of_games, seed, workers, use_threads):
+        plays number_of_games games and returns the merged SimulationResult
+
+    run_adaptive(width, max_games, seed, workers, z, use_threads):
+        plays games until the win probabilities are known to within width
+
+    """
+    def __init__(self, number_of_players, cards_per_hand, card_range, suits,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Parameters
+        ----------
+        number_of_players: int
+            number of players in each game
+
+        cards_per_hand: int
+            the number of cards drawn per hand
+
+        card_range: int
+            the cards of each suit run from 1 to card_range
+
+        suits: str or dict
+            the suits and their rank, either as the command line string or
+            as a dictionary of suit name to rank
+
+        block_size: int, optional
+            the number of games played per random stream. The result for a
+            seed depends on it, the number of workers does not
+        """
+        if isinstance(suits, str):
+            suits = card_game.parse_suits(suits)
+        self.__number_of_players = int(number_of_players)
+        self.__cards_per_hand = int(cards_per_hand)
+        self.__card_range = int(card_range)
+        self.__suits = suits
+        self.__block_size = int(block_size)
+
+    @classmethod
+    def from_spec(cls, spec, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Return a runner for the settings of a card_game.GameSpec
+        """
+        return cls(spec.get_number_of_players(), spec.get_cards_per_hand(),
+                   spec.get_card_range(), spec.get_suits(), block_size)
+
+    def get_settings(self):
+        """
+        Return the (number_of_players, cards_per_hand, card_range, suits)
+        settings handed to play_block
+        """
+        return (self.__number_of_players, self.__cards_per_hand,
+                self.__card_range, self.__suits)
+
+    def get_block_size(self):
+        """
+        Return the number of games played per random stream
+        """
+        return self.__block_size
+
+    def blocks(self, number_of_games, seed):
+        """
+        Return the (games, seed) pair of every block for a run
+        """
+        sizes = [self.__block_size] * (number_of_games // self.__block_size)
+        if number_of_games % self.__block_size:
+            sizes.append(number_of_games % self.__block_size)
+        return list(zip(sizes, block_seeds(seed, len(sizes))))
+
+    def run(self, number_of_games, seed=None, workers=None, use_threads=False):
+        """
+        Play number_of_games games and return the merged SimulationResult
+
+        Parameters
+        ----------
+        number_of_games: int
+            the number of games to play
+
+        seed: int, optional
+            the master seed, the same seed always gives the same result
+
+        workers: int, optional
+            the number of worker processes, defaults to the number of CPUs.
+            With one worker the games are played in this process
+
+        use_threads: bool, optional
+            play the blocks in a pool of worker threads instead of processes
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        settings = self.get_settings()
+        blocks = self.blocks(int(number_of_games), seed)
+
+        result = SimulationResult(self.__number_of_players)
+        if workers == 1 or len(blocks) < 2:
+            for games, block_seed in blocks:
+                result.merge(play_block(*settings, games, block_seed))
+            return result
+
+        with make_executor(workers, use_threads) as pool:
+            futures = [pool.submit(play_block, *settings, games, block_seed)
+                       for games, block_seed in blocks]
+            for future in futures:
+                result.merge(future.result())
+        return result
+
+    def run_adaptive(self, width, max_games, seed=None, workers=None, z=DEFAULT_Z,
+                     use_threads=False):
+        """
+        Play games a block at a time until the confidence interval of every
+        seat's win probability is narrower than width, or max_games games
+        have been played, and return the merged SimulationResult. Its
+        get_games() is the number of games that were needed.
+
+        The blocks are the blocks of run(max_games, seed) and the stopping
+        rule is checked after each one in order, so the result for a seed
+        does not depend on the number of workers. With several workers a
+        few blocks past the stopping point may be played and dropped
+
+        Parameters
+        ----------
+        width: float
+            the widest confidence interval allowed, high minus low
+
+        max_games: int
+            the most games to play
+
+        seed: int, optional
+            the master seed, the same seed always gives the same result
+
+        workers: int, optional
+            the number of worker processes, defaults to the number of CPUs.
+            With one worker the games are played in this process
+
+        z: float, optional
+            the normal quantile of the intervals, 1.96 for 95% confidence
+
+        use_threads: bool, optional
+            play the blocks in a pool of worker threads instead of processes
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        settings = self.get_settings()
+        blocks = self.blocks(int(max_games), seed)
+        result = SimulationResult(self.__number_of_players)
+
+        def done():
+            return all(high - low < width for low, high in result.get_confidence_intervals(z))
+
+        if workers == 1 or len(blocks) < 2:
+            for games, block_seed in blocks:
+                result.merge(play_block(*settings, games, block_seed))
+                if done():
+                    break
+            return result
+
+        with make_executor(workers, use_threads) as pool:
+            for start in range(0, len(blocks), workers):
+                futures = [pool.submit(play_block, *settings, games, block_seed)
+                           for games, block_seed in blocks[start:start + workers]]
+                for future in futures:
+                    result.merge(future.result())
+                    if done():
+                        for rest in futures:
+                            rest.cancel()
+                        return result
+        return result
+
+
+def run_many(runners, number_of_games, seed=None, workers=None, use_threads=False):
+    """
+    Play number_of_games games with each runner and return their results
+    in order. The blocks of all the runners share one pool, so
+    small configurations run alongside each other rather than one after
+    another. Every runner gets the same seed, so its result is the one
+    runner.run(number_of_games, seed) gives
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    work = [(i, runner.get_settings(), games, block_seed)
+            for i, runner in enumerate(runners)
+            for games, block_seed in runner.blocks(int(number_of_games), seed)]
+    results = [SimulationResult(runner.get_settings()[0]) for runner in runners]
+
+    if workers == 1 or len(work) < 2:
+        for i, settings, games, block_seed in work:
+            results[i].merge(play_block(*settings, games, block_seed))
+        return results
+
+    with make_executor(workers, use_threads) as pool:
+        futures = [(i, pool.submit(play_block, *settings, games, block_seed))
+                   for i, settings, games, block_seed in work]
+        for i, future in futures:
+            results[i].merge(future.result())
+    return results
+
+
+def load_configurations(file, defaults=None):
+    """
+    Read game configurations from a text file, one JSON object per line
+    with the keys of card_game.GameSpec.from_dict. Blank lines and lines
+    starting with # are skipped. Returns a list of GameSpec
+    """
+    specs = []
+    for number, line in enumerate(file, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            settings = json.loads(line)
+            if not isinstance(settings, dict):
+                raise ValueError('a configuration must be a JSON object')
+            specs.append(card_game.GameSpec.from_dict(settings, defaults))
+        except ValueError as e:
+            raise ValueError('line {}: {}'.format(number, e))
+    return specs
+
+
+def summarize(spec, result, seed=None):
+    """
+    Return the aggregated result of one configuration as a dictionary
+    ready for JSON
+    """
+    return {
+        'players': spec.get_number_of_players(),
+        'cards_per_hand': spec.get_cards_per_hand(),
+        'range': spec.get_card_range(),
+        'suits': spec.get_suits(),
+        'seed': seed,
+        'games': result.get_games(),
+        'wins': result.get_wins(),
+        'win_rates': result.get_win_rates(),
+        'confidence_intervals': result.get_confidence_intervals(),
+        'scores': result.get_score_summaries(),
+    }
+
+
+def run_batch(options):
+    """
+    Play --games games, default 1000, of every configuration in
+    --config-file, or of the command line configuration, and write the
+    aggregated results to --output as JSON, or print them. With
+    --checkpoint the runs save their progress and resume from it, with
+    --target-width each configuration stops once its win rates are known
+    to within the width, and with --threads the games are played in
+    threads rather than processes
+    """
+    defaults = card_game.GameSpec.from_options(options)
+    if options.config_file:
+        with open(options.config_file) as f:
+            specs = load_configurations(f, defaults)
+    else:
+        specs = [defaults]
+    games = options.games if options.games is not None else 1000
+
+    runners = [MonteCarloRunner.from_spec(spec) for spec in specs]
+    use_threads = getattr(options, 'threads', False)
+    if getattr(options, 'checkpoint', None):
+        # checkpointed configurations are run one after another, each with
+        # its own file
+        from cards import checkpoint
+        results = []
+        for i, runner in enumerate(runners):
+            path = options.checkpoint
+            if len(runners) > 1:
+                path = '{}.{}'.format(path, i)
+            # with --target-width the checkpointed runs stop early as well
+            results.append(checkpoint.run_with_checkpoints(
+                runner, games, path, options.seed, options.workers, use_threads=use_threads,
+                width=getattr(options, 'target_width', None)))
+    elif getattr(options, 'target_width', None) is not None:
+        # --games is the budget of each configuration
+        results = [runner.run_adaptive(options.target_width, games, options.seed,
+                                       options.workers, use_threads=use_threads)
+                   for runner in runners]
+    else:
+        results = run_many(runners, games, options.seed, options.workers, use_threads)
+    summaries = [summarize(spec, result, options.seed) for spec, result in zip(specs, results)]
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({'configurations': summaries}, f, indent=2)
+    else:
+        for spec, result in zip(specs, results):
+            print(spec)
+            print('\tGames:       {}'.format(result.get_games()))
+            print('\tWin rates:   {}'.format(', '.join('{:.4f}'.format(r)
+                                                     for r in result.get_win_rates())))
+            print('\tMean scores: {}'.format(', '.join('{:.1f}'.format(s['mean'])
+                                                     for s in result.get_score_summaries())))
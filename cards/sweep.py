@@ -0,0 +1,271 @@
+"""
+Parameter sweeps for the card game. A sweep is a grid of settings, every
+combination of a list of player counts, cards per hand, card ranges and
+suit weightings, and each point of the grid is played with the batch
+engine.
+
+The points are played with common random numbers: every point with the
+same deck size scores the same shuffled deck orders. Points that differ
+only in suit ranks, hand size or player count are compared on the same
+deals, so the differences between them are not blurred by shuffle noise,
+and each chunk of deck orders is drawn once for all of them.
+
+The sweep needs numpy, which is an optional dependency of this package.
+"""
+
+import csv
+import functools
+import itertools
+import json
+import os
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only the sweep needs it
+    np = None
+
+from cards import batch
+from cards import card_game
+from cards import simulation
+
+# most games per unit of work handed to a worker, fewer for decks too large
+# for batch.CELL_BUDGET
+DEFAULT_CHUNK_SIZE = 16384
+
+
+def grid(players, cards_per_hand, ranges, suits):
+    """
+    Return the GameSpec of every combination of the settings, each a list.
+    suits is a list of suit strings or dictionaries of suit name to rank
+    """
+    return [card_game.GameSpec.compile(p, h, r, tuple(s.items()) if isinstance(s, dict) else s)
+            for p, h, r, s in itertools.product(players, cards_per_hand, ranges, suits)]
+
+
+def load_grid(file):
+    """
+    Read a sweep grid from a JSON object with the lists "players",
+    "cards_per_hand", "range" and "suits", a missing list is the game
+    default. Returns the list of GameSpec
+    """
+    settings = json.load(file)
+    return grid(settings.get('players', [card_game.DEFAULT_NUMBER_OF_PLAYERS]),
+                settings.get('cards_per_hand', [card_game.DEFAULT_NUMBER_OF_CARDS_PER_HAND]),
+                settings.get('range', [card_game.DEFAULT_RANGE_OF_CARDS]),
+                settings.get('suits', [card_game.DEFAULT_SUITS]))
+
+
+@functools.lru_cache(maxsize=256)
+def _engine(spec):
+    return batch.BatchGame(spec.get_number_of_players(), spec.get_cards_per_hand(),
+                           spec.get_card_range(), spec.get_suits())
+
+
+def play_chunk(specs, deck_size, games, seed):
+    """
+    Draw games deck orders of deck_size cards from the seed and score them
+    for every spec, which must all have that deck size. Returns a
+    BatchResult per spec. This is the unit of work handed to the workers
+    """
+    perms = batch.random_permutations(np.random.default_rng(seed), games, deck_size)
+    return [_engine(spec).summarize_permutations(perms) for spec in specs]
+
+
+class SweepResult:
+    """
+    This class holds the outcome of a sweep
+
+    ...
+
+    Attributes
+    ----------
+    __specs: list of GameSpec
+        the points of the sweep
+
+    __results: list of BatchResult
+        the result of each point
+
+    __seed: int
+        the master seed of the sweep
+
+    Methods
+    -------
+    get_specs:
+        returns the points of the sweep
+
+    get_results:
+        returns the BatchResult of each point
+
+    get_seed:
+        returns the master seed
+
+    get_rows:
+        returns the table of the sweep as a list of dictionaries
+
+    write_csv(file):
+        writes the table as CSV
+
+    format_table:
+        returns the table as aligned text
+
+    """
+    def __init__(self, specs, results, seed):
+        self.__specs = specs
+        self.__results = results
+        self.__seed = seed
+
+    def __str__(self):
+        """
+        Returns the string representation of the result
+        """
+        return self.format_table()
+
+    def get_specs(self):
+        """
+        Return the GameSpec of every point of the sweep
+        """
+        return self.__specs
+
+    def get_results(self):
+        """
+        Return the BatchResult of every point of the sweep
+        """
+        return self.__results
+
+    def get_seed(self):
+        """
+        Return the master seed, the same seed always gives the same sweep
+        """
+        return self.__seed
+
+    def get_rows(self):
+        """
+        Return one dictionary per point with its settings, the games
+        played, the ties, and each seat's win rate and mean score
+        """
+        rows = []
+        for spec, result in zip(self.__specs, self.__results):
+            rows.append({
+                'players': spec.get_number_of_players(),
+                'cards_per_hand': spec.get_cards_per_hand(),
+                'range': spec.get_card_range(),
+                'suits': ','.join('{}:{}'.format(name, rank) for name, rank in spec.get_suit_items()),
+                'deck_size': spec.get_deck_size(),
+                'games': result.get_games(),
+                'ties': result.get_ties(),
+                'win_rates': ' '.join('{:.4f}'.format(r) for r in result.get_win_rates()),
+                'mean_scores': ' '.join('{:.1f}'.format(s) for s in result.get_mean_scores()),
+            })
+        return rows
+
+    def write_csv(self, file):
+        """
+        Write the table of the sweep to a text file as CSV
+        """
+        rows = self.get_rows()
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]) if rows else [])
+        writer.writeheader()
+        writer.writerows(rows)
+
+    def format_table(self):
+        """
+        Return the table of the sweep as aligned text, one line per point
+        """
+        rows = self.get_rows()
+        if not rows:
+            return ''
+        columns = list(rows[0])
+        widths = [max(len(column), *(len(str(row[column])) for row in rows))
+                  for column in columns]
+        lines = ['  '.join(column.ljust(width) for column, width in zip(columns, widths))]
+        for row in rows:
+            lines.append('  '.join(str(row[column]).ljust(width)
+                                   for column, width in zip(columns, widths)))
+        return '\n'.join(line.rstrip() for line in lines)
+
+
+def run_sweep(specs, number_of_games, seed=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+              use_threads=False):
+    """
+    Play number_of_games games of every spec with common random numbers and
+    return a SweepResult
+
+    Parameters
+    ----------
+    specs: list of GameSpec
+        the points of the sweep
+
+    number_of_games: int
+        the number of games played at each point
+
+    seed: int, optional
+        the master seed, one is picked at random if not given. Chunk c of
+        the deck orders of deck size d is drawn from the seed [seed, d, c],
+        so the result does not depend on the number of workers
+
+    workers: int, optional
+        the number of worker processes, defaults to the number of CPUs.
+        With one worker the games are played in this process
+
+    chunk_size: int, optional
+        the most games per unit of work, a large deck size has fewer so the
+        chunk fits in batch.CELL_BUDGET
+
+    use_threads: bool, optional
+        play the chunks in a pool of worker threads instead of processes,
+        numpy releases the GIL for most of the work of a chunk
+    """
+    if np is None:
+        raise ImportError('the sweep requires numpy')
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % (1 << 64))
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # group the points by deck size, each group shares its deck orders
+    groups = {}
+    for i, spec in enumerate(specs):
+        groups.setdefault(spec.get_deck_size(), []).append(i)
+    work = []
+    for deck_size, points in groups.items():
+        group = [specs[i] for i in points]
+        rows = min(chunk_size, batch.chunk_rows(deck_size))
+        for chunk, start in enumerate(range(0, int(number_of_games), rows)):
+            games = min(rows, int(number_of_games) - start)
+            work.append((points, (group, deck_size, games, [seed, deck_size, chunk])))
+
+    results = [batch.BatchResult(0, np.zeros(spec.get_number_of_players(), dtype=np.int64), 0,
+                                 np.zeros(spec.get_number_of_players(), dtype=np.int64))
+               for spec in specs]
+    if workers == 1 or len(work) < 2:
+        finished = ((points, play_chunk(*args)) for points, args in work)
+        for points, chunk_results in finished:
+            for i, result in zip(points, chunk_results):
+                results[i].merge(result)
+        return SweepResult(specs, results, seed)
+
+    with simulation.make_executor(workers, use_threads) as pool:
+        futures = [(points, pool.submit(play_chunk, *args)) for points, args in work]
+        for points, future in futures:
+            for i, result in zip(points, future.result()):
+                results[i].merge(result)
+    return SweepResult(specs, results, seed)
+
+
+def run_sweep_file(options):
+    """
+    Play the sweep grid of the --sweep file with --games games per point,
+    default 10000, and print its table, or write it to --output as CSV
+    """
+    with open(options.sweep) as f:
+        specs = load_grid(f)
+    games = options.games if options.games is not None else 10000
+    result = run_sweep(specs, games, options.seed, options.workers,
+                       use_threads=getattr(options, 'threads', False))
+    if options.output:
+        with open(options.output, 'w', newline='') as f:
+            result.write_csv(f)
+    else:
+        print('Sweep of {} points, {} games each, seed {}'.format(len(specs), games,
+                                                                 result.get_seed()))
+        print(result.format_table())
@@ -0,0 +1,55 @@
+#! /usr/bin/env python3
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from cards import batch
+from cards import card_game
+
+SUITS = 'diamonds:4,hearts:3,spades:2,clubs:1'
+
+def test_batch_matches_game_play():
+    suits = card_game.parse_suits(SUITS)
+    d = card_game.Deck(14, suits)
+    order = np.array(d.get_order())
+    p = card_game.Players(3)
+    g = card_game.Game(2)
+    g.play(p, d)
+
+    b = batch.BatchGame(3, 2, 14, SUITS)
+    scores, winners = b.play_permutations(order[None, :])
+    assert scores[0].tolist() == [player.get_score() for player in p.get_players()]
+
+def test_batch_simulate():
+    b = batch.BatchGame(2, 3, 14, SUITS)
+    assert b.get_deck_size() == 56
+    r = b.simulate(1000, seed=7, chunk_size=300)
+    assert r.get_games() == 1000
+    assert r.get_wins().sum() == 1000
+    assert r.get_win_rates().sum() == pytest.approx(1.0)
+    # every card is dealt, so the mean scores add up to the deck total
+    assert r.get_mean_scores().sum() == pytest.approx(10 * 105)
+
+def test_batch_simulate_is_seeded():
+    b = batch.BatchGame(4, 3, 13, SUITS)
+    r1 = b.simulate(500, seed=3)
+    r2 = b.simulate(500, seed=3)
+    assert r1.get_wins().tolist() == r2.get_wins().tolist()
+
+def test_chunks_fit_the_cell_budget(monkeypatch):
+    assert batch.chunk_rows(52) == batch.CELL_BUDGET // 52
+    assert batch.chunk_rows(batch.CELL_BUDGET * 2) == 1
+    shapes = []
+    permutations = batch.random_permutations
+    def recording_permutations(rng, games, deck_size):
+        shapes.append((games, deck_size))
+        return permutations(rng, games, deck_size)
+    monkeypatch.setattr(batch, 'CELL_BUDGET', 5000)
+    monkeypatch.setattr(batch, 'random_permutations', recording_permutations)
+    b = batch.BatchGame(2, 3, 1000, SUITS)
+    r = b.simulate(7, seed=1)
+    assert r.get_games() == 7
+    assert shapes == [(1, 4000)] * 7
+
+# eos
@@ -1,7 +1,11 @@
 #! /usr/bin/env python3
 
 import sys
+import pickle
+import random
+import threading
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 from mock import patch
 from types import SimpleNamespace
 
@@ -201,8 +205,371 @@ def test_game_play_red_white_blue():
     g.play(p,d,True)
 
 
+def test_deck_card_tables():
+    d = card_game.Deck(14, {'diamonds':4,'hearts':3,'spades':2,'clubs':1})
+    assert len(d.get_deck()) == 56
+    assert len(d.get_values()) == 56
+    assert sorted(d.get_order()) == list(range(56))
+    cards = set(d.get_deck())
+    assert len(cards) == 56
+    assert card_game.Card('hearts',3,7) in cards
+    c = d.get_card(0)
+    assert c == card_game.Card('diamonds',4,1)
+
+def test_deck_view_is_live():
+    d = card_game.Deck(3, {'red':4,'white':3,'blue':2})
+    deck = d.get_deck()
+    second = deck[1]
+    d.get_top_card()
+    assert len(deck) == 8
+    assert deck[0] == second
+
+def test_draw_many():
+    d = card_game.Deck(3, {'red':4,'white':3,'blue':2})
+    deck = d.get_deck()
+    expected = deck[0:4]
+    hand = d.draw_many(4)
+    assert hand == expected
+    assert d.get_number_of_cards() == 5
+    assert len(d.draw_many(10)) == 5
+    assert d.draw_many(2) == []
+    assert d.get_top_card() is None
+
+def test_draw_indexes():
+    d = card_game.Deck(5, {'red':4,'white':3,'blue':2}, random.Random(2))
+    order = d.get_order()
+    assert list(d.draw_indexes(4)) == list(order[:4])
+    assert d.get_number_of_cards() == 11
+    assert list(d.draw_indexes(20)) == list(order[4:])
+    assert len(d.draw_indexes(2)) == 0
+
+def test_game_deals_card_indexes():
+    card_game.Card.clear_cache()
+    g = card_game.Game(3)
+    p = card_game.Players(2)
+    d = card_game.Deck(14, {'diamonds':4,'hearts':3,'spades':2,'clubs':1})
+    order = d.get_order()
+    result = g.play(p, d)
+    # no Card is made while the game is played
+    assert card_game.Card.get_cache_size() == 0
+    expected = [0, 0]
+    for position, c in enumerate(order):
+        card = d.get_card(c)
+        expected[(position // 3) % 2] += card.get_suit_rank() * card.get_value()
+    assert list(result.get_scores()) == expected
+    # the last hands are only turned into cards when asked for
+    assert p.get_player(0).get_hand() == [d.get_card(c) for c in order[54:]]
+    assert p.get_player(1).get_hand() == []
+
+def test_lazy_deck_tables():
+    d = card_game.LazyDeck(10, {'red':4,'blue':2})
+    ranks = d.get_suit_ranks()
+    values = d.get_values()
+    assert len(ranks) == len(values) == 20
+    assert [ranks[c] for c in (0, 9, 10, 19)] == [4, 4, 2, 2]
+    assert [values[c] for c in (0, 9, 10, 19)] == [1, 10, 1, 10]
+    with pytest.raises(IndexError):
+        ranks[20]
+
+def test_parse_args_profile():
+    testargs = ['card_game.py', '--profile']
+    with patch.object(sys, 'argv', testargs):
+        options = card_game.parse_command_line()
+        assert options.profile is True
 
+def test_game_stats():
+    options = SimpleNamespace()
+    options.debug = False
+    options.profile = True
+    options.num_of_cards = '2'
+    options.players = '2'
+    options.range = '13'
+    options.suits = 'diamonds:4,hearts:3,spades:2,clubs:1'
+    g,p,d = card_game.initialize_variables(options)
 
+    g.play(p,d)
+    stats = g.get_stats()
+    assert stats is not None
+    assert stats.get_count('shuffle') == 1
+    assert stats.get_count('draw') == stats.get_count('score')
+    assert stats.get_count('game') == 1
+    assert stats.get_time('game') >= stats.get_time('winner')
+    assert 'draw' in str(stats)
+
+def test_game_stats_shared_by_threads():
+    stats = card_game.GameStats()
+    def record():
+        for i in range(1000):
+            stats.record('draw', 0.0)
+    threads = [threading.Thread(target=record) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stats.get_count('draw') == 8000
+
+def test_spec_play_concurrent():
+    spec = card_game.GameSpec.compile(3, 2, 13, 'red:3,green:2,blue:1')
+    seeds = range(40)
+    serial = [spec.play(random.Random(seed)) for seed in seeds]
+    assert [r.get_scores() for r in serial] == \
+        [r.get_scores() for r in (spec.play(random.Random(seed)) for seed in seeds)]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        threaded = list(pool.map(lambda seed: spec.play(random.Random(seed)), seeds))
+    assert [(r.get_player_ids(), r.get_scores()) for r in threaded] == \
+        [(r.get_player_ids(), r.get_scores()) for r in serial]
+
+def test_game_without_stats():
+    g = card_game.Game(2)
+    assert g.get_stats() is None
+
+def test_game_play_result():
+    g = card_game.Game(2)
+    p = card_game.Players(3)
+    d = card_game.Deck(3, {'red':4,'white':3,'blue':2})
+    result = g.play(p, d)
+    scores = [player.get_score() for player in p.get_players()]
+    assert list(result.get_scores()) == scores
+    assert result.get_winning_score() == max(scores)
+    assert result.get_winner() == scores.index(max(scores))
+    assert result.get_winner_id() == p.get_player(result.get_winner()).get_id()
+    # 9 cards, 2 per hand, 3 players: the second round runs out of cards
+    assert result.get_number_of_rounds() == 2
+    assert list(result.get_round_scores(1)) == scores
+    assert str(result).startswith('Game won by') or result.is_tie()
+
+def test_game_result_tie():
+    result = card_game.GameResult(['Liam', 'Emma', 'Noah'], [10, 12, 12], None)
+    assert result.is_tie()
+    assert result.get_winners() == (1, 2)
+    assert result.get_winner() == 1
+    assert str(result) == 'Game tied between Emma, Noah with a score of 12'
+
+def test_card_flyweight():
+    c = card_game.Card('Red',2,10)
+    assert card_game.Card('Red',2,10) is c
+    with pytest.raises(AttributeError):
+        c.value = 3
+    assert not hasattr(c, '__dict__')
+    assert pickle.loads(pickle.dumps(c)) is c
+
+def test_decks_share_cards():
+    suits = {'diamonds':4,'hearts':3,'spades':2,'clubs':1}
+    d1 = card_game.Deck(14, suits)
+    d2 = card_game.Deck(14, suits)
+    assert {id(c) for c in d1.get_deck()} == {id(c) for c in d2.get_deck()}
+
+def test_card_cache_is_weak():
+    card_game.Card.clear_cache()
+    c = card_game.Card('Gold', 7, 1)
+    for value in range(2, 10000):
+        card_game.Card('Gold', 7, value)
+    assert card_game.Card.get_cache_size() == 1
+    assert card_game.Card('Gold', 7, 1) is c
+    del c
+    assert card_game.Card.get_cache_size() == 0
+
+def test_card_memory_report():
+    report = card_game.card_memory_report(14, {'diamonds':4,'hearts':3,'spades':2,'clubs':1}, 10)
+    assert report['cards_per_deck'] == 56
+    assert report['slots_card_bytes'] < report['dict_card_bytes']
+    assert report['saved_bytes_per_deck'] > 0
+
+def test_game_spec():
+    options = SimpleNamespace()
+    options.num_of_cards = '2'
+    options.players = '3'
+    options.range = '13'
+    options.suits = None
+    spec = card_game.GameSpec.from_options(options)
+    assert spec.get_number_of_players() == 3
+    assert spec.get_cards_per_hand() == 2
+    assert spec.get_deck_size() == 52
+    assert spec.get_suits() == {'diamonds':4,'hearts':3,'spades':2,'clubs':1}
+    assert spec is card_game.GameSpec.from_options(options)
+    same = card_game.GameSpec(3, 2, 13, {'diamonds':4,'hearts':3,'spades':2,'clubs':1})
+    assert spec == same
+    assert hash(spec) == hash(same)
+    assert len({spec, same}) == 1
+
+def test_game_spec_validation():
+    with pytest.raises(ValueError):
+        card_game.GameSpec(0, 2, 13, 'red:1')
+    with pytest.raises(ValueError):
+        card_game.GameSpec(2, 2, 0, 'red:1')
+    with pytest.raises(ValueError):
+        card_game.GameSpec(2, 2, 13, {})
+
+@pytest.mark.parametrize('settings', [(2, 2, 13.7, 'red:1'), (2.5, 2, 13, 'red:1'),
+                                      (2, '2.0', 13, 'red:1'), (2, True, 13, 'red:1'),
+                                      (2, 2, 13, {'red': 1.5}), (2, 2, None, 'red:1')])
+def test_game_spec_whole_numbers(settings):
+    with pytest.raises(ValueError):
+        card_game.GameSpec(*settings)
+    with pytest.raises(ValueError):
+        card_game.GameSpec.compile(*settings)
+
+def test_game_spec_compile_is_cached():
+    spec = card_game.GameSpec.compile(2, 2, 13, {'red': 1})
+    assert spec is card_game.GameSpec.compile('2', 2.0, '13', (('red', 1),))
+    assert spec.get_card_range() == 13
+
+def test_game_spec_from_dict():
+    defaults = card_game.GameSpec.compile(3, 2, 13, 'red:4,white:3,blue:2')
+    spec = card_game.GameSpec.from_dict({'players': 4, 'suits': {'a': 2, 'b': 1}}, defaults)
+    assert spec == card_game.GameSpec(4, 2, 13, 'a:2,b:1')
+    assert card_game.GameSpec.from_dict({}, defaults) == defaults
+    assert card_game.GameSpec.from_dict({}).get_deck_size() == 56
+    with pytest.raises(ValueError):
+        card_game.GameSpec.from_dict({'suits': 3})
+
+def test_decks_share_template():
+    spec = card_game.GameSpec.compile(2, 3, 13, 'red:4,white:3,blue:2')
+    d1 = spec.create_deck()
+    d2 = spec.create_deck()
+    assert d1.get_values() is d2.get_values()
+    assert d1.get_values() is spec.get_template().get_values()
+    assert sorted(d1.get_order()) == list(spec.get_template().get_order())
+
+def test_lazy_deck_is_a_permutation():
+    d = card_game.LazyDeck(50, {'red':4,'white':3,'blue':2}, random.Random(3))
+    order = d.get_order()
+    assert sorted(order) == list(range(150))
+    assert list(order) != list(range(150))
+    cards = d.get_deck()
+    assert cards[0] == d.get_card(order[0])
+    assert d.get_top_card() == d.get_card(order[0])
+    hand = d.draw_many(4)
+    assert hand == [d.get_card(i) for i in order[1:5]]
+    assert d.get_number_of_cards() == 145
+
+def test_lazy_deck_draws_in_constant_memory():
+    card_game.Card.clear_cache()
+    d = card_game.LazyDeck(10**6, {'red':2,'blue':1}, random.Random(5))
+    for i in range(2000):
+        d.get_top_card()
+    for i in range(200):
+        d.draw_many(10)
+    assert d.get_number_of_cards() == 2 * 10**6 - 4000
+    assert card_game.Card.get_cache_size() == 0
+
+def test_lazy_deck_reshuffle_keeps_remaining_cards():
+    d = card_game.LazyDeck(20, {'red':2,'blue':1}, random.Random(4))
+    d.draw_many(7)
+    remaining = sorted(d.get_order())
+    d.shuffle()
+    assert sorted(d.get_order()) == remaining
 
+def test_lazy_deck_sort_cards_by():
+    d = card_game.LazyDeck(14, {'diamonds':4,'hearts':3,'spades':2,'clubs':1})
+    assert d.sort_cards_by(['green']) is False
+    assert d.sort_cards_by(['clubs', 'hearts']) is True
+    deck = d.get_deck()
+    assert len(deck) == 28
+    assert deck[0] == card_game.Card('clubs', 1, 1)
+    assert deck[14] == card_game.Card('hearts', 3, 1)
+    d.get_top_card()
+    with pytest.raises(ValueError):
+        d.sort_cards_by(['clubs'])
+
+def test_lazy_game_play():
+    spec = card_game.GameSpec.compile(3, 2, 1000, 'red:4,white:3,blue:2')
+    g = spec.create_game()
+    p = spec.create_players()
+    d = spec.create_deck(lazy=True)
+    result = g.play(p, d)
+    total = sum(rank * value for rank in (4, 3, 2) for value in range(1, 1001))
+    assert sum(result.get_scores()) == total
+
+def test_sort_cards_by_after_draws():
+    d = card_game.Deck(5, {'red':4,'white':3,'blue':2})
+    drawn = d.draw_many(6)
+    assert d.sort_cards_by(['blue', 'red']) is True
+    expected = [card_game.Card(s, r, v) for s, r in (('blue', 2), ('red', 4))
+                for v in range(1, 6)]
+    expected = [c for c in expected if c not in drawn]
+    assert list(d.get_deck()) == expected
+
+def test_sort_cards_by_invalid_keeps_deck():
+    d = card_game.Deck(5, {'red':4,'white':3,'blue':2})
+    order = d.get_order()
+    assert d.sort_cards_by(['red', 'green']) is False
+    assert d.get_order() == order
+
+
+def test_deck_set_order():
+    d = card_game.Deck(5, {'red':4,'white':3,'blue':2}, shuffled=False)
+    assert list(d.get_order()) == list(range(15))
+    d.set_order([14, 0, 7])
+    assert d.get_number_of_cards() == 3
+    assert d.get_top_card() == card_game.Card('blue', 2, 5)
+    with pytest.raises(ValueError):
+        d.set_order([1, 1])
+    with pytest.raises(ValueError):
+        d.set_order([15])
+
+def test_players_with_ids():
+    p = card_game.Players(2, player_ids=['Ann', 'Bob'])
+    assert [player.get_id() for player in p.get_players()] == ['Ann', 'Bob']
+    with pytest.raises(ValueError):
+        card_game.Players(3, player_ids=['Ann'])
+
+def test_shoe_deals_every_copy():
+    shoe = card_game.Shoe(5, {'red':4,'white':3,'blue':2}, 3, random.Random(2))
+    assert shoe.get_number_of_cards() == 45
+    cards = shoe.draw_many(40)
+    assert shoe.discard(10) == 5
+    assert shoe.get_number_of_cards() == 0
+    assert shoe.get_top_card() is None
+    assert shoe.draw_many(3) == []
+    assert all(cards.count(c) <= 3 for c in cards)
+    shoe.reset()
+    drawn = shoe.draw_many(45)
+    assert all(drawn.count(shoe.get_card(i)) == 3 for i in range(15))
+    assert [shoe.get_count(i) for i in range(15)] == [0] * 15
+
+def test_shoe_draws_uniformly():
+    rng = random.Random(4)
+    firsts = [0] * 6
+    for i in range(6000):
+        shoe = card_game.Shoe(3, {'red':2,'blue':1}, 1000, rng)
+        card = shoe.get_top_card()
+        firsts[(card.get_suit_rank() - 1) * 3 + card.get_value() - 1] += 1
+    assert all(800 < n < 1200 for n in firsts)
+
+def test_shoe_plays_a_game():
+    spec = card_game.GameSpec.compile(3, 2, 13, 'red:4,white:3,blue:2')
+    shoe = spec.create_shoe(4, random.Random(1))
+    assert shoe.get_suit_ranks() is spec.get_template().get_suit_ranks()
+    result = spec.create_game().play(spec.create_players(), shoe)
+    assert sum(result.get_scores()) == 4 * 9 * 91
+    with pytest.raises(ValueError):
+        spec.create_shoe(0)
+
+def test_shoe_order():
+    shoe = card_game.Shoe(3, {'red':2,'blue':1}, 2, random.Random(5))
+    shoe.get_top_card()
+    order = shoe.get_order()
+    assert len(order) == 11
+    assert list(shoe.get_deck()) == [shoe.get_card(c) for c in order]
+    assert shoe.get_card_at(1) == shoe.get_card(order[1])
+    # the draws follow the fixed order and keep the counts
+    assert list(shoe.draw_indexes(4)) == list(order[:4])
+    assert shoe.get_order() == order[4:]
+    assert sum(shoe.get_count(i) for i in range(6)) == shoe.get_number_of_cards() == 7
+    assert shoe.sort_cards_by(['green']) is False
+    assert shoe.sort_cards_by(['blue', 'red'])
+    # blue is card indexes 3 to 5, red 0 to 2
+    rest = sorted(order[4:])
+    assert list(shoe.get_order()) == [c for c in rest if c >= 3] + [c for c in rest if c < 3]
+    shoe.set_order([0, 0, 5])
+    assert [shoe.get_count(i) for i in range(6)] == [2, 0, 0, 0, 0, 1]
+    assert shoe.draw_many(5) == [card_game.Card('red', 2, 1)] * 2 + [card_game.Card('blue', 1, 3)]
+    with pytest.raises(ValueError):
+        shoe.set_order([0, 0, 0])
+    shoe.reset()
+    shoe.get_order()
+    shoe.shuffle()
+    assert len(shoe.draw_indexes(12)) == 12
 
 # eos
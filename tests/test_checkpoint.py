@@ -0,0 +1,93 @@
+#! /usr/bin/env python3
+
+import os
+
+import pytest
+
+from cards import checkpoint
+from cards import simulation
+
+SUITS = 'diamonds:4,hearts:3,spades:2,clubs:1'
+
+def test_checkpoint_round_trip():
+    result = simulation.SimulationResult(2)
+    result.add_game([10, 20])
+    result.add_game([-3, 2])
+    settings = (2, 3, 13, {'red': 2, 'blue': 1})
+    saved = checkpoint.Checkpoint(settings, 50, 500, -2**70, 2, result)
+    loaded = checkpoint.Checkpoint.from_bytes(saved.to_bytes())
+    assert loaded.get_settings() == settings
+    assert loaded.get_seed() == -2**70
+    assert loaded.get_blocks_done() == 2
+    assert loaded.get_number_of_games() == 500
+    assert loaded.get_result() == result
+    with pytest.raises(ValueError):
+        checkpoint.Checkpoint.from_bytes(b'CG')
+    data = saved.to_bytes()
+    for size in range(checkpoint.HEADER_FORMAT.size, len(data)):
+        with pytest.raises(ValueError):
+            checkpoint.Checkpoint.from_bytes(data[:size])
+    with pytest.raises(ValueError):
+        checkpoint.Checkpoint((2, 3, 13, {'x' * 256: 1}), 50, 500, 1, 0, result)
+
+def test_resume_is_identical(tmp_path):
+    path = str(tmp_path / 'run.ck')
+    runner = simulation.MonteCarloRunner(2, 3, 13, SUITS, block_size=40)
+    expected = runner.run(200, seed=8, workers=1)
+
+    # save the state of a run that stopped after two of its five blocks
+    partial = simulation.SimulationResult(2)
+    for games, seed in runner.blocks(200, 8)[:2]:
+        partial.merge(simulation.play_block(*runner.get_settings(), games, seed))
+    checkpoint.save_checkpoint(path, checkpoint.Checkpoint(
+        runner.get_settings(), 40, 200, 8, 2, partial))
+
+    resumed = checkpoint.run_with_checkpoints(runner, 200, path, workers=1)
+    assert resumed == expected
+    assert checkpoint.load_checkpoint(path).get_blocks_done() == 5
+    assert not os.path.exists(path + '.tmp')
+
+def test_run_with_checkpoints(tmp_path):
+    path = str(tmp_path / 'run.ck')
+    runner = simulation.MonteCarloRunner(3, 2, 10, SUITS, block_size=30)
+    result = checkpoint.run_with_checkpoints(runner, 100, path, seed=3, workers=2, interval=0)
+    assert result == runner.run(100, seed=3, workers=1)
+    # a finished run is loaded rather than played again
+    assert checkpoint.run_with_checkpoints(runner, 100, path) == result
+    with pytest.raises(ValueError):
+        checkpoint.run_with_checkpoints(runner, 90, path)
+    # a checkpoint of another seed is kept rather than overwritten
+    with pytest.raises(ValueError):
+        checkpoint.run_with_checkpoints(runner, 100, path, seed=4)
+    assert checkpoint.load_checkpoint(path).get_seed() == 3
+    assert checkpoint.load_checkpoint(str(tmp_path / 'none')) is None
+
+def test_adaptive_run_with_checkpoints(tmp_path):
+    path = str(tmp_path / 'run.ck')
+    runner = simulation.MonteCarloRunner(2, 3, 13, SUITS, block_size=100)
+    expected = runner.run_adaptive(0.15, 5000, seed=2, workers=1)
+    result = checkpoint.run_with_checkpoints(runner, 5000, path, seed=2, workers=2, width=0.15)
+    assert result == expected
+    assert result.get_games() < 5000
+    # the stopped run is resumed without playing more games
+    assert checkpoint.run_with_checkpoints(runner, 5000, path, width=0.15) == expected
+
+def test_interrupted_run_is_saved(tmp_path, monkeypatch):
+    path = str(tmp_path / 'run.ck')
+    runner = simulation.MonteCarloRunner(2, 3, 13, SUITS, block_size=20)
+    expected = runner.run(100, seed=5, workers=1)
+    play_block = simulation.play_block
+    played = []
+    def interrupted_block(*args):
+        if len(played) == 3:
+            raise KeyboardInterrupt
+        played.append(args)
+        return play_block(*args)
+    monkeypatch.setattr(simulation, 'play_block', interrupted_block)
+    with pytest.raises(KeyboardInterrupt):
+        checkpoint.run_with_checkpoints(runner, 100, path, seed=5, workers=1, interval=1e9)
+    assert checkpoint.load_checkpoint(path).get_blocks_done() == 3
+    monkeypatch.setattr(simulation, 'play_block', play_block)
+    assert checkpoint.run_with_checkpoints(runner, 100, path, workers=1) == expected
+
+# eos
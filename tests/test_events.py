@@ -0,0 +1,56 @@
+#! /usr/bin/env python3
+
+import io
+import json
+
+from cards import card_game
+from cards import events
+
+def play_game(listener):
+    g = card_game.Game(2)
+    p = card_game.Players(2)
+    d = card_game.Deck(3, {'red':4,'white':3,'blue':2})
+    g.play(p, d, listener=listener)
+    return p
+
+def test_game_events():
+    collected = []
+    p = play_game(collected.append)
+    cards = [e for e in collected if isinstance(e, card_game.CardDrawnEvent)]
+    assert len(cards) == 9
+    finished = collected[-1]
+    assert isinstance(finished, card_game.GameFinishedEvent)
+    assert finished.scores == tuple(player.get_score() for player in p.get_players())
+    hands = [e for e in collected if isinstance(e, card_game.HandScoredEvent)]
+    assert sum(e.hand_score for e in hands) == sum(finished.scores)
+
+def test_jsonl_sink():
+    out = io.StringIO()
+    with events.JsonlSink(out, buffer_size=4) as sink:
+        play_game(sink)
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert lines[0]['event'] == 'TurnEvent'
+    assert lines[-1]['event'] == 'GameFinishedEvent'
+
+def test_binary_sink_round_trip():
+    collected = []
+    out = io.BytesIO()
+    sink = events.BinarySink(out, buffer_size=16)
+    play_game(card_game.combine_listeners(collected.append, sink))
+    sink.close()
+    assert list(events.read_binary(out.getvalue())) == collected
+
+def test_binary_sink_large_table():
+    seats = 70000
+    ids = tuple('p{}'.format(i) for i in range(seats))
+    collected = [card_game.TurnEvent(1, seats - 1, ids[-1]),
+                 card_game.CardDrawnEvent(1, seats - 1, 0, 'red', 1, 2),
+                 card_game.HandScoredEvent(1, seats - 1, 2, 2),
+                 card_game.GameFinishedEvent(seats - 1, ids[-1], 2, ids, (0,) * (seats - 1) + (2,))]
+    out = io.BytesIO()
+    with events.BinarySink(out) as sink:
+        for event in collected:
+            sink(event)
+    assert list(events.read_binary(out.getvalue())) == collected
+
+# eos
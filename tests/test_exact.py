@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+
+import itertools
+import pytest
+
+from cards import card_game
+from cards import exact
+
+def brute_force(players, cards_per_hand, card_range, suits):
+    scores = [rank * value for rank in suits.values() for value in range(1, card_range + 1)]
+    seats = card_game.deal_seats(players, cards_per_hand, len(scores))
+    wins = [0] * players
+    games = 0
+    for order in itertools.permutations(scores):
+        totals = [0] * players
+        for position, score in enumerate(order):
+            totals[seats[position]] += score
+        wins[totals.index(max(totals))] += 1
+        games += 1
+    return [w / games for w in wins]
+
+@pytest.mark.parametrize('players,cards_per_hand', [(2, 2), (2, 1), (3, 1), (3, 2)])
+def test_exact_matches_brute_force(players, cards_per_hand):
+    suits = {'red': 2, 'blue': 1}
+    result = exact.exact_odds(players, cards_per_hand, 3, suits)
+    expected = brute_force(players, cards_per_hand, 3, suits)
+    assert list(result.get_win_probabilities()) == pytest.approx(expected)
+    for distribution in result.get_score_distributions():
+        assert sum(distribution.values()) == pytest.approx(1.0)
+
+def test_exact_odds_cached():
+    exact.clear_cache()
+    r1 = exact.exact_odds(2, 3, 14, 'diamonds:4,hearts:3,spades:2,clubs:1')
+    r2 = exact.exact_odds('2', '3', '14', {'a': 1, 'b': 2, 'c': 3, 'd': 4})
+    assert r1 is r2
+    assert r1.get_hand_sizes() == (29, 27)
+    assert sum(r1.get_win_probabilities()) == pytest.approx(1.0)
+
+def test_two_player_path_matches_joint():
+    groups = exact.score_groups(5, (1, 2, 3))
+    ways = exact.subset_sums(groups, 8)
+    deck_total = sum(score * count for score, count in groups)
+    assert exact.two_player_win_counts(ways, (8, 7), deck_total) == \
+        exact.joint_win_counts(groups, (8, 7))
+
+def test_exact_odds_state_limit():
+    exact.clear_cache()
+    with pytest.raises(ValueError):
+        exact.exact_odds(3, 3, 14, 'diamonds:4,hearts:3,spades:2,clubs:1')
+    with pytest.raises(ValueError):
+        exact.exact_odds(3, 1, 3, {'red': 2, 'blue': 1}, max_states=5)
+    result = exact.exact_odds(3, 1, 3, {'red': 2, 'blue': 1}, max_states=None)
+    assert sum(result.get_win_probabilities()) == pytest.approx(1.0)
+
+def test_failures_are_cached(monkeypatch):
+    exact.clear_cache()
+    solve = exact._solve_setup
+    calls = []
+    def counting_solve(*args):
+        calls.append(args)
+        return solve(*args)
+    monkeypatch.setattr(exact, '_solve_setup', counting_solve)
+    for i in range(2):
+        # two players on a large deck hit the limit in the subset sums
+        with pytest.raises(ValueError):
+            exact.exact_odds(2, 3, 30, 'diamonds:4,hearts:3,spades:2,clubs:1')
+    assert len(calls) == 1
+    groups = exact.score_groups(5, (1, 2, 3))
+    ways = exact.subset_sums(groups, 8)
+    assert exact.subset_sum_states(groups, 8) >= sum(len(w) for w in ways)
+    with pytest.raises(ValueError):
+        exact.subset_sums(groups, 8, max_states=sum(len(w) for w in ways) - 1)
+
+# eos
@@ -0,0 +1,68 @@
+#! /usr/bin/env python3
+
+import random
+
+import pytest
+
+from cards import card_game
+from cards import leaderboard
+
+def test_leaderboard_queries():
+    board = leaderboard.Leaderboard()
+    for name, score in [('a', 10), ('b', 30), ('c', 20), ('d', 30)]:
+        board.add(name, score)
+    assert len(board) == 4
+    assert board.get_leader() == ('b', 30)
+    assert board.top_k(3) == [('b', 30), ('d', 30), ('c', 20)]
+    assert board.get_rank('d') == 1
+    assert board.get_rank('c') == 3
+    assert board.get_rank('a') == 4
+
+    board.add_points('a', 25)
+    assert board.get_leader() == ('a', 35)
+    assert board.get_rank('b') == 2
+    board.update('a', 10)
+    board.update('a', 35)
+    board.update('a', 10)
+    assert board.top_k(10) == [('b', 30), ('d', 30), ('c', 20), ('a', 10)]
+
+def test_leaderboard_matches_sorting():
+    rng = random.Random(1)
+    board = leaderboard.Leaderboard()
+    scores = {}
+    for i in range(2000):
+        entrant = rng.randrange(50)
+        scores[entrant] = scores.get(entrant, 0) + rng.randrange(20)
+        board.add_points(entrant, scores[entrant] - board.get_score(entrant)
+                         if entrant in board else scores[entrant])
+    for entrant, score in scores.items():
+        assert board.get_rank(entrant) == 1 + sum(1 for s in scores.values() if s > score)
+    best = max(scores.values())
+    assert board.get_leader()[1] == best
+    assert [s for e, s in board.top_k(5)] == sorted(scores.values(), reverse=True)[:5]
+
+def test_players_report_to_leaderboard():
+    board = leaderboard.Leaderboard()
+    p = card_game.Players(3, leaderboard=board)
+    d = card_game.Deck(13, {'diamonds':4,'hearts':3,'spades':2,'clubs':1})
+    result = card_game.Game(2).play(p, d)
+    leader, score = board.get_leader()
+    assert score == result.get_winning_score()
+    assert leader is p.get_player(result.get_winner())
+    assert board.get_rank(leader) == 1
+
+def test_leaderboard_negative_scores():
+    board = leaderboard.Leaderboard()
+    p = card_game.Players(2, leaderboard=board, player_ids=['a', 'b'])
+    d = card_game.Deck(13, card_game.parse_suits('red:-1,blue:1'))
+    result = card_game.Game(3).play(p, d)
+    assert sum(result.get_scores()) == 0
+    assert board.get_leader()[1] == result.get_winning_score()
+    # below any score of the game, the red cards add up to -91
+    board.add('low', -100)
+    assert board.get_rank('low') == 3
+    assert board.top_k(3)[-1] == ('low', -100)
+    with pytest.raises(ValueError):
+        board.add('too low', -2**47 - 1)
+
+# eos
@@ -0,0 +1,106 @@
+#! /usr/bin/env python3
+
+import random
+
+import pytest
+
+from cards import card_game
+from cards import player_table
+from cards import scoring
+
+SUITS = {'diamonds':4,'hearts':3,'spades':2,'clubs':1}
+
+def test_player_table_views():
+    t = player_table.PlayerTable(3, random.Random(1))
+    assert t.get_number_of_players() == 3
+    assert len(t.get_players()) == 3
+    assert t.get_player(3) is None
+    p = t.get_player(1)
+    hand = [card_game.Card('hearts',3,10), card_game.Card('hearts',3,11)]
+    p.score_hand(hand)
+    assert p.get_score() == 63
+    assert p.get_hand() == hand
+    assert t.get_scores()[1] == 63
+    p.score(2)
+    assert t.get_score(1) == 2
+    assert p.get_id() in card_game.NAMES
+
+def test_player_table_with_game_play():
+    t = player_table.PlayerTable(3)
+    d = card_game.Deck(13, SUITS)
+    result = card_game.Game(2).play(t, d)
+    assert list(result.get_scores()) == list(t.get_scores())
+
+def test_play_deck_matches_game():
+    rng = random.Random(9)
+    d1 = card_game.Deck(13, SUITS, random.Random(2))
+    d2 = card_game.Deck(13, SUITS, random.Random(2))
+    players = card_game.Players(5, rng)
+    card_game.Game(3).deal(players, d1)
+    t = player_table.PlayerTable(5)
+    t.play_deck(d2, 3)
+    assert list(t.get_scores()) == [p.get_score() for p in players.get_players()]
+    assert [t.get_hand(s) for s in range(5)] == [p.get_hand() for p in players.get_players()]
+    assert d2.get_number_of_cards() == 0
+
+@pytest.mark.parametrize('rule', [scoring.ValueOnly(), scoring.CappedHand(20)])
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_scoring_rule(rule, use_numpy, monkeypatch):
+    if not use_numpy:
+        monkeypatch.setattr(player_table, 'np', None)
+    players = card_game.Players(4, scoring_rule=rule)
+    card_game.Game(3).deal(players, card_game.Deck(13, SUITS, random.Random(4)))
+    expected = [p.get_score() for p in players.get_players()]
+    t = player_table.PlayerTable(4, scoring_rule=rule)
+    card_game.Game(3).deal(t, card_game.Deck(13, SUITS, random.Random(4)))
+    assert list(t.get_scores()) == expected
+    t.reset()
+    t.play_deck(card_game.Deck(13, SUITS, random.Random(4)), 3)
+    assert list(t.get_scores()) == expected
+    t.reset()
+    t.get_player(0).score_hand([card_game.Card('hearts', 3, 10)] * 3)
+    assert t.get_score(0) == rule.score_hand([card_game.Card('hearts', 3, 10)] * 3)
+
+@pytest.mark.parametrize('make_deck', [
+    lambda: card_game.LazyDeck(13, SUITS, random.Random(3)),
+    lambda: card_game.Shoe(13, SUITS, 3, random.Random(3))])
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_play_deck_lazy_deck_and_shoe(make_deck, use_numpy, monkeypatch):
+    if not use_numpy:
+        monkeypatch.setattr(player_table, 'np', None)
+    players = card_game.Players(3)
+    card_game.Game(4).deal(players, make_deck())
+    t = player_table.PlayerTable(3)
+    deck = make_deck()
+    t.play_deck(deck, 4)
+    assert list(t.get_scores()) == [p.get_score() for p in players.get_players()]
+    assert [t.get_hand(s) for s in range(3)] == [p.get_hand() for p in players.get_players()]
+    assert deck.get_number_of_cards() == 0
+
+def test_hand_store_is_bounded():
+    t = player_table.PlayerTable(4)
+    g = card_game.Game(3)
+    for seed in range(50):
+        d = card_game.Deck(13, SUITS, random.Random(seed))
+        g.play(t, d)
+        assert t.get_hand_store_size() <= 2 * 4 * 3
+    t.play_deck(card_game.Deck(13, SUITS, random.Random(1)), 3)
+    hand = [card_game.Card('hearts',3,10)] * 5
+    for _ in range(20):
+        t.get_player(2).hand(hand)
+        t.get_player(0).hand(hand[:1])
+        assert t.get_hand(2) == hand
+        assert t.get_hand(0) == hand[:1]
+        assert t.get_hand_store_size() <= 2 * (3 * 3 + 5)
+
+def test_add_scores_and_top_k():
+    t = player_table.PlayerTable(6)
+    t.add_scores([0, 1, 2, 3, 3, 5], [5, 9, 1, 4, 5, 9])
+    assert list(t.get_scores()) == [5, 9, 1, 9, 0, 9]
+    assert t.top_k(3) == [1, 3, 5]
+    assert t.top_k(4) == [1, 3, 5, 0]
+    assert t.top_k(10) == [1, 3, 5, 0, 2, 4]
+    t.reset()
+    assert list(t.get_scores()) == [0] * 6
+
+# eos
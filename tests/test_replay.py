@@ -0,0 +1,112 @@
+#! /usr/bin/env python3
+
+import io
+import random
+
+import pytest
+
+from cards import card_game
+from cards import replay
+
+SPEC = card_game.GameSpec.compile(3, 2, 14, 'diamonds:4,hearts:3,spades:2,clubs:1')
+
+def test_order_record_replays():
+    result, record = replay.play_recorded(SPEC)
+    assert record.get_seed() is None
+    data = record.to_bytes()
+    assert len(data) < 150
+    again = replay.replay(replay.GameRecord.from_bytes(data))
+    assert again.get_scores() == result.get_scores()
+    assert again.get_player_ids() == result.get_player_ids()
+    assert list(again.get_trajectory()) == list(result.get_trajectory())
+
+def test_seed_record_replays():
+    result, record = replay.play_recorded(SPEC, seed=2**63 + 5)
+    copy = replay.GameRecord.from_bytes(record.to_bytes())
+    assert copy == record
+    assert copy.get_seed() == 2**63 + 5
+    assert replay.replay(copy).get_scores() == result.get_scores()
+
+def test_replay_events_match():
+    events = []
+    result, record = replay.play_recorded(SPEC, listener=events.append)
+    replayed = []
+    replay.replay(record, listener=replayed.append)
+    assert replayed == events
+
+def test_large_deck_and_other_names():
+    spec = card_game.GameSpec.compile(2, 3, 200, 'red:2,blue:1')
+    order = list(range(400))
+    random.Random(1).shuffle(order)
+    record = replay.GameRecord(spec, ['Zoë', 'Liam'], order=order)
+    copy = replay.GameRecord.from_bytes(record.to_bytes())
+    assert copy == record
+    assert copy.get_player_ids() == ('Zoë', 'Liam')
+    assert list(copy.get_order()) == order
+
+def test_archive():
+    records = [replay.play_recorded(SPEC, seed=s)[1] for s in range(3)]
+    records.append(replay.play_recorded(SPEC)[1])
+    f = io.BytesIO()
+    replay.write_records(f, records)
+    assert list(replay.read_records(f.getvalue())) == records
+
+def test_bad_records():
+    with pytest.raises(ValueError):
+        replay.GameRecord(SPEC, ['Liam', 'Emma', 'Noah'])
+    with pytest.raises(ValueError):
+        replay.GameRecord(SPEC, ['Liam'], seed=1)
+    with pytest.raises(ValueError):
+        replay.GameRecord.from_bytes(b'nope')
+    record = replay.GameRecord(SPEC, ['Liam', 'Emma', 'Noah'], seed=1)
+    with pytest.raises(ValueError):
+        replay.replay(record)
+
+def test_truncated_records():
+    result, record = replay.play_recorded(SPEC)
+    data = record.to_bytes()
+    for size in (len(data) - 1, len(data) - 20, 20):
+        with pytest.raises(ValueError):
+            replay.GameRecord.from_bytes(data[:size])
+    data = replay.play_recorded(SPEC, seed=7)[1].to_bytes()
+    with pytest.raises(ValueError):
+        replay.GameRecord.from_bytes(data[:-1])
+
+def test_long_names_and_seeds():
+    with pytest.raises(ValueError):
+        replay.GameRecord(SPEC, ['x' * 256, 'Liam', 'Emma'], seed=1)
+    record = replay.GameRecord(SPEC, ['x' * 255, 'Liam', 'Emma'], seed=1)
+    assert replay.GameRecord.from_bytes(record.to_bytes()) == record
+    # a seed that does not fit in a record is recorded by the deck order
+    result, record = replay.play_recorded(SPEC, seed=-1)
+    assert record.get_seed() is None
+    assert replay.replay(record).get_scores() == result.get_scores()
+    spec = card_game.GameSpec.compile(2, 1, 3, (('x' * 256, 1),))
+    with pytest.raises(ValueError):
+        replay.GameRecord(spec, ['Liam', 'Emma'], seed=1)
+
+def test_shoe_records():
+    shoe = SPEC.create_shoe(3, random.Random(2))
+    players = SPEC.create_players()
+    record = replay.record_game(SPEC, players, shoe, seed=2)
+    assert record.get_seed() is None and record.get_copies() == 3
+    result = SPEC.create_game().play(players, shoe)
+    loaded = replay.GameRecord.from_bytes(record.to_bytes())
+    assert loaded == record
+    assert replay.replay(loaded).get_scores() == result.get_scores()
+    with pytest.raises(ValueError):
+        replay.GameRecord(SPEC, record.get_player_ids(), order=record.get_order())
+
+def test_large_tables_and_old_records():
+    spec = card_game.GameSpec.compile(70000, 70000, 3, 'red:1')
+    record = replay.GameRecord(spec, ['Liam'] * 70000, seed=5)
+    assert replay.GameRecord.from_bytes(record.to_bytes()) == record
+    # a version 1 record, with 16 bit counts
+    record = replay.GameRecord(SPEC, ['Liam', 'Emma', 'Liam'], seed=5)
+    data = record.to_bytes()
+    old = replay.HEADER_FORMATS[1].pack(
+        replay.RECORD_MAGIC, 1, replay.SEED_RECORD, SPEC.get_number_of_players(),
+        SPEC.get_cards_per_hand(), SPEC.get_card_range(), len(SPEC.get_suit_items()))
+    assert replay.GameRecord.from_bytes(old + data[replay.HEADER_FORMAT.size:]) == record
+
+# eos
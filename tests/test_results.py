@@ -0,0 +1,91 @@
+#! /usr/bin/env python3
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from cards import batch
+from cards import card_game
+from cards import results
+
+def test_write_and_query(tmp_path):
+    directory = str(tmp_path / 'store')
+    with results.ResultWriter(directory, 2, buffer_size=3) as writer:
+        writer.add(0, 1, [10, 20])
+        writer.add(0, 2, [30, 30])
+        writer.add(1, 3, [5, 1])
+        writer.add(1, 4, [7, 9], winner=1)
+        assert writer.get_rows() == 4
+    store = results.ResultStore(directory, chunk_rows=3)
+    assert store.get_rows() == 4
+    assert store.get_column('seed').tolist() == [1, 2, 3, 4]
+    assert store.win_rates() == [0.5, 0.5]
+    assert store.win_rates(config=1) == [0.5, 0.5]
+    assert store.win_rates(config=0) == [0.5, 0.5]
+    assert store.score_quantiles([0, 0.5, 1]) == [[5, 7, 30], [1, 9, 30]]
+    groups = store.group_by_config()
+    assert groups[0] == {'games': 2, 'wins': [1, 1], 'win_rates': [0.5, 0.5],
+                         'mean_scores': [20.0, 25.0]}
+    assert groups[1]['mean_scores'] == [6.0, 5.0]
+
+def test_group_by_sparse_configs(tmp_path):
+    directory = str(tmp_path / 'store')
+    with results.ResultWriter(directory, 2) as writer:
+        writer.add(2**31 - 1, 0, [5, 1])
+        writer.add(-4, 0, [1, 5])
+        writer.add(2**31 - 1, 0, [3, 4])
+    groups = results.ResultStore(directory, chunk_rows=2).group_by_config()
+    assert sorted(groups) == [-4, 2**31 - 1]
+    assert groups[2**31 - 1]['wins'] == [1, 1]
+    assert groups[2**31 - 1]['mean_scores'] == [4.0, 2.5]
+    assert groups[-4]['games'] == 1
+
+def test_large_tables(tmp_path):
+    directory = str(tmp_path / 'store')
+    with results.ResultWriter(directory, 40000) as writer:
+        scores = np.zeros((2, 40000), dtype=np.int64)
+        scores[0, 39999] = 5
+        scores[1, 3] = 5
+        writer.add_many([0, 0], [1, 2], scores)
+        with pytest.raises(ValueError):
+            writer.add_many([0], [3], scores[:1], [40000])
+        with pytest.raises(ValueError):
+            writer.add_many([0], [3], scores[:1], [-1])
+    store = results.ResultStore(directory)
+    assert store.get_column('winner').tolist() == [39999, 3]
+    rates = store.win_rates()
+    assert rates[39999] == rates[3] == 0.5
+
+def test_append_and_batch(tmp_path):
+    directory = str(tmp_path / 'store')
+    spec = card_game.GameSpec.compile(2, 3, 14, 'diamonds:4,hearts:3,spades:2,clubs:1')
+    with results.ResultWriter(directory, 2) as writer:
+        writer.add_result(5, 0, spec.create_game().play(spec.create_players(), spec.create_deck()))
+    engine = batch.BatchGame(2, 3, 14, 'diamonds:4,hearts:3,spades:2,clubs:1')
+    perms = np.random.default_rng(1).random((100, 56)).argsort(axis=1)
+    scores, winners = engine.play_permutations(perms)
+    with results.ResultWriter(directory, 2) as writer:
+        writer.add_many(3, np.arange(100), scores, winners)
+    store = results.ResultStore(directory)
+    assert store.get_rows() == 101
+    assert (store.get_column('scores')[1:] == scores).all()
+    assert store.group_by_config()[3]['wins'] == np.bincount(winners, minlength=2).tolist()
+    assert store.score_quantiles([0.5], config=5)[0][0] == store.get_column('scores')[0, 0]
+    with pytest.raises(ValueError):
+        results.ResultWriter(directory, 3)
+
+def test_unflushed_records_are_dropped(tmp_path):
+    directory = str(tmp_path / 'store')
+    writer = results.ResultWriter(directory, 2, buffer_size=2)
+    writer.add(0, 0, [1, 2])
+    writer.add(0, 0, [3, 4])
+    writer.add(0, 0, [5, 6])
+    # a crashed writer leaves the third record unflushed
+    with open(str(tmp_path / 'store' / 'seed.bin'), 'ab') as f:
+        f.write(b'partial')
+    results.ResultWriter(directory, 2).close()
+    store = results.ResultStore(directory)
+    assert store.get_rows() == 2
+    assert store.get_column('seed').tolist() == [0, 0]
+
+# eos
@@ -0,0 +1,75 @@
+#! /usr/bin/env python3
+
+import random
+import weakref
+
+import pytest
+
+from cards import card_game
+from cards import scoring
+
+SUITS = 'diamonds:4,hearts:3,spades:2,clubs:1'
+RULES = [scoring.RankTimesValue(), scoring.ValueOnly(),
+         scoring.SuitBonus({'hearts': 10}), scoring.CappedHand(40)]
+
+def test_scalar_rules():
+    hand = [card_game.Card('hearts', 3, 5), card_game.Card('clubs', 1, 9)]
+    assert scoring.RankTimesValue().score_hand(hand) == 24
+    assert scoring.ValueOnly().score_hand(hand) == 14
+    assert scoring.SuitBonus({'hearts': 10}).score_hand(hand) == 34
+    assert scoring.SuitBonus({'clubs': 1}, scoring.ValueOnly()).score_hand(hand) == 15
+    assert scoring.CappedHand(20).score_hand(hand) == 20
+    assert scoring.CappedHand(20).is_additive() is False
+    assert scoring.SuitBonus({}).is_additive() is True
+    with pytest.raises(TypeError):
+        scoring.ScoringRule()
+
+def test_score_table():
+    rule = scoring.SuitBonus({'red': 100})
+    table = rule.get_score_table(3, (('red', 2), ('blue', 1)))
+    assert list(table) == [102, 104, 106, 1, 2, 3]
+    assert rule.get_score_table(3, (('red', 2), ('blue', 1))) is table
+
+@pytest.mark.parametrize('rule', RULES)
+def test_score_card_indexes(rule):
+    deck = card_game.Deck(6, {'red': 3, 'blue': 1}, random.Random(1))
+    hand = deck.draw_indexes(5)
+    assert rule.score_card_indexes(hand, deck) == \
+        rule.score_hand([deck.get_card(c) for c in hand])
+    lazy = card_game.LazyDeck(6, {'red': 3, 'blue': 1})
+    assert rule.score_card_indexes(hand, lazy) == rule.score_card_indexes(hand, deck)
+
+def test_score_card_indexes_does_not_keep_the_deck():
+    rule = scoring.RankTimesValue()
+    deck = card_game.Deck(6, {'red': 3, 'blue': 1})
+    rule.score_card_indexes(deck.draw_indexes(3), deck)
+    deck = weakref.ref(deck)
+    assert deck() is None
+
+def test_player_uses_rule():
+    spec = card_game.GameSpec.compile(2, 3, 14, SUITS)
+    players = spec.create_players(scoring_rule=scoring.ValueOnly())
+    spec.create_game().play(players, spec.create_deck())
+    assert sum(p.get_score() for p in players.get_players()) == 4 * 105
+
+@pytest.mark.parametrize('rule', RULES)
+def test_batch_matches_game_play(rule):
+    np = pytest.importorskip('numpy')
+    from cards import batch
+    spec = card_game.GameSpec.compile(3, 4, 14, SUITS)
+    engine = batch.BatchGame(3, 4, 14, SUITS, rule)
+    for seed in range(5):
+        deck = spec.create_deck(random.Random(seed))
+        order = np.array(deck.get_order())
+        players = spec.create_players(scoring_rule=rule)
+        spec.create_game().play(players, deck)
+        scores, winners = engine.play_permutations(order[None, :])
+        assert scores[0].tolist() == [p.get_score() for p in players.get_players()]
+
+def test_score_hands():
+    np = pytest.importorskip('numpy')
+    rule = scoring.CappedHand(10)
+    hands = np.array([[0, 1, -1], [2, 5, 4]])
+    assert rule.score_hands(hands, 3, (('red', 2), ('blue', 1))).tolist() == [6, 10]
+
+# eos
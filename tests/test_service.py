@@ -0,0 +1,90 @@
+#! /usr/bin/env python3
+
+import asyncio
+import io
+import json
+
+from cards import card_game
+from cards import service
+
+SPEC = card_game.GameSpec.compile(2, 3, 14, 'diamonds:4,hearts:3,spades:2,clubs:1')
+
+def test_handle_request_uses_defaults_and_seed():
+    r1 = service.handle_request('{"id": "a", "seed": 9}', SPEC)
+    r2 = service.handle_request('{"seed": 9}', SPEC)
+    assert r1['id'] == 'a'
+    assert 'id' not in r2
+    assert r1['scores'] == r2['scores']
+    assert r1['player_ids'] == r2['player_ids']
+    assert len(r1['scores']) == 2
+    assert sum(r1['scores']) == 10 * 105
+
+def test_handle_request_overrides():
+    r = service.handle_request(json.dumps({'players': 3, 'range': 5, 'cards_per_hand': 1,
+                                           'suits': {'red': 3, 'green': 1}, 'lazy': True}), SPEC)
+    assert len(r['scores']) == 3
+    assert sum(r['scores']) == 4 * 15
+    assert r['winner'] == r['scores'].index(max(r['scores']))
+
+def test_handle_request_errors():
+    assert 'error' in service.handle_request('not json', SPEC)
+    assert 'error' in service.handle_request('[1, 2]', SPEC)
+    r = service.handle_request('{"id": 3, "players": 0}', SPEC)
+    assert r['id'] == 3 and 'players' in r['error']
+    r = service.handle_request('{"id": 4, "range": 1e999}', SPEC)
+    assert r['id'] == 4 and 'error' in r
+
+def test_handle_request_limits():
+    templates = card_game.get_deck_template.cache_info().currsize
+    r = service.handle_request('{"id": 5, "range": 1000000000}', SPEC)
+    assert r['id'] == 5 and 'deck' in r['error']
+    r = service.handle_request(json.dumps({'range': service.MAX_DECK_SIZE, 'suits': 'a:1,b:2'}),
+                               SPEC)
+    assert 'deck' in r['error']
+    r = service.handle_request('{"players": 1000000000}', SPEC)
+    assert 'players' in r['error']
+    assert card_game.get_deck_template.cache_info().currsize == templates
+
+def test_serve_stdio():
+    stdin = io.StringIO('{"id": 1, "seed": 1}\n\n{"id": 2, "seed": 1}\n')
+    stdout = io.StringIO()
+    asyncio.run(service.serve_stdio(SPEC, stdin=stdin, stdout=stdout))
+    lines = sorted((json.loads(line) for line in stdout.getvalue().splitlines()),
+                   key=lambda r: r['id'])
+    assert [r['id'] for r in lines] == [1, 2]
+    assert lines[0]['scores'] == lines[1]['scores']
+
+def test_socket_server(tmp_path):
+    path = str(tmp_path / 'game.sock')
+
+    async def talk():
+        server = await service.start_socket_server(path, SPEC)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b'{"id": 1}\n{"id": 2, "players": 4}\n')
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for i in range(2)]
+            writer.close()
+            return responses
+
+    responses = sorted(asyncio.run(talk()), key=lambda r: r['id'])
+    assert [r['id'] for r in responses] == [1, 2]
+    assert len(responses[1]['scores']) == 4
+
+def test_large_game_does_not_block_others(tmp_path):
+    path = str(tmp_path / 'game.sock')
+
+    async def talk():
+        server = await service.start_socket_server(path, SPEC)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b'{"id": "slow", "range": 16000}\n{"id": "fast"}\n')
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for i in range(2)]
+            writer.close()
+            return responses
+
+    responses = asyncio.run(talk())
+    assert [r['id'] for r in responses] == ['fast', 'slow']
+
+# eos
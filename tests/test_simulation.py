@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+
+import io
+import random
+
+import pytest
+
+from cards import card_game
+from cards import simulation
+
+SUITS = 'diamonds:4,hearts:3,spades:2,clubs:1'
+
+def test_deck_and_players_use_rng():
+    d1 = card_game.Deck(14, card_game.parse_suits(SUITS), random.Random(5))
+    d2 = card_game.Deck(14, card_game.parse_suits(SUITS), random.Random(5))
+    assert d1.get_order() == d2.get_order()
+    p1 = card_game.Players(3, random.Random(5))
+    p2 = card_game.Players(3, random.Random(5))
+    assert [p.get_id() for p in p1.get_players()] == [p.get_id() for p in p2.get_players()]
+
+def test_simulation_result_merge():
+    r = simulation.SimulationResult(2)
+    r.add_game([10, 20])
+    r.add_game([30, 30])
+    other = simulation.SimulationResult(2)
+    other.add_game([5, 1])
+    r.merge(other)
+    assert r.get_games() == 3
+    assert r.get_wins() == [2, 1]
+    assert r.get_score_histograms()[1][30] == 1
+    assert r.get_win_rates() == [2/3, 1/3]
+
+def test_runner_independent_of_workers():
+    runner = simulation.MonteCarloRunner(2, 3, 13, SUITS, block_size=50)
+    serial = runner.run(230, seed=11, workers=1)
+    parallel = runner.run(230, seed=11, workers=3)
+    assert serial.get_games() == 230
+    assert sum(serial.get_wins()) == 230
+    assert serial == parallel
+    assert runner.run(230, seed=12, workers=1) != serial
+
+def test_runner_threads_match_processes():
+    runner = simulation.MonteCarloRunner(2, 3, 13, SUITS, block_size=50)
+    threaded = runner.run(230, seed=11, workers=3, use_threads=True)
+    assert threaded == runner.run(230, seed=11, workers=1)
+    results = simulation.run_many([runner], 230, seed=11, workers=2, use_threads=True)
+    assert results == [threaded]
+
+def test_score_summaries():
+    r = simulation.SimulationResult(2)
+    r.add_game([10, 20])
+    r.add_game([30, 20])
+    first, second = r.get_score_summaries()
+    assert first == {'mean': 20.0, 'stdev': 10.0, 'min': 10, 'max': 30}
+    assert second['stdev'] == 0.0
+
+def test_run_many_matches_run():
+    runners = [simulation.MonteCarloRunner(2, 3, 13, SUITS, block_size=50),
+               simulation.MonteCarloRunner(3, 2, 10, 'red:2,blue:1', block_size=50)]
+    results = simulation.run_many(runners, 120, seed=4, workers=2)
+    assert results[0] == runners[0].run(120, seed=4, workers=1)
+    assert results[1] == runners[1].run(120, seed=4, workers=1)
+    assert len(results[1].get_wins()) == 3
+
+def test_load_configurations():
+    f = io.StringIO('# a comment\n{"players": 3}\n\n{"range": 5, "suits": "a:1"}\n')
+    specs = simulation.load_configurations(f)
+    assert [s.get_number_of_players() for s in specs] == [3, 2]
+    assert specs[1].get_deck_size() == 5
+    with pytest.raises(ValueError):
+        simulation.load_configurations(io.StringIO('{"players": 0}\n'))
+
+def test_wilson_interval():
+    low, high = simulation.wilson_interval(50, 100)
+    assert low < 0.5 < high
+    assert abs((low + high) / 2 - 0.5) < 1e-12
+    assert 0.19 < high - low < 0.2
+    assert simulation.wilson_interval(0, 0) == (0.0, 1.0)
+    low, high = simulation.wilson_interval(0, 10)
+    assert low == 0.0 and high > 0
+
+def test_run_adaptive_stops_early():
+    runner = simulation.MonteCarloRunner(2, 3, 13, SUITS, block_size=100)
+    result = runner.run_adaptive(0.15, 5000, seed=2, workers=1)
+    assert result.get_games() < 5000
+    assert all(high - low < 0.15 for low, high in result.get_confidence_intervals())
+    assert runner.run_adaptive(0.15, 5000, seed=2, workers=3) == result
+    # the games are the first games of the full run
+    assert runner.run(result.get_games(), seed=2, workers=1) == result
+
+def test_run_adaptive_budget():
+    runner = simulation.MonteCarloRunner(2, 3, 13, SUITS, block_size=100)
+    result = runner.run_adaptive(0.001, 250, seed=2, workers=1)
+    assert result.get_games() == 250
+
+# eos
@@ -0,0 +1,51 @@
+#! /usr/bin/env python3
+
+import io
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from cards import batch
+from cards import sweep
+
+SUITS = 'diamonds:4,hearts:3,spades:2,clubs:1'
+
+def test_grid():
+    specs = sweep.grid([2, 3], [1, 3], [13], [SUITS, {'a': 1, 'b': 2}])
+    assert len(specs) == 8
+    assert specs[1].get_suits() == {'a': 1, 'b': 2}
+    loaded = sweep.load_grid(io.StringIO('{"players": [2, 4], "range": [5, 6]}'))
+    assert [(s.get_number_of_players(), s.get_card_range()) for s in loaded] == \
+        [(2, 5), (2, 6), (4, 5), (4, 6)]
+
+def test_points_share_deck_orders():
+    specs = sweep.grid([2], [1, 3], [13], [SUITS])
+    result = sweep.run_sweep(specs, 500, seed=6, workers=1, chunk_size=200)
+    # the same deck orders, drawn chunk by chunk from the shared seeds
+    perms = np.vstack([batch.random_permutations(np.random.default_rng([6, 52, c]), n, 52)
+                       for c, n in enumerate([200, 200, 100])])
+    for spec, point in zip(specs, result.get_results()):
+        engine = batch.BatchGame(2, spec.get_cards_per_hand(), 13, SUITS)
+        expected = engine.summarize_permutations(perms)
+        assert point.get_games() == 500
+        assert point.get_wins().tolist() == expected.get_wins().tolist()
+        assert point.get_ties() == expected.get_ties()
+
+def test_sweep_independent_of_workers():
+    specs = sweep.grid([2, 3], [2], [10, 13], [SUITS])
+    serial = sweep.run_sweep(specs, 300, seed=1, workers=1, chunk_size=100)
+    parallel = sweep.run_sweep(specs, 300, seed=1, workers=2, chunk_size=100)
+    assert serial.get_rows() == parallel.get_rows()
+
+def test_sweep_table():
+    result = sweep.run_sweep(sweep.grid([2, 3], [3], [13], [SUITS]), 100, seed=2, workers=1)
+    rows = result.get_rows()
+    assert [row['players'] for row in rows] == [2, 3]
+    assert len(rows[1]['win_rates'].split()) == 3
+    f = io.StringIO()
+    result.write_csv(f)
+    assert f.getvalue().splitlines()[0].startswith('players,cards_per_hand,range,suits')
+    assert len(result.format_table().splitlines()) == 3
+
+# eos